@@ -0,0 +1,249 @@
+"""Disk-space admission control for new downloads.
+
+aria2 preallocates, so a torrent that doesn't fit fails and is retried in a loop
+on a full volume. Before adding, `Admission.admit()` checks the release's known
+size against `shutil.disk_usage()` minus what earlier downloads have already
+reserved (`~/.anidl/reservations.json`) and a headroom, across the download dir
+and any extra `[admission] volumes`. Releases that fit nowhere are deferred and
+can be retried with `anidl queue admit`. Reservations are released when the
+download completes or is removed.
+
+A reservation only counts what its download has not put on disk yet: `refresh()`
+asks aria2 how far each one got (allocated blocks or completed bytes, whichever is
+more) and drops the ones aria2 finished or no longer knows. Every read-modify-write
+of the file, including `admit()`'s check-then-reserve, holds a lock on it.
+"""
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+
+from .utils import file_lock, parse_size
+
+logger = logging.getLogger(__name__)
+
+STRATEGIES = ("first-fit", "most-free")
+# reservations whose download never reported back (crash, manual aria2 cleanup)
+MAX_AGE = 7 * 24 * 3600
+
+
+def _path() -> Path:
+    return Path.home() / ".anidl" / "reservations.json"
+
+
+def release_size(item: dict, select_files: Optional[List[int]] = None) -> int:
+    """Bytes a release will occupy: only the selected files of a batch when known."""
+    files = item.get("files") or []
+    if select_files and files:
+        return sum(int(files[i - 1].get("length", 0)) for i in select_files if 0 < i <= len(files))
+    return int(item.get("size_bytes") or parse_size(item.get("size")))
+
+
+def on_disk(paths: Iterable) -> int:
+    """Bytes actually allocated to `paths` (a preallocated file counts in full)."""
+    total = 0
+    for p in paths:
+        try:
+            st = os.stat(p)
+        except OSError:
+            continue
+        blocks = getattr(st, "st_blocks", None)
+        total += blocks * 512 if blocks is not None else st.st_size
+    return total
+
+
+def _norm(p) -> Path:
+    return Path(p).expanduser().absolute()
+
+
+def _existing(p: Path) -> Path:
+    # disk_usage needs an existing path; a download dir may not be created yet
+    p = _norm(p)
+    while not p.exists() and p.parent != p:
+        p = p.parent
+    return p
+
+
+class Reservations:
+    """The reservation file, re-read before every operation so concurrent processes see each other."""
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path) if path else _path()
+        self.entries: Dict[str, dict] = {}
+        self.deferred: List[dict] = []
+        self._rlock = threading.RLock()
+        self._depth = 0
+        self._load()
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        """Hold the file lock; nested uses from the same thread share it."""
+        with self._rlock:
+            if self._depth:
+                self._depth += 1
+                try:
+                    yield
+                finally:
+                    self._depth -= 1
+                return
+            with file_lock(self.path):
+                self._depth = 1
+                try:
+                    yield
+                finally:
+                    self._depth = 0
+
+    def _load(self):
+        self.entries, self.deferred = {}, []
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.warning("Ignoring unreadable reservations %s: %s", self.path, e)
+            return
+        cutoff = time.time() - MAX_AGE
+        self.entries = {k: v for k, v in data.get("entries", {}).items() if v.get("created", 0) >= cutoff}
+        self.deferred = data.get("deferred", [])
+
+    def save(self):
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps({"entries": self.entries, "deferred": self.deferred}, default=str), encoding="utf-8")
+            tmp.replace(self.path)
+        except OSError as e:
+            logger.warning("Failed to write reservations: %s", e)
+
+    def reserved(self, volume: Path) -> int:
+        """Bytes still to be written on `volume` by the downloads holding reservations."""
+        self._load()
+        v = str(_norm(volume))
+        return sum(max(0, e["bytes"] - e.get("done", 0)) for e in self.entries.values() if e["volume"] == v)
+
+    def reserve(self, key: str, volume: Path, nbytes: int):
+        with self.locked():
+            self._load()
+            self.entries[key] = {"volume": str(_norm(volume)), "bytes": int(nbytes), "created": time.time()}
+            self.save()
+
+    def rekey(self, old: str, new: str):
+        with self.locked():
+            self._load()
+            if old in self.entries:
+                self.entries[new] = self.entries.pop(old)
+                self.save()
+
+    def release(self, key: str) -> bool:
+        with self.locked():
+            self._load()
+            if self.entries.pop(key, None) is None:
+                return False
+            self.save()
+            return True
+
+    def refresh(self, lookup: Callable[[str], Optional[dict]]):
+        """Update reservations from aria2.
+
+        `lookup(gid)` returns {"status", "completed", "files"} or None when aria2 doesn't know
+        the gid. Finished and unknown downloads are released; the rest only keep what they
+        haven't written yet.
+        """
+        with self.locked():
+            self._load()
+            for key, e in list(self.entries.items()):
+                if key.startswith("pending:") or ":" in key:
+                    # not added yet, or placed on a router node this aria2 doesn't see
+                    continue
+                st = lookup(key)
+                if st is None or st.get("status") in ("complete", "error", "removed"):
+                    del self.entries[key]
+                    continue
+                e["done"] = max(int(st.get("completed") or 0), on_disk(st.get("files") or []))
+            self.save()
+
+    def defer(self, entry: dict):
+        with self.locked():
+            self._load()
+            self.deferred.append(dict(entry, deferred_at=time.time()))
+            self.save()
+
+    def take_deferred(self) -> List[dict]:
+        """Remove and return every deferred entry (re-`defer` the ones that still don't fit)."""
+        with self.locked():
+            self._load()
+            out, self.deferred = self.deferred, []
+            self.save()
+            return out
+
+
+class Admission:
+    def __init__(self, volumes: List[Path], reservations: Optional[Reservations] = None, headroom: int = 0,
+                 strategy: str = "first-fit"):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"unknown strategy {strategy!r} (choose from {', '.join(STRATEGIES)})")
+        self.volumes = [_norm(v) for v in volumes]
+        self.reservations = reservations or Reservations()
+        self.headroom = headroom
+        self.strategy = strategy
+
+    def available(self, volume: Path) -> int:
+        """Free bytes on `volume` after reservations and headroom (may be negative)."""
+        try:
+            free = shutil.disk_usage(_existing(volume)).free
+        except OSError:
+            return 0
+        return free - self.reservations.reserved(volume) - self.headroom
+
+    def place(self, nbytes: int, preferred: Optional[Path] = None) -> Optional[Path]:
+        """Volume to download into, or None when the release fits nowhere.
+
+        `first-fit` keeps the preferred dir (then configured order) while it has room;
+        `most-free` always picks the volume with the most space left.
+        """
+        pref = _norm(preferred) if preferred else None
+        order = ([pref] if pref else []) + [v for v in self.volumes if v != pref]
+        fits = [(self.available(v), v) for v in order]
+        fits = [(a, v) for a, v in fits if a >= nbytes]
+        if not fits:
+            return None
+        if self.strategy == "most-free":
+            return max(fits, key=lambda f: f[0])[1]
+        return fits[0][1]
+
+    def admit(self, key: str, item: dict, preferred: Optional[Path] = None,
+              select_files: Optional[List[int]] = None) -> Optional[Path]:
+        """Reserve space for `item` under `key` and return its volume; None means deferred.
+
+        Releases of unknown size are admitted without a reservation. Call `rekey()` once the
+        gid is known and `release()` if adding fails.
+        """
+        nbytes = release_size(item, select_files)
+        if not nbytes:
+            return _norm(preferred) if preferred else (self.volumes[0] if self.volumes else None)
+        # another process must not reserve the same free space between the check and the write
+        with self.reservations.locked():
+            volume = self.place(nbytes, preferred)
+            if volume is not None:
+                self.reservations.reserve(key, volume, nbytes)
+        return volume
+
+    def rekey(self, old: str, new: str):
+        self.reservations.rekey(old, new)
+
+    def release(self, key: str) -> bool:
+        return self.reservations.release(key)
+
+
+def from_config(cfg: dict, download_dir: Optional[Path] = None) -> Optional[Admission]:
+    """Admission over the download dir plus `[admission] volumes`, or None when disabled."""
+    ac = (cfg or {}).get("admission", {})
+    if not ac.get("enabled", True):
+        return None
+    volumes = ([Path(download_dir)] if download_dir else []) + [Path(v) for v in ac.get("volumes", [])]
+    return Admission(volumes, headroom=parse_size(ac.get("headroom", 0)), strategy=ac.get("strategy", "first-fit"))
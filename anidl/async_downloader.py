@@ -0,0 +1,156 @@
+"""Async counterpart of `downloader`, built on the JSON-RPC client in `rpc.py`.
+
+Every call awaits aria2 instead of blocking, so `search` can resolve several
+magnets, add several releases and poll progress concurrently on one loop.
+Progress polling asks for every watched gid in a single `system.multicall`.
+"""
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+import asyncio
+import base64
+import logging
+
+from .downloader import add_options, _local_torrent
+from .progress import Renderer, Snapshot
+from .rpc import Aria2RPC
+from .torrents import TorrentCache, annotate, magnet_infohash
+
+logger = logging.getLogger(__name__)
+
+
+async def add_torrent_or_magnet(rpc: Aria2RPC, uri: str, download_dir: Path, pause: bool = False,
+                                max_connections: int = 16, verify: bool = True,
+                                select_files: Optional[List[int]] = None) -> str:
+    """Same contract as `downloader.add_torrent_or_magnet`, minus the subprocess fallback."""
+    opts = add_options(download_dir, pause, max_connections, verify, select_files)
+    torrent = _local_torrent(uri)
+    if torrent is not None:
+        return await rpc.add_torrent(base64.b64encode(torrent).decode("ascii"), [], opts)
+    return await rpc.add_uri([uri], opts)
+
+
+async def resolve_magnet(rpc: Aria2RPC, uri: str, timeout: float = 10, interval: float = 0.5) -> Optional[Dict]:
+    """Fetch a magnet's metadata through aria2 without downloading the payload.
+
+    The torrent is saved into the torrent cache, so the next lookup is local.
+    """
+    cache = TorrentCache()
+    ih = magnet_infohash(uri)
+    cached = cache.info(ih)
+    if cached:
+        return {"title": cached["name"], "size": cached["size"], "files": cached["files"]}
+    cache.root.mkdir(parents=True, exist_ok=True)
+    gid = await rpc.add_uri([uri], {"bt-metadata-only": "true", "bt-save-metadata": "true", "dir": str(cache.root)})
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    try:
+        while loop.time() < deadline:
+            st = await rpc.tell_status(gid, ["status", "bittorrent", "totalLength"])
+            if st.get("status") == "complete":
+                meta = cache.info(ih)
+                if meta:
+                    return {"title": meta["name"], "size": meta["size"], "files": meta["files"]}
+                info = (st.get("bittorrent") or {}).get("info") or {}
+                return {"title": info.get("name"), "size": int(st.get("totalLength") or 0) or None}
+            if st.get("status") in ("error", "removed"):
+                return None
+            await asyncio.sleep(interval)
+        return None
+    finally:
+        for method in (rpc.remove, rpc.remove_download_result):
+            try:
+                await method(gid)
+            except Exception:
+                pass
+
+
+async def torrent_files(rpc: Aria2RPC, item: Dict, timeout: float = 30) -> Optional[List[Dict]]:
+    """Async `downloader.torrent_files`: prefetched metadata, the torrent cache, then aria2."""
+    if item.get("files"):
+        return item["files"]
+    cache = TorrentCache()
+    url = item.get("torrent_url") or ""
+    ih = item.get("infohash") or magnet_infohash(url)
+    meta = cache.info(ih)
+    if meta is None and url.startswith("magnet:"):
+        await resolve_magnet(rpc, url, timeout=timeout)
+        meta = cache.info(ih)
+    if meta is None:
+        return None
+    annotate(item, meta, cache)
+    return meta["files"]
+
+
+def event_from_status(st: dict) -> Dict:
+    """`downloader.completion_event` for a raw tellStatus dict."""
+    all_files = st.get("files") or []
+    files = [f["path"] for f in all_files if f.get("selected", "true") == "true" and f.get("path")]
+    selected = [int(f.get("index", i + 1)) for i, f in enumerate(all_files) if f.get("selected", "true") == "true"]
+    info = (st.get("bittorrent") or {}).get("info") or {}
+    name = info.get("name") or (Path(files[0]).name if files else st.get("gid"))
+    return {
+        "gid": st.get("gid"),
+        "name": name,
+        "status": st.get("status"),
+        "dir": st.get("dir", ""),
+        "files": files,
+        "selected": selected if len(selected) < len(all_files) else None,
+        "infohash": st.get("infoHash"),
+    }
+
+
+async def download_with_progress(rpc: Aria2RPC, gids: List[str], download_dir: Path, scheduler=None,
+                                 on_complete: Optional[Callable[[Dict], None]] = None, journal=None,
+                                 interval: float = 0.5, fps: float = 4, max_rows: int = 10):
+    """Async `downloader.download_with_progress` with the same callbacks.
+
+    Magnets added by URI first run as a metadata download that aria2 replaces with
+    the real one (`followedBy`); the follower is tracked under the original gid so
+    the journal and `on_complete` keep seeing the gid that was handed out. Drawing
+    happens on the `progress.Renderer` thread, so a slow poll never stalls it.
+    """
+    loop = asyncio.get_running_loop()
+    # aria2 gid currently polled -> gid the caller knows
+    watching = {g: g for g in gids}
+    snapshot = Snapshot()
+    with Renderer(snapshot, fps=fps, max_rows=max_rows):
+        while watching:
+            try:
+                statuses = await rpc.tell_many(list(watching))
+            except Exception as e:
+                logger.warning("Progress poll failed: %s", e)
+                statuses = {}
+            for cur, st in statuses.items():
+                gid = watching[cur]
+                if isinstance(st, Exception):
+                    # aria2 forgot it (purged result, restarted without a session)
+                    del watching[cur]
+                    continue
+                if st.get("status") == "complete" and st.get("followedBy"):
+                    del watching[cur]
+                    watching[st["followedBy"][0]] = gid
+                    continue
+                total = int(st.get("totalLength") or 0) or None
+                completed = int(st.get("completedLength") or 0)
+                status = st.get("status")
+                speed = int(st.get("downloadSpeed") or 0)
+                snapshot.update(gid, event_from_status(st)["name"], total, completed, speed, status)
+                if journal is not None:
+                    journal.update_progress(gid, completed, total or 0, status)
+                logger.debug("Progress %s %d/%d", gid, completed, total or 0,
+                             extra={"stage": "download", "gid": gid, "completed": completed, "total": total or 0,
+                                    "speed": speed, "sample": f"progress:{gid}"})
+                if status in ("complete", "error", "removed"):
+                    del watching[cur]
+                    if on_complete is not None:
+                        event = event_from_status(st)
+                        event["gid"] = gid
+                        try:
+                            on_complete(event)
+                        except Exception:
+                            pass
+            if scheduler is not None:
+                # the scheduler speaks the blocking aria2p API
+                await loop.run_in_executor(None, scheduler.tick)
+            if watching:
+                await asyncio.sleep(interval)
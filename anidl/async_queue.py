@@ -0,0 +1,63 @@
+"""Async counterpart of `queue` on the JSON-RPC client in `rpc.py`."""
+from typing import List
+import logging
+import time
+
+from .queue import _session_path
+from .rpc import Aria2RPC
+
+logger = logging.getLogger(__name__)
+
+
+async def _save_session(rpc: Aria2RPC, min_interval: float = 30.0):
+    """Same mtime-based rate limit as `queue._save_session`."""
+    sp = _session_path()
+    try:
+        if time.time() - sp.stat().st_mtime < min_interval:
+            return
+    except FileNotFoundError:
+        pass
+    try:
+        await rpc.save_session()
+    except Exception as e:
+        logger.warning("Failed to save aria2 session: %s", e)
+
+
+async def list_downloads(rpc: Aria2RPC) -> List[dict]:
+    """Active, waiting and stopped downloads in one round trip, shaped like `queue.list_downloads`."""
+    from .async_downloader import event_from_status
+
+    try:
+        downloads = await rpc.tell_all()
+    except Exception:
+        return []
+    return [{
+        "gid": d["gid"],
+        "name": event_from_status(d)["name"],
+        "status": d.get("status"),
+        "total": int(d.get("totalLength") or 0),
+        "completed": int(d.get("completedLength") or 0),
+        "speed": int(d.get("downloadSpeed") or 0),
+        **({"node": d["node"]} if "node" in d else {}),
+    } for d in downloads]
+
+
+async def _action(rpc: Aria2RPC, method: str, gid: str) -> bool:
+    try:
+        await getattr(rpc, method)(gid)
+    except Exception:
+        return False
+    await _save_session(rpc)
+    return True
+
+
+async def pause(rpc: Aria2RPC, gid: str) -> bool:
+    return await _action(rpc, "pause", gid)
+
+
+async def resume(rpc: Aria2RPC, gid: str) -> bool:
+    return await _action(rpc, "unpause", gid)
+
+
+async def remove(rpc: Aria2RPC, gid: str) -> bool:
+    return await _action(rpc, "remove", gid)
@@ -0,0 +1,339 @@
+"""Deep-history backfill into a local release index.
+
+TokyoTosho RSS only covers a recent window, so older episodes never show up in
+a feed search. `crawl()` walks the site's search result pages (`[backfill] url`)
+`concurrency` pages at a time and writes every page into a SQLite index
+(`~/.anidl/index.db`) as soon as it is parsed, so an interrupted crawl keeps
+what it got. It stops at the first empty page, or once a page is mostly
+releases that were already indexed before this crawl (an earlier backfill has
+been there). The deepest page reached per (mode, query) is remembered, so when
+an earlier crawl was cut short (`pages` cap, error, Ctrl-C) the next one catches
+up on the first pages and then resumes where that one stopped instead of taking
+its releases as the end of the known history. `search` merges matching indexed
+releases with the feed results.
+"""
+from datetime import datetime
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import asyncio
+import logging
+import re
+import sqlite3
+import time
+import urllib.parse
+
+from .filters import normalize, tokenize
+from .parser import health_score
+from .torrents import magnet_infohash
+from .utils import parse_size
+
+logger = logging.getLogger(__name__)
+
+# TokyoTosho search `type` per search mode (same categories as the RSS filters)
+MODE_TYPES = {"anime": 1, "hentai": 4, "jav": 15}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS releases (
+    id TEXT PRIMARY KEY,
+    infohash TEXT,
+    mode TEXT NOT NULL,
+    title TEXT NOT NULL,
+    norm_title TEXT NOT NULL,
+    size TEXT,
+    uploader TEXT,
+    date TEXT,
+    seeders INTEGER,
+    leechers INTEGER,
+    torrent_url TEXT,
+    magnet TEXT,
+    source TEXT,
+    indexed_at REAL
+);
+CREATE INDEX IF NOT EXISTS releases_mode_date ON releases (mode, date);
+CREATE TABLE IF NOT EXISTS crawls (
+    mode TEXT NOT NULL,
+    query TEXT NOT NULL,
+    depth INTEGER NOT NULL,
+    finished INTEGER NOT NULL,
+    updated REAL,
+    PRIMARY KEY (mode, query)
+);
+"""
+
+
+def index_path() -> Path:
+    return Path.home() / ".anidl" / "index.db"
+
+
+def search_url(template: str, mode: str, query: str, page: int) -> str:
+    return template.format(query=urllib.parse.quote_plus(query), type=MODE_TYPES.get(mode, 1), page=page)
+
+
+def release_id(item: dict) -> Optional[str]:
+    return item.get("infohash") or item.get("torrent_url") or None
+
+
+class _SearchPage(HTMLParser):
+    # rows look like: desc-top (magnet + .torrent link with the title), stats (S:/L:),
+    # then desc-bot ("Submitter: x | Size: 1.4GB | Date: 2025-09-17 12:00 UTC")
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.items: List[dict] = []
+        self._cell: Optional[str] = None
+        self._depth = 0
+        self._title_link = False
+        self._text: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        a = dict(attrs)
+        if tag == "td":
+            cls = (a.get("class") or "").split()
+            cell = next((c for c in ("desc-top", "desc-bot", "stats") if c in cls), None)
+            if cell is not None:
+                self._cell, self._depth, self._text = cell, 0, []
+                if cell == "desc-top":
+                    self.items.append({"title": "", "torrent_url": "", "magnet": ""})
+                return
+        if self._cell is None:
+            return
+        if tag == "td":
+            self._depth += 1
+        if tag == "a" and self._cell == "desc-top" and self.items:
+            href = a.get("href") or ""
+            if href.startswith("magnet:"):
+                self.items[-1]["magnet"] = href
+            elif a.get("type") == "application/x-bittorrent" or href.endswith(".torrent"):
+                self.items[-1]["torrent_url"] = href
+                self._title_link = True
+
+    def handle_endtag(self, tag):
+        if self._cell is None:
+            return
+        if tag == "a":
+            self._title_link = False
+        if tag != "td":
+            return
+        if self._depth:
+            self._depth -= 1
+            return
+        if self.items:
+            self._finish(self._cell, " ".join("".join(self._text).split()))
+        self._cell = None
+
+    def handle_data(self, data):
+        if self._cell is None:
+            return
+        self._text.append(data)
+        if self._title_link and self.items:
+            self.items[-1]["title"] += data
+
+    def _finish(self, cell: str, text: str):
+        it = self.items[-1]
+        if cell == "stats":
+            s = re.search(r"S:\s*(\d+)", text)
+            l = re.search(r"L:\s*(\d+)", text)
+            it["seeders"] = int(s.group(1)) if s else 0
+            it["leechers"] = int(l.group(1)) if l else 0
+        elif cell == "desc-bot":
+            sub = re.search(r"Submitter:\s*([^|]+?)\s*(?:\||$)", text)
+            size = re.search(r"Size:\s*([0-9.]+\s*[KMGT]?i?B)", text, re.IGNORECASE)
+            date = re.search(r"Date:\s*(\d{4}-\d{2}-\d{2} \d{2}:\d{2})", text)
+            it["uploader"] = sub.group(1) if sub else ""
+            it["size"] = size.group(1) if size else ""
+            it["date"] = datetime.strptime(date.group(1), "%Y-%m-%d %H:%M") if date else None
+
+
+def parse_search_page(html: str) -> List[dict]:
+    """Releases on one TokyoTosho search result page (empty past the last page)."""
+    p = _SearchPage()
+    p.feed(html or "")
+    p.close()
+    out = []
+    for it in p.items:
+        it["title"] = " ".join(it["title"].split())
+        if not it["title"] or not (it["magnet"] or it["torrent_url"]):
+            continue
+        it["infohash"] = magnet_infohash(it["magnet"])
+        it.setdefault("seeders", 0)
+        it.setdefault("uploader", "")
+        it.setdefault("size", "")
+        it.setdefault("date", None)
+        out.append(it)
+    return out
+
+
+class LocalIndex:
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path) if path else index_path()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(self.path))
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def known(self, ids: Iterable[str]) -> Set[str]:
+        ids = [i for i in ids if i]
+        if not ids:
+            return set()
+        marks = ",".join("?" * len(ids))
+        return {r[0] for r in self.db.execute(f"SELECT id FROM releases WHERE id IN ({marks})", ids)}
+
+    def add(self, items: List[dict], mode: str, source: str = "") -> int:
+        """Insert or refresh releases (seeders get updated); returns how many were new."""
+        ids = [release_id(it) for it in items]
+        before = self.known(ids)
+        now = time.time()
+        rows = []
+        for rid, it in zip(ids, items):
+            if rid is None:
+                continue
+            date = it.get("date")
+            rows.append((rid, it.get("infohash"), mode, it["title"], normalize(it["title"]), it.get("size") or "",
+                         it.get("uploader") or "", date.isoformat() if isinstance(date, datetime) else date,
+                         int(it.get("seeders") or 0), int(it.get("leechers") or 0), it.get("torrent_url") or "",
+                         it.get("magnet") or "", source, now))
+        with self.db:
+            self.db.executemany(
+                "INSERT INTO releases VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?) ON CONFLICT(id) DO UPDATE SET "
+                "seeders=excluded.seeders, leechers=excluded.leechers, indexed_at=excluded.indexed_at", rows)
+        return len({r[0] for r in rows} - before)
+
+    def search(self, query: str, mode: str = "anime", limit: int = 200) -> List[dict]:
+        """Indexed releases whose title contains every query token, newest first."""
+        tokens = tokenize(query)
+        where = " AND ".join(["mode = ?"] + ["norm_title LIKE ?"] * len(tokens))
+        args = [mode] + [f"%{t}%" for t in tokens] + [limit]
+        rows = self.db.execute(f"SELECT * FROM releases WHERE {where} ORDER BY date DESC LIMIT ?", args)
+        out = []
+        for r in rows:
+            date = datetime.fromisoformat(r["date"]) if r["date"] else datetime.utcnow()
+            out.append({
+                "title": r["title"],
+                "size": r["size"],
+                "size_bytes": parse_size(r["size"]) or None,
+                "uploader": r["uploader"],
+                "submitter": r["uploader"] or "Anonymous",
+                "date": date,
+                "seeders": r["seeders"],
+                "leechers": r["leechers"],
+                "torrent_url": r["torrent_url"] or r["magnet"],
+                "magnet": r["magnet"],
+                "infohash": r["infohash"],
+                "source": r["source"],
+                "indexed": True,
+                "health": health_score(r["seeders"], date, r["uploader"] or ""),
+            })
+        return out
+
+    def count(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM releases").fetchone()[0]
+
+    def crawl_state(self, mode: str, query: str) -> Tuple[int, bool]:
+        """(deepest page crawled, whether a crawl reached the last page) for a query."""
+        row = self.db.execute("SELECT depth, finished FROM crawls WHERE mode = ? AND query = ?",
+                              (mode, normalize(query))).fetchone()
+        return (row["depth"], bool(row["finished"])) if row else (0, False)
+
+    def record_crawl(self, mode: str, query: str, depth: int, finished: bool):
+        old_depth, old_finished = self.crawl_state(mode, query)
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO crawls VALUES (?,?,?,?,?)",
+                            (mode, normalize(query), max(depth, old_depth), int(finished or old_finished), time.time()))
+
+
+async def crawl(index: LocalIndex, query: str, mode: str = "anime", cfg: Optional[dict] = None,
+                max_pages: Optional[int] = None, concurrency: Optional[int] = None) -> Dict:
+    """Backfill `index` with search result pages for `query`; returns crawl stats."""
+    from .sources import _fetch, shared_session
+
+    bc = (cfg or {}).get("backfill", {})
+    template = bc.get("url", "https://www.tokyotosho.info/search.php?terms={query}&type={type}&page={page}")
+    max_pages = max_pages or bc.get("pages", 50)
+    concurrency = max(1, concurrency or bc.get("concurrency", 4))
+    stop_ratio = bc.get("stop_ratio", 0.8)
+    timeout = (cfg or {}).get("sources", {}).get("timeout", 10)
+
+    stats = {"pages": 0, "items": 0, "new": 0, "stopped": "max-pages"}
+    crawled: Set[str] = set()
+    depth, finished = index.crawl_state(mode, query)
+
+    async def walk(session, page: int, trusted_from: int) -> str:
+        # known releases only mean "caught up" on pages past `trusted_from`
+        while stats["pages"] < max_pages:
+            wave = list(range(page, page + min(concurrency, max_pages - stats["pages"])))
+            results = await asyncio.gather(*(_fetch(session, search_url(template, mode, query, p), timeout=timeout)
+                                             for p in wave))
+            # pages are judged in order, so a stop discards the later pages of the wave
+            for p, res in zip(wave, results):
+                if res.get("status") != 200:
+                    return f"error on page {p}"
+                items = parse_search_page(res.get("raw") or "")
+                if not items:
+                    index.record_crawl(mode, query, p - 1, finished=True)
+                    return "end"
+                ids = {release_id(it) for it in items}
+                # releases this crawl already wrote don't count: pages shift while we crawl
+                seen_before = index.known(ids - crawled)
+                crawled.update(ids)
+                stats["pages"] += 1
+                stats["items"] += len(items)
+                stats["new"] += index.add(items, mode, source=res["url"])
+                index.record_crawl(mode, query, p, finished=False)
+                logger.debug("Backfill page %d: %d items, %d already indexed", p, len(items), len(seen_before),
+                             extra={"stage": "backfill", "page": p, "items": len(items)})
+                if p > trusted_from and len(seen_before) >= stop_ratio * len(ids):
+                    return "indexed"
+                last = p
+            page = last + 1
+        return "max-pages"
+
+    async with shared_session(concurrency=concurrency) as session:
+        stats["stopped"] = await walk(session, 1, 0)
+        if stats["stopped"] == "indexed" and not finished and depth > stats["pages"]:
+            # caught up with new uploads; pick the cut-short crawl up again, one page of overlap
+            # for the releases that pushed older ones down meanwhile
+            stats["resumed_from"] = depth
+            stats["stopped"] = await walk(session, depth, depth)
+    return stats
+
+
+def add_local(items: List[dict], query: str, mode: str, cfg: Optional[dict] = None) -> List[dict]:
+    """Feed results plus indexed matches the feeds didn't return, newest first.
+
+    Does nothing until a backfill has created the index.
+    """
+    bc = (cfg or {}).get("backfill", {})
+    if not bc.get("local_results", True) or not index_path().exists():
+        return items
+    try:
+        index = LocalIndex()
+    except sqlite3.Error as e:
+        logger.warning("Local index unavailable: %s", e)
+        return items
+    try:
+        local = index.search(query, mode, limit=bc.get("max_local", 200))
+    finally:
+        index.close()
+    # feed items fetched without metadata have no infohash, only the .torrent link
+    hashes = {it.get("infohash") for it in items} - {None}
+    urls = {it.get("torrent_url") for it in items} - {None}
+    extra = [it for it in local if it["infohash"] not in hashes and it["torrent_url"] not in urls]
+    if not extra:
+        return items
+    merged = list(items) + extra
+    merged.sort(key=_date_key, reverse=True)
+    return merged
+
+
+def _date_key(item: dict) -> datetime:
+    # items that came through JSON (helper, API) carry ISO strings
+    d = item.get("date")
+    if isinstance(d, str):
+        try:
+            d = datetime.fromisoformat(d)
+        except ValueError:
+            d = None
+    return d.replace(tzinfo=None) if isinstance(d, datetime) else datetime.min
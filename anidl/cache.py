@@ -0,0 +1,159 @@
+"""Memoized search results with TTL, LRU eviction and stale-while-revalidate.
+
+Entries hold the final ranked item list for a normalized (mode, query, resolution)
+key and are persisted to `~/.anidl/cache/results.json` so repeated CLI runs can
+answer instantly. A hit older than `refresh_after` is still returned at once while
+a background task refetches it; entries older than `ttl` are treated as misses.
+Several processes (CLI runs, `serve`, the helper) share the file, so `save()`
+merges in what the others wrote since we loaded it instead of overwriting it.
+"""
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_key(mode: str, query: str, resolution: str = "") -> str:
+    """'One  Piece' / '-480p -720p' and 'one piece' / '-720p -480p' share a key."""
+    q = " ".join((query or "").lower().split())
+    res = " ".join(sorted(set((resolution or "").lower().split())))
+    return f"{mode}\x1f{q}\x1f{res}"
+
+
+def _dump_item(item: dict) -> dict:
+    out = dict(item)
+    if isinstance(out.get("date"), datetime):
+        out["date"] = out["date"].isoformat()
+    return out
+
+
+def _load_item(item: dict) -> dict:
+    if isinstance(item.get("date"), str):
+        try:
+            item["date"] = datetime.fromisoformat(item["date"])
+        except ValueError:
+            pass
+    return item
+
+
+class ResultCache:
+    def __init__(self, path: Optional[Path] = None, ttl: float = 900, refresh_after: float = 60,
+                 max_entries: int = 200):
+        self.path = path
+        self.ttl = ttl
+        self.refresh_after = refresh_after
+        self.max_entries = max_entries
+        # key -> (stored_at wall-clock seconds, items); ordered oldest-used first
+        self._entries: "OrderedDict[str, Tuple[float, List[dict]]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._loaded = False
+
+    @classmethod
+    def from_config(cls, cfg: dict, persist: bool = True) -> "ResultCache":
+        c = (cfg or {}).get("cache", {})
+        path = Path.home() / ".anidl" / "cache" / "results.json" if persist else None
+        return cls(path, ttl=c.get("results_ttl", 900), refresh_after=c.get("results_refresh_after", 60),
+                   max_entries=c.get("results_max_entries", 200))
+
+    def _read(self) -> "OrderedDict[str, Tuple[float, List[dict]]]":
+        entries: "OrderedDict[str, Tuple[float, List[dict]]]" = OrderedDict()
+        if self.path is None or not self.path.exists():
+            return entries
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            for key, (stored, items) in data.items():
+                entries[key] = (float(stored), [_load_item(i) for i in items])
+        except Exception as e:
+            logger.warning("Ignoring unreadable result cache %s: %s", self.path, e)
+            entries.clear()
+        return entries
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        self._entries = self._read()
+
+    def _merge(self):
+        # keep entries other processes stored meanwhile; the newer copy of a shared key wins
+        disk = self._read()
+        now = time.time()
+        merged = OrderedDict((k, v) for k, v in disk.items() if k not in self._entries and now - v[0] <= self.ttl)
+        for key, ours in self._entries.items():
+            theirs = disk.get(key)
+            merged[key] = theirs if theirs is not None and theirs[0] > ours[0] else ours
+        while len(merged) > self.max_entries:
+            merged.popitem(last=False)
+        self._entries = merged
+
+    def save(self):
+        if self.path is None:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._merge()
+            data = {k: [stored, [_dump_item(i) for i in items]] for k, (stored, items) in self._entries.items()}
+            # one temp file per process so concurrent writers don't clobber each other's
+            tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+            tmp.write_text(json.dumps(data, default=str), encoding="utf-8")
+            tmp.replace(self.path)
+        except OSError as e:
+            logger.warning("Failed to write result cache: %s", e)
+
+    def get(self, key: str) -> Optional[Tuple[List[dict], float]]:
+        """Return (items, age_seconds) for a live entry, marking it most recently used."""
+        self._load()
+        hit = self._entries.get(key)
+        if hit is None:
+            return None
+        age = time.time() - hit[0]
+        if age > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return hit[1], age
+
+    def put(self, key: str, items: List[dict]):
+        self._load()
+        self._entries[key] = (time.time(), items)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self.save()
+
+    async def _refresh(self, key: str, fetch: Callable[[], Awaitable[List[dict]]]):
+        try:
+            items = await fetch()
+            if items:
+                self.put(key, items)
+        except Exception as e:
+            logger.warning("Background refresh failed for %r: %s", key, e)
+        finally:
+            self._inflight.pop(key, None)
+
+    async def get_or_fetch(self, key: str, fetch: Callable[[], Awaitable[List[dict]]],
+                           refresh: bool = False) -> Tuple[List[dict], bool]:
+        """Return (items, from_cache). Stale hits are served and refreshed in the background."""
+        hit = None if refresh else self.get(key)
+        if hit is None:
+            items = await fetch()
+            if items:
+                self.put(key, items)
+            return items, False
+        items, age = hit
+        if age >= self.refresh_after and key not in self._inflight:
+            self._inflight[key] = asyncio.get_running_loop().create_task(self._refresh(key, fetch))
+        return items, True
+
+    async def drain(self, timeout: Optional[float] = None):
+        """Wait for in-flight background refreshes (short-lived processes call this before exit)."""
+        tasks = list(self._inflight.values())
+        if tasks:
+            await asyncio.wait(tasks, timeout=timeout)
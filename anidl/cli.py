@@ -1,16 +1,17 @@
 import asyncio
 import json
+import re
 from pathlib import Path
 import click
 import logging
 
-from .config import load_config, save_config
+from .config import load_config, load_raw, save_config, parse_value, env_overrides, ConfigError
 # lazy-loaded to avoid importing heavy/optional dependencies (aiohttp) at module import time
 # keep module-level names so tests can monkeypatch `cli.fetch_all_feeds`
 get_feeds = None
 fetch_all_feeds = None
 from .parser import parse_feeds
-from .utils import parse_selection, ensure_dir, setup_logging
+from .utils import parse_selection, parse_size_strict, format_size, ensure_dir, setup_logging
 from . import queue as queue_mod
 from .utils import load_history, append_history
 
@@ -20,6 +21,21 @@ from rich.text import Text
 
 console = Console()
 
+# upper bound for --episodes ranges
+MAX_EPISODE = 9999
+
+
+def _load_config(user=None) -> dict:
+    try:
+        return load_config(user=user)
+    except ConfigError as e:
+        raise click.ClickException(f"Invalid configuration: {e}")
+
+
+def _use_helper(cfg: dict) -> bool:
+    # the helper runs with the config file alone; ANIDL_* overrides only apply in-process
+    return cfg["helper"]["enabled"] and not env_overrides()
+
 
 @click.group()
 def cli():
@@ -37,13 +53,19 @@ def cli():
 @click.option("--notify/--no-notify", default=True, help="Enable desktop notifications when downloads complete (uses system notifications).")
 @click.option("--dry-run", is_flag=True, default=False, help="Don't actually download, just show results and selections.")
 @click.option("--max-connections", default=16, type=int, help="Max connections per download; passed to aria2 when available.")
-@click.option("--category", default=None, help="Feed category filter (e.g., sub, raw). Not all feeds support categories.")
+@click.option("--category", default=None, type=click.Choice(["sub", "raw", "dub", "batch"], case_sensitive=False), help="Only show releases of this kind (sub, raw, dub, batch).")
 @click.option("--proxy", default=None, help="Proxy URL for HTTP(S) requests to fetch RSS feeds (example: http://127.0.0.1:8888)")
-@click.option("--lang", default=None, help="Preferred language tag to prefer in results when available.")
+@click.option("--lang", default=None, help="Only show releases tagged with this language (e.g. eng, spa); untagged releases count as eng.")
 @click.option("--verbose", is_flag=True, default=False, help="Enable verbose logging to the user log file (~/.anidl/anidl.log).")
 @click.option("--verify/--no-verify", default=True, help="Request integrity verification from aria2 when supported.")
 @click.option("--check-update", is_flag=True, default=False, help="Check PyPI/GitHub for a newer version on startup.")
-def search(query, hentai, jav, resolution, download_dir, no_meta, notify, dry_run, max_connections, category, proxy, lang, verbose, verify, check_update):
+@click.option("--refresh", is_flag=True, default=False, help="Ignore cached results and fetch feeds again.")
+@click.option("--episodes", default=None, help="Only download these episodes from batch torrents (e.g. 5-8 or 1,3,10-12).")
+@click.option("--scrape/--no-scrape", default=None, help="Ask trackers for live seeder counts before ranking (default: [scrape] enabled).")
+@click.option("--filter", "filter_expr", default="", help="Filter results locally, e.g. '1080p -hevc size:<2G by:subsplease re:S0[12]'.")
+@click.option("--min-size", default=None, help="Hide releases smaller than this (e.g. 300M).")
+@click.option("--max-size", default=None, help="Hide releases larger than this (e.g. 4G).")
+def search(query, hentai, jav, resolution, download_dir, no_meta, notify, dry_run, max_connections, category, proxy, lang, verbose, verify, check_update, refresh, episodes, scrape, filter_expr, min_size, max_size):
     """Search for QUERY across configured feeds and optionally download.
 
     Examples:
@@ -59,7 +81,7 @@ def search(query, hentai, jav, resolution, download_dir, no_meta, notify, dry_ru
     setup_logging(verbose)
     logger = logging.getLogger(__name__)
 
-    config = load_config()
+    config = _load_config()
     defaults = config.get("defaults", {})
     # If not provided, default to the user's Downloads folder
     if download_dir is None:
@@ -72,6 +94,33 @@ def search(query, hentai, jav, resolution, download_dir, no_meta, notify, dry_ru
         download_dir = Path(download_dir)
     ensure_dir(download_dir)
 
+    wanted_episodes = []
+    if episodes:
+        wanted_episodes = parse_selection(episodes, MAX_EPISODE)
+        if not wanted_episodes:
+            raise click.BadParameter(f"no episode numbers in {episodes!r}", param_hint="--episodes")
+
+    from .filters import TitleIndex, combine, parse_query
+    try:
+        filter_spec = parse_query(filter_expr)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--filter")
+    if lang:
+        filter_spec["langs"].append(lang)
+    if category:
+        filter_spec["category"] = category.lower()
+    for hint, key, value in (("--min-size", "min_size", min_size), ("--max-size", "max_size", max_size)):
+        if value:
+            try:
+                filter_spec[key] = parse_size_strict(value)
+            except ValueError as e:
+                raise click.BadParameter(str(e), param_hint=hint)
+    if filter_spec.get("regex"):
+        try:
+            re.compile(filter_spec["regex"])
+        except re.error as e:
+            raise click.BadParameter(f"bad regex: {e}", param_hint="--filter")
+
     mode = "anime"
     if hentai:
         mode = "hentai"
@@ -92,22 +141,44 @@ def search(query, hentai, jav, resolution, download_dir, no_meta, notify, dry_ru
         click.echo("Missing optional dependency required to fetch feeds (aiohttp).\nPlease install dependencies: `poetry install` or `pip install aiohttp`.")
         return
 
-    feeds = get_feeds(mode, query, resolution)
+    from .search import build_feeds, run_search
+    feeds = build_feeds(mode, query, resolution, config, get_feeds)
+    fetch_timeout = config["sources"]["timeout"]
+    concurrency = config["sources"]["concurrency"]
+    try:
+        from .sources import set_rate_limit
+        set_rate_limit(config["rate_limits"]["requests_per_second"], config["rate_limits"]["burst"])
+    except Exception:
+        pass
+
+    async def _fetch_items():
+        if _use_helper(config):
+            from . import helper
+            items = await helper.search(config, mode, query, resolution, meta=(not no_meta), refresh=refresh)
+            if items is not None:
+                logger.info("Search served by the helper")
+                return items
+            helper.maybe_spawn(config)
+        from .sources import shared_session
+        from .cache import normalize_key
+        from . import feedplan
+        from .backfill import add_local
+        async with shared_session(concurrency=concurrency):
+            items = await run_search(feeds, fetch_all_feeds, config, resolve_magnets=(not no_meta),
+                                     planner=feedplan.from_config(config), key=normalize_key(mode, query, resolution))
+        # older releases from `anidl backfill` that the RSS window no longer covers
+        return await asyncio.get_running_loop().run_in_executor(None, add_local, items, query, mode, config)
 
     async def _run():
-        with console.status("Searching..."):
-            raw = await fetch_all_feeds(feeds, timeout=10, concurrency=8) if proxy is None else await fetch_all_feeds(feeds, timeout=10, concurrency=8)
+        from .cache import ResultCache, normalize_key
+        cache = ResultCache.from_config(config)
         try:
-            items = parse_feeds(raw, resolve_magnets=(not no_meta))
-        except Exception as e:
-            logger.exception("Failed to parse feeds: %s", e)
-            click.echo("Error parsing feed results.")
-            return
-
-        if not items:
-            click.echo("No results found.")
-            return
+            await _search(cache, normalize_key(mode, query, resolution))
+        finally:
+            # let a stale-while-revalidate refresh land in the cache before exiting
+            await cache.drain(timeout=fetch_timeout * 2)
 
+    def _show_results(items):
         # Build a rich table for display
         from rich import box
         table = Table(title=f"Search results for: {query}", box=box.MINIMAL)
@@ -140,57 +211,247 @@ def search(query, hentai, jav, resolution, download_dir, no_meta, notify, dry_ru
 
         console.print(table)
 
+    async def _search(cache, key):
+        with console.status("Searching..."):
+            try:
+                items, cached = await cache.get_or_fetch(key, _fetch_items, refresh=refresh)
+            except Exception as e:
+                logger.exception("Failed to parse feeds: %s", e)
+                click.echo("Error parsing feed results.")
+                return
+        if cached:
+            logger.info("Serving cached results for %r", query)
+        if (config["scrape"]["enabled"] if scrape is None else scrape) and items:
+            from .scrape import refresh_health
+            with console.status("Checking trackers..."):
+                try:
+                    # scrape copies so the cached items keep their feed order and seeder counts
+                    items = [dict(it) for it in items]
+                    await refresh_health(items, config)
+                except Exception as e:
+                    logger.warning("Tracker scrape failed: %s", e)
+
+        if not items:
+            click.echo("No results found.")
+            return
+
+        index = TitleIndex(items)
+        items = index.filter(**filter_spec)
+        if not items:
+            click.echo("No results match the filters.")
+            return
+        _show_results(items)
+
         if dry_run:
             click.echo("Dry run - skipping downloads.")
             return
 
-        sel = click.prompt("Enter indices (e.g. 1,2,5-7)", default="1")
+        # prompt off the loop so a background cache refresh keeps running meanwhile
+        while True:
+            sel = await asyncio.get_running_loop().run_in_executor(
+                None, lambda: click.prompt("Enter indices (e.g. 1,2,5-7), or /terms to narrow the list", default="1"))
+            if not sel.startswith("/"):
+                break
+            # narrowing re-filters the full result set in memory, never refetches
+            try:
+                narrowed = index.filter(**combine(filter_spec, parse_query(sel[1:])))
+            except (ValueError, re.error) as e:
+                click.echo(f"Invalid filter: {e}")
+                continue
+            if not narrowed:
+                click.echo("Nothing matches; keeping the current list.")
+                continue
+            items = narrowed
+            _show_results(items)
         indices = parse_selection(sel, len(items))
         selected = [items[i - 1] for i in indices]
         click.echo(f"Selected: {[s.get('title') for s in selected]}")
 
         # Add to aria2 and show progress (best-effort)
+        loop = asyncio.get_running_loop()
+        try:
+            from .rpc import connect
+            rpc = await connect(config)
+        except Exception as e:
+            logger.warning("aria2 JSON-RPC unavailable: %s", e)
+            rpc = None
         try:
-            from .downloader import add_torrent_or_magnet, download_with_progress
-            gids = []
-            for s in selected:
+            from .downloader import _aria2_api, reservation_lookup
+            from .parser import match_episode_files
+            from .journal import Journal
+            from . import scheduler as scheduler_mod
+            from . import admission as admission_mod
+            from .admission import release_size
+            api = await loop.run_in_executor(None, _aria2_api)
+            sched = scheduler_mod.from_config(api, config)
+            journal = Journal()
+            admission = admission_mod.from_config(config, download_dir)
+            if admission is not None and api is not None:
+                await loop.run_in_executor(None, admission.reservations.refresh, reservation_lookup(api))
+            if rpc is not None:
+                from . import async_downloader as adl
+                from .router import Router
+                if isinstance(rpc, Router):
+                    # nodes report their own free space; `[nodes] min_free` covers placement there
+                    admission = None
+
+                def _add(uri, select, target):
+                    return adl.add_torrent_or_magnet(rpc, uri, target, pause=False, max_connections=max_connections,
+                                                     verify=verify, select_files=select)
+
+                def _files(s):
+                    return adl.torrent_files(rpc, s)
+            else:
+                # no JSON-RPC endpoint: the blocking aria2p / one-off aria2c path, kept off the loop
+                from .downloader import add_torrent_or_magnet, torrent_files
+
+                def _add(uri, select, target):
+                    return loop.run_in_executor(None, lambda: add_torrent_or_magnet(
+                        uri, target, pause=False, max_connections=max_connections, verify=verify, select_files=select))
+
+                def _files(s):
+                    return loop.run_in_executor(None, torrent_files, s)
+
+            async def _queue_one(s):
+                select = None
+                if wanted_episodes:
+                    files = await _files(s)
+                    if files is None:
+                        click.echo(f"Could not read the file list of {s.get('title')}; adding the whole torrent.")
+                    elif len(files) > 1:
+                        select = match_episode_files(files, wanted_episodes)
+                        if not select:
+                            click.echo(f"No files for episodes {episodes} in {s.get('title')}; skipping.")
+                            return None
+                        click.echo(f"{s.get('title')}: fetching {len(select)} of {len(files)} files.")
+                uri = s.get("torrent_path") or s.get("torrent_url") or s.get("magnet") or ""
+                target, key = download_dir, f"pending:{id(s)}"
+                if admission is not None:
+                    # reserved before the first await below, so concurrent adds see each other's space
+                    target = admission.admit(key, s, download_dir, select)
+                    if target is None:
+                        admission.reservations.defer({"item": s, "uri": uri, "dir": str(download_dir), "select": select})
+                        click.echo(f"Not enough free space for {s.get('title')} "
+                                   f"({format_size(release_size(s, select))}); deferred, retry with `anidl queue admit`.")
+                        return None
+                    if target != download_dir.expanduser().absolute():
+                        click.echo(f"{s.get('title')}: downloading to {target}")
                 try:
-                    gid = add_torrent_or_magnet(
-                        s.get("torrent_url") or s.get("magnet") or "",
-                        download_dir,
-                        pause=False,
-                        max_connections=max_connections,
-                        verify=verify,
-                    )
-                    gids.append(gid)
+                    gid = await _add(uri, select, target)
                 except Exception as ex:
+                    if admission is not None:
+                        admission.release(key)
                     logger.exception("Failed to add to aria2: %s", ex)
                     click.echo(f"Failed to queue {s.get('title')}")
-
-            if gids:
-                download_with_progress(gids, download_dir)
-                for s in selected:
-                    append_history({"title": s.get("title"), "date": str(s.get("date")), "source": s.get("source")})
-                if notify:
-                    try:
-                        from .downloader import notify
-                        notify("anidl", f"Downloads queued: {len(gids)}")
-                    except Exception:
-                        pass
+                    return None
+                if admission is not None:
+                    admission.rekey(key, gid)
+                journal.record_add(gid, s, uri, target, {"select-file": ",".join(map(str, select))} if select else {})
+                if sched is not None:
+                    sched.set_priority(gid, scheduler_mod.priority_for(s))
+                return gid, s
+
+            # resolve and add the selected releases concurrently
+            added = [r for r in await asyncio.gather(*(_queue_one(s) for s in selected)) if r]
+            for gid, s in added:
+                append_history({"title": s.get("title"), "date": str(s.get("date")), "source": s.get("source")})
+
+            monitor = None
+            if rpc is not None:
+                def monitor(gids, on_complete):
+                    # called from the executor thread below; the polling itself runs on the loop
+                    asyncio.run_coroutine_threadsafe(adl.download_with_progress(
+                        rpc, gids, download_dir, scheduler=sched, on_complete=on_complete, journal=journal,
+                        fps=config["progress"]["fps"], max_rows=config["progress"]["max_rows"]), loop).result()
+            await loop.run_in_executor(None, lambda: _monitor_downloads(
+                config, journal, added, download_dir, notify, sched, monitor=monitor))
         except Exception as e:
             logger.exception("Download integration failed: %s", e)
+        finally:
+            if rpc is not None:
+                await rpc.close()
 
     asyncio.run(_run())
 
 
+def _monitor_downloads(config, journal, added, download_dir, notify_enabled=True, sched=None, monitor=None):
+    """Monitor new downloads plus any interrupted ones from the journal, then post-process.
+
+    `added` is a list of (gid, item) queued in this run. Unfinished journal entries are
+    reattached first so a crashed session continues where it stopped. `monitor(gids,
+    on_complete)` replaces the blocking `download_with_progress` loop when given.
+    """
+    from .downloader import download_with_progress, _aria2_api, notify as _notify
+    from .journal import reattach
+    from .admission import Reservations
+    from . import postprocess
+
+    by_gid = dict(added)
+    resubmit = []
+    reservations = Reservations()
+    try:
+        for e in reattach(journal, _aria2_api()):
+            if e["gid"] in by_gid:
+                continue
+            by_gid[e["gid"]] = e.get("item") or {}
+            if e.get("status") == "complete" and e.get("event"):
+                resubmit.append(dict(e["event"]))
+        resumed = len(by_gid) - len(added)
+        if resumed:
+            click.echo(f"Resuming {resumed} download(s) from a previous session.")
+
+        def _finished(ctx):
+            if ctx.get("done") is not None:
+                journal.set_post(ctx["gid"], "failed" if ctx.get("error") else "done", ctx.get("error"), ctx.get("files"))
+            if notify_enabled:
+                msg = f"Failed: {ctx.get('name')} ({ctx['error']})" if ctx.get("error") else f"Finished: {ctx.get('name')}"
+                _notify("anidl", msg)
+
+        pipeline = postprocess.from_config(config, on_done=_finished)
+
+        def _on_complete(event):
+            reservations.release(event["gid"])
+            journal.record_complete(event["gid"], event, post_pending=(pipeline is not None and event.get("status") == "complete"))
+            if event.get("status") != "complete":
+                logger.warning("Download %s ended with status %s", event.get("gid"), event.get("status"))
+                return
+            event["item"] = by_gid.get(event["gid"])
+            if pipeline is not None:
+                pipeline.submit(event)
+            else:
+                _finished(event)
+
+        gids = [g for g in by_gid if g not in {ev["gid"] for ev in resubmit}]
+        try:
+            for event in resubmit:
+                _on_complete(event)
+            if gids:
+                if sched is not None:
+                    sched.tick(force=True)
+                if monitor is not None:
+                    monitor(gids, _on_complete)
+                else:
+                    download_with_progress(gids, download_dir, scheduler=sched, on_complete=_on_complete, journal=journal,
+                                           fps=config["progress"]["fps"], max_rows=config["progress"]["max_rows"])
+        finally:
+            if pipeline is not None:
+                with console.status("Post-processing..."):
+                    pipeline.shutdown(wait=True)
+    finally:
+        journal.close()
+
+
 @cli.command()
 @click.option("--set", "sets", multiple=True, help="Set configuration values (key=value). Can be provided multiple times.")
 @click.option("--user", "user", default=None, help="Use a specific user profile for config (separate config dir).")
 def config(sets, user):
     """Show or modify config file location and defaults"""
-    cfg = load_config(user=user)
     # apply any sets
     if sets:
+        try:
+            cfg = load_raw(user=user)
+        except ConfigError as e:
+            raise click.ClickException(str(e))
         for s in sets:
             if "=" not in s:
                 click.echo(f"Invalid set value: {s}. Use key=value")
@@ -203,22 +464,55 @@ def config(sets, user):
                 if p not in cur or not isinstance(cur[p], dict):
                     cur[p] = {}
                 cur = cur[p]
-            # try to parse common booleans and numbers
-            if v.lower() in ("true", "false"):
-                val = v.lower() == "true"
-            else:
-                try:
-                    val = int(v)
-                except Exception:
-                    val = v
-            cur[parts[-1]] = val
-        save_config(cfg, user=user)
+            # parse according to the config schema (falls back to booleans and numbers)
+            try:
+                cur[parts[-1]] = parse_value(k, v)
+            except ConfigError as e:
+                raise click.ClickException(str(e))
+        try:
+            save_config(cfg, user=user)
+        except ConfigError as e:
+            raise click.ClickException(str(e))
         click.echo("Config updated.")
         return
 
+    cfg = _load_config(user=user)
     click.echo(json.dumps(cfg, indent=2))
 
 
+def _on_nodes(name, *args):
+    """Run `async_queue.<name>` across the `[nodes]` router; None when no nodes are configured."""
+    from . import router
+    cfg = _load_config()
+    if not cfg["nodes"]["endpoints"]:
+        return None
+
+    async def run():
+        from . import async_queue
+        r = router.from_config(cfg)
+        try:
+            return await getattr(async_queue, name)(r, *args)
+        finally:
+            await r.close()
+
+    return asyncio.run(run())
+
+
+def _on_helper(method, endpoint, json=None):
+    """Send a queue request to the background helper; None when it isn't running."""
+    cfg = _load_config()
+    if not _use_helper(cfg):
+        return None
+    try:
+        from . import helper
+    except ImportError:
+        return None
+    res = helper.call(method, endpoint, json=json)
+    if res is None:
+        helper.maybe_spawn(cfg)
+    return res
+
+
 @cli.group()
 def queue():
     """Manage aria2 queue: list, pause, resume, remove"""
@@ -227,35 +521,303 @@ def queue():
 
 @queue.command("list")
 def queue_list():
-    items = queue_mod.list_downloads()
+    items = _on_nodes("list_downloads")
+    if items is None:
+        res = _on_helper("GET", "/queue")
+        items = res["downloads"] if res and "downloads" in res else queue_mod.list_downloads()
     if not items:
         click.echo("No active downloads.")
         return
     for d in items:
+        # with [nodes] configured the gid is node-qualified (`node:gid`)
         click.echo(f"{d.get('gid')} - {d.get('name')} - {d.get('status')}")
 
 
 @queue.command("pause")
 @click.argument("gid")
 def queue_pause(gid):
-    ok = queue_mod.pause(gid)
+    ok = _on_nodes("pause", gid)
+    if ok is None:
+        res = _on_helper("POST", f"/queue/{gid}/pause")
+        ok = res["ok"] if res and "ok" in res else queue_mod.pause(gid)
     click.echo("Paused" if ok else "Failed to pause")
 
 
 @queue.command("resume")
 @click.argument("gid")
 def queue_resume(gid):
-    ok = queue_mod.resume(gid)
+    ok = _on_nodes("resume", gid)
+    if ok is None:
+        res = _on_helper("POST", f"/queue/{gid}/resume")
+        ok = res["ok"] if res and "ok" in res else queue_mod.resume(gid)
     click.echo("Resumed" if ok else "Failed to resume")
 
 
 @queue.command("remove")
 @click.argument("gid")
 def queue_remove(gid):
-    ok = queue_mod.remove(gid)
+    ok = _on_nodes("remove", gid)
+    if ok is None:
+        res = _on_helper("DELETE", f"/queue/{gid}")
+        ok = res["ok"] if res and "ok" in res else queue_mod.remove(gid)
+    if ok:
+        from .journal import Journal
+        from .admission import Reservations
+        journal = Journal()
+        journal.forget(gid)
+        journal.close()
+        Reservations().release(gid)
     click.echo("Removed" if ok else "Failed to remove")
 
 
+@queue.command("admit")
+def queue_admit():
+    """Queue deferred releases that now fit on disk."""
+    from .admission import Reservations, from_config, release_size
+    from .downloader import add_torrent_or_magnet, _aria2_api, reservation_lookup
+    from .journal import Journal
+    config = _load_config()
+    reservations = Reservations()
+    api = _aria2_api()
+    if api is not None:
+        reservations.refresh(reservation_lookup(api))
+    deferred = reservations.take_deferred()
+    if not deferred:
+        click.echo("Nothing deferred.")
+        return
+    journal = Journal()
+    try:
+        for entry in deferred:
+            item, select = entry.get("item") or {}, entry.get("select")
+            download_dir = Path(entry.get("dir") or config["defaults"]["download_dir"]).expanduser()
+            admission = from_config(config, download_dir)
+            key = f"pending:{id(entry)}"
+            target = admission.admit(key, item, download_dir, select) if admission is not None else download_dir
+            if target is None:
+                reservations.defer(entry)
+                click.echo(f"Still no room for {item.get('title')} ({format_size(release_size(item, select))}).")
+                continue
+            ensure_dir(target)
+            try:
+                gid = add_torrent_or_magnet(entry["uri"], target, select_files=select)
+            except Exception as e:
+                if admission is not None:
+                    admission.release(key)
+                reservations.defer(entry)
+                click.echo(f"Failed to queue {item.get('title')}: {e}")
+                continue
+            if admission is not None:
+                admission.rekey(key, gid)
+            journal.record_add(gid, item, entry["uri"], target,
+                               {"select-file": ",".join(map(str, select))} if select else {})
+            click.echo(f"Queued {item.get('title')} ({gid})")
+    finally:
+        journal.close()
+
+
+@queue.command("reattach")
+@click.option("--notify/--no-notify", default=True, help="Desktop notifications when downloads finish.")
+def queue_reattach(notify):
+    """Continue monitoring and post-processing downloads from an interrupted session."""
+    from .admission import Reservations
+    from .downloader import _aria2_api, reservation_lookup
+    from .journal import Journal
+    config = _load_config()
+    api = _aria2_api()
+    if api is not None:
+        # drop the space held for downloads aria2 finished or forgot while nobody was watching
+        Reservations().refresh(reservation_lookup(api))
+    journal = Journal()
+    if not journal.pending():
+        journal.close()
+        click.echo("Nothing to resume.")
+        return
+    _monitor_downloads(config, journal, [], Path(config["defaults"]["download_dir"]).expanduser(), notify)
+
+
+@queue.command("schedule")
+def queue_schedule():
+    """Apply the configured bandwidth windows to aria2 once (e.g. from cron)."""
+    from .downloader import _aria2_api
+    from . import scheduler as scheduler_mod
+    sched = scheduler_mod.from_config(_aria2_api(), _load_config())
+    if sched is None:
+        click.echo("Scheduler disabled or aria2 RPC unavailable.")
+        return
+    sched.observe()
+    opts = sched.apply()
+    sched.reorder()
+    click.echo(f"Download limit: {opts['max-overall-download-limit']} B/s, concurrent: {opts['max-concurrent-downloads']}")
+
+
+@cli.group()
+def daemon():
+    """Manage the anidl-owned aria2c RPC daemon: start, stop, status"""
+    pass
+
+
+@daemon.command("start")
+def daemon_start():
+    from . import daemon as daemon_mod
+    state = daemon_mod.ensure_running(_load_config())
+    if not state:
+        click.echo("Failed to start aria2c (is it installed and on PATH?). See ~/.anidl/aria2d.log")
+        return
+    click.echo(f"aria2c running (pid {state['pid']}, port {state['port']})")
+
+
+@daemon.command("stop")
+def daemon_stop():
+    from . import daemon as daemon_mod
+    ok = daemon_mod.stop()
+    click.echo("Stopped" if ok else "Not running")
+
+
+@daemon.command("status")
+def daemon_status():
+    from . import daemon as daemon_mod
+    state = daemon_mod.load_state()
+    if daemon_mod.is_running(state):
+        click.echo(f"aria2c running (pid {state['pid']}, port {state['port']})")
+    else:
+        click.echo("Not running")
+
+
+@cli.group()
+def helper():
+    """Background helper that keeps connections and caches warm: start, stop, status"""
+    pass
+
+
+def _helper_mod():
+    try:
+        from . import helper as helper_mod
+    except ImportError:
+        raise click.ClickException("The helper needs aiohttp: `poetry install` or `pip install aiohttp`.")
+    if not helper_mod.supported():
+        raise click.ClickException("The helper needs Unix domain sockets, which this platform lacks.")
+    return helper_mod
+
+
+@helper.command("start")
+def helper_start():
+    """Start the helper in the background."""
+    import time
+    helper_mod = _helper_mod()
+    if helper_mod.is_running():
+        click.echo("Helper already running.")
+        return
+    helper_mod.socket_path().parent.mkdir(parents=True, exist_ok=True)
+    pid = helper_mod.spawn()
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        if helper_mod.is_running():
+            click.echo(f"Helper running (pid {pid}, socket {helper_mod.socket_path()})")
+            return
+        time.sleep(0.1)
+    click.echo("Helper did not come up; see ~/.anidl/helper.log")
+
+
+@helper.command("run")
+@click.option("--idle-timeout", default=None, type=float, help="Exit after this many idle seconds (0 = never; default: [helper] idle_timeout).")
+@click.option("--verbose", is_flag=True, default=False, help="Enable verbose logging to the user log file (~/.anidl/anidl.log).")
+def helper_run(idle_timeout, verbose):
+    """Run the helper in the foreground."""
+    setup_logging(verbose)
+    helper_mod = _helper_mod()
+    if helper_mod.is_running():
+        click.echo("Helper already running.")
+        return
+    # fail fast on a broken config; the helper itself re-reads the file on every request
+    _load_config()
+    asyncio.run(helper_mod.run(idle_timeout=idle_timeout))
+
+
+@helper.command("stop")
+def helper_stop():
+    helper_mod = _helper_mod()
+    res = helper_mod.call("POST", "/helper/shutdown", timeout=5)
+    click.echo("Stopped" if res else "Not running")
+
+
+@helper.command("status")
+def helper_status():
+    helper_mod = _helper_mod()
+    res = helper_mod.call("GET", "/helper/status", timeout=5)
+    if not res:
+        click.echo("Not running")
+        return
+    click.echo(f"Helper running (pid {res['pid']}, idle {res['idle']}s of {res['idle_timeout']}s)")
+
+
+@cli.command()
+@click.option("--host", default="127.0.0.1", help="Interface to bind (default: localhost only).")
+@click.option("--port", default=8765, type=int, help="Port for the HTTP/JSON API.")
+@click.option("--verbose", is_flag=True, default=False, help="Enable verbose logging to the user log file (~/.anidl/anidl.log).")
+def serve(host, port, verbose):
+    """Run a local HTTP/JSON API for search, queue, history and live progress."""
+    setup_logging(verbose)
+    _load_config()
+    try:
+        from .server import serve as _serve, token_path
+    except Exception:
+        click.echo("Missing optional dependency required to serve (aiohttp).\nPlease install dependencies: `poetry install` or `pip install aiohttp`.")
+        return
+    click.echo(f"Serving anidl API on http://{host}:{port} (POST/DELETE need the token in {token_path()})")
+    _serve(host=host, port=port)
+
+
+@cli.command("backfill")
+@click.argument("query", nargs=1)
+@click.option("-h", "--hentai", is_flag=True, default=False, help="Backfill hentai releases.")
+@click.option("-j", "--jav", is_flag=True, default=False, help="Backfill JAV releases.")
+@click.option("--pages", default=None, type=int, help="Crawl at most this many result pages (default: [backfill] pages).")
+@click.option("--concurrency", default=None, type=int, help="Result pages fetched at once (default: [backfill] concurrency).")
+@click.option("--verbose", is_flag=True, default=False, help="Enable verbose logging to the user log file (~/.anidl/anidl.log).")
+def backfill_cmd(query, hentai, jav, pages, concurrency, verbose):
+    """Index older releases for QUERY from TokyoTosho search pages.
+
+    RSS only covers recent uploads; once backfilled, `search` also lists matching
+    releases from the local index (~/.anidl/index.db).
+    """
+    setup_logging(verbose)
+    config = _load_config()
+    mode = "jav" if jav else "hentai" if hentai else "anime"
+    try:
+        from .backfill import LocalIndex, crawl
+        from .sources import set_rate_limit
+    except ImportError:
+        click.echo("Missing optional dependency required to fetch pages (aiohttp).\nPlease install dependencies: `poetry install` or `pip install aiohttp`.")
+        return
+    set_rate_limit(config["rate_limits"]["requests_per_second"], config["rate_limits"]["burst"])
+    index = LocalIndex()
+    try:
+        with console.status("Backfilling..."):
+            stats = asyncio.run(crawl(index, query, mode, config, max_pages=pages, concurrency=concurrency))
+        resumed = f" (resumed from page {stats['resumed_from']})" if "resumed_from" in stats else ""
+        click.echo(f"Indexed {stats['new']} new of {stats['items']} releases from {stats['pages']} page(s){resumed}; "
+                   f"stopped: {stats['stopped']}. Index holds {index.count()} releases.")
+    finally:
+        index.close()
+
+
+@cli.command("feed-stats")
+def feed_stats():
+    """Show how many feed fetches the planner saved and what it learned per source."""
+    from . import feedplan
+    planner = feedplan.from_config(_load_config())
+    if planner is None:
+        click.echo("Feed planner disabled ([planner] enabled = false).")
+        return
+    m = planner.stats.metrics
+    saved = 100.0 * m["skipped"] / m["planned"] if m["planned"] else 0.0
+    click.echo(f"Searches: {m['searches']}, feeds planned: {m['planned']}, fetched: {m['fetched']}, "
+               f"skipped: {m['skipped']} ({saved:.1f}% saved), truncated broad pages: {m['truncated']}")
+    for source, s in sorted(planner.stats.sources.items()):
+        overlap = 100.0 * s["covered"] / s["seen"] if s["seen"] else 100.0
+        click.echo(f"  {source}: {overlap:.1f}% in the broad feed over {s['samples']} searches")
+
+
 @cli.command()
 @click.option("--limit", default=50, help="Number of history entries to show")
 def history(limit):
@@ -1,28 +1,312 @@
-import toml
+"""Typed, cached access to `~/.anidl/config.toml`.
+
+`load_config()` returns the file merged over the schema defaults, with
+`ANIDL_<SECTION>__<KEY>` environment overrides applied on top. The parsed file
+is cached in memory and only re-read when its mtime or size changes, so
+long-running modes can call it on every iteration to pick up edits.
+"""
+import copy
+import json
+import logging
+import os
 from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import tomllib
+except ImportError:  # Python 3.10
+    tomllib = None
+
+logger = logging.getLogger(__name__)
+
+
+class ConfigError(ValueError):
+    """The config file is unreadable or does not match the schema."""
+
+
+# section -> key -> (accepted types, default[, limits]); limits are an inclusive
+# (min, max) range with None for an open end, or a set of allowed values
+SCHEMA: Dict[str, Dict[str, tuple]] = {
+    "defaults": {
+        "download_dir": ((str,), "./downloads"),
+        "resolution": ((str,), ""),
+        "notify": ((bool,), True),
+        "max_connections": ((int,), 16, (1, 16)),
+    },
+    "sources": {
+        "timeout": ((int,), 10, (1, None)),
+        "concurrency": ((int,), 8, (1, None)),
+        "custom_feeds": ((list,), []),
+    },
+    "rate_limits": {
+        "requests_per_second": ((int, float), 0, (0, None)),  # 0 = unlimited
+        "burst": ((int,), 4, (1, None)),
+    },
+    "cache": {
+        "results_ttl": ((int,), 900, (0, None)),
+        "results_refresh_after": ((int,), 60, (0, None)),
+        "results_max_entries": ((int,), 200, (1, None)),
+    },
+    "scrape": {
+        "enabled": ((bool,), False),
+        "timeout": ((int, float), 3.0, (0.1, None)),
+        "ttl": ((int,), 1800, (0, None)),
+        "trackers": ((list,), ["udp://tracker.opentrackr.org:1337/announce", "udp://open.stealth.si:80/announce"]),
+    },
+    "watch": {
+        "interval": ((int,), 1800, (1, None)),
+        "rules": ((list,), []),
+    },
+    "scheduler": {
+        "enabled": ((bool,), False),
+        "min_speed": ((str, int), "50K"),
+        "interval": ((int, float), 5.0, (0.1, None)),
+        "windows": ((list,), []),
+    },
+    "daemon": {
+        "enabled": ((bool,), True),
+        "port": ((int,), 16800, (1, 65535)),
+        "aria2c": ((str,), ""),
+    },
+    "backfill": {
+        "url": ((str,), "https://www.tokyotosho.info/search.php?terms={query}&type={type}&page={page}"),
+        "pages": ((int,), 50, (1, None)),
+        "concurrency": ((int,), 4, (1, None)),
+        "stop_ratio": ((int, float), 0.8, (0, 1)),
+        "local_results": ((bool,), True),
+        "max_local": ((int,), 200, (0, None)),
+    },
+    "progress": {
+        "fps": ((int, float), 4, (0.1, None)),
+        "max_rows": ((int,), 10, (1, None)),
+    },
+    "planner": {
+        "enabled": ((bool,), True),
+        "min_samples": ((int,), 3, (1, None)),
+        "min_overlap": ((int, float), 0.98, (0, 1)),
+        "recheck_every": ((int,), 20, (0, None)),
+    },
+    "helper": {
+        "enabled": ((bool,), True),
+        "auto_spawn": ((bool,), False),
+        "idle_timeout": ((int, float), 600, (0, None)),
+    },
+    "admission": {
+        "enabled": ((bool,), True),
+        "volumes": ((list,), []),
+        "headroom": ((str, int), "1G"),
+        "strategy": ((str,), "first-fit", {"first-fit", "most-free"}),
+    },
+    "logging": {
+        "max_bytes": ((int,), 5 * 1024 * 1024, (0, None)),
+        "backups": ((int,), 5, (0, None)),
+        "json": ((bool,), False),
+        "sample_interval": ((int, float), 5.0, (0, None)),
+    },
+    "nodes": {
+        "endpoints": ((list,), []),
+        "placement": ((str,), "least-loaded", {"least-loaded", "hash"}),
+        "min_free": ((str, int), "1G"),
+    },
+    "postprocess": {
+        "enabled": ((bool,), False),
+        "workers": ((int,), 2, (1, None)),
+        "steps": ((list,), ["verify", "move", "rename", "hook"]),
+        "library_dir": ((str,), ""),
+        "rename_template": ((str,), ""),
+        "hook": ((str,), ""),
+        "hook_timeout": ((int, float), 300, (1, None)),
+    },
+}
+
+# schemas for tables inside arrays, keyed by "section.key"
+ITEM_SCHEMA: Dict[str, Dict[str, tuple]] = {
+    "scheduler.windows": {"start": (str,), "end": (str,), "max_download_limit": (str, int), "max_concurrent": (int,)},
+    "nodes.endpoints": {"name": (str,), "url": (str,), "secret": (str,), "weight": (int, float), "download_dir": (str,)},
+    "watch.rules": {"query": (str,), "mode": (str,), "resolution": (str,), "uploader": (str,)},
+}
+
+ENV_PREFIX = "ANIDL_"
+
+# path -> (mtime_ns, size, parsed)
+_cache: Dict[Path, Tuple[int, int, dict]] = {}
 
 
-def _config_path(user: str | None = None) -> Path:
+def _config_path(user: Optional[str] = None) -> Path:
     if user:
         d = Path.home() / f".anidl-{user}"
     else:
         d = Path.home() / ".anidl"
-    d.mkdir(parents=True, exist_ok=True)
     return d / "config.toml"
 
 
+def _type_ok(value, types: tuple) -> bool:
+    # bool is an int subclass; don't let `true` pass as a number or vice versa
+    if isinstance(value, bool):
+        return bool in types
+    if float in types and isinstance(value, int):
+        return True
+    return isinstance(value, types)
+
+
+def _names(types: tuple) -> str:
+    return " or ".join(t.__name__ for t in types)
+
+
+def _check_limits(name: str, value, spec: tuple):
+    if len(spec) < 3:
+        return
+    limits = spec[2]
+    if isinstance(limits, set):
+        if value not in limits:
+            raise ConfigError(f"{name}: must be one of {', '.join(sorted(limits))}, got {value!r}")
+        return
+    lo, hi = limits
+    if (lo is not None and value < lo) or (hi is not None and value > hi):
+        bound = f"between {lo} and {hi}" if lo is not None and hi is not None else f">= {lo}" if lo is not None else f"<= {hi}"
+        raise ConfigError(f"{name}: must be {bound}, got {value!r}")
+
+
+def validate(cfg: dict) -> dict:
+    """Raise ConfigError describing the first schema violation; returns cfg."""
+    for section, values in cfg.items():
+        if section not in SCHEMA:
+            logger.warning("Unknown config section [%s]", section)
+            continue
+        if not isinstance(values, dict):
+            raise ConfigError(f"[{section}] must be a table, got {type(values).__name__}")
+        for key, value in values.items():
+            spec = SCHEMA[section].get(key)
+            if spec is None:
+                logger.warning("Unknown config key %s.%s", section, key)
+                continue
+            if not _type_ok(value, spec[0]):
+                raise ConfigError(f"{section}.{key}: expected {_names(spec[0])}, got {type(value).__name__} ({value!r})")
+            _check_limits(f"{section}.{key}", value, spec)
+            item_spec = ITEM_SCHEMA.get(f"{section}.{key}")
+            if item_spec:
+                for i, entry in enumerate(value):
+                    if not isinstance(entry, dict):
+                        raise ConfigError(f"{section}.{key}[{i}]: expected a table, got {type(entry).__name__}")
+                    for k, v in entry.items():
+                        if k in item_spec and not _type_ok(v, item_spec[k]):
+                            raise ConfigError(f"{section}.{key}[{i}].{k}: expected {_names(item_spec[k])}, got {type(v).__name__} ({v!r})")
+    return cfg
+
+
+def defaults() -> dict:
+    return {section: {k: copy.deepcopy(v[1]) for k, v in keys.items()} for section, keys in SCHEMA.items()}
+
+
+def _merge(base: dict, override: dict) -> dict:
+    for k, v in override.items():
+        if isinstance(v, dict) and isinstance(base.get(k), dict):
+            _merge(base[k], v)
+        else:
+            base[k] = copy.deepcopy(v)
+    return base
+
+
+def _coerce(raw: str, types: tuple, name: str):
+    try:
+        if bool in types:
+            if raw.lower() in ("1", "true", "yes", "on"):
+                return True
+            if raw.lower() in ("0", "false", "no", "off"):
+                return False
+            raise ValueError(raw)
+        if list in types:
+            return json.loads(raw) if raw.startswith("[") else [p.strip() for p in raw.split(",") if p.strip()]
+        if int in types:
+            try:
+                return int(raw)
+            except ValueError:
+                if float in types:
+                    return float(raw)
+                if str in types:
+                    return raw
+                raise
+        if float in types:
+            return float(raw)
+    except ValueError:
+        raise ConfigError(f"{name}: cannot interpret {raw!r} as {_names(types)}") from None
+    return raw
+
+
+def parse_value(path: str, raw: str):
+    """Interpret a CLI `key=value` string using the schema type for dotted `path` when known."""
+    section, _, key = path.partition(".")
+    spec = SCHEMA.get(section, {}).get(key)
+    if spec is not None and "." not in key:
+        return _coerce(raw, spec[0], path)
+    if raw.lower() in ("true", "false"):
+        return raw.lower() == "true"
+    try:
+        return int(raw)
+    except ValueError:
+        return raw
+
+
+def env_overrides(environ=None) -> dict:
+    """Collect `ANIDL_<SECTION>__<KEY>=value` overrides, coerced to the schema types."""
+    environ = os.environ if environ is None else environ
+    out: Dict[str, dict] = {}
+    for name, raw in environ.items():
+        if not name.startswith(ENV_PREFIX) or "__" not in name:
+            continue
+        section, _, key = name[len(ENV_PREFIX):].lower().partition("__")
+        spec = SCHEMA.get(section, {}).get(key)
+        if spec is None:
+            continue
+        value = _coerce(raw, spec[0], name)
+        _check_limits(name, value, spec)
+        out.setdefault(section, {})[key] = value
+    return out
+
+
+def _parse(p: Path) -> dict:
+    text = p.read_text(encoding="utf-8")
+    try:
+        if tomllib is not None:
+            return tomllib.loads(text)
+        import toml
+        return toml.loads(text)
+    except Exception as e:
+        raise ConfigError(f"Cannot parse {p}: {e}") from e
+
+
+def load_raw(user: Optional[str] = None) -> dict:
+    """The validated contents of the config file alone (no defaults or env), cached by mtime."""
+    p = _config_path(user)
+    try:
+        st = p.stat()
+    except FileNotFoundError:
+        _cache.pop(p, None)
+        return {}
+    hit = _cache.get(p)
+    if hit and hit[0] == st.st_mtime_ns and hit[1] == st.st_size:
+        return copy.deepcopy(hit[2])
+    parsed = validate(_parse(p))
+    _cache[p] = (st.st_mtime_ns, st.st_size, parsed)
+    return copy.deepcopy(parsed)
+
+
 def load_config(user: str | None = None) -> dict:
+    """Effective config: schema defaults < config file < environment. Raises ConfigError."""
     p = _config_path(user)
     if not p.exists():
-        default = {"defaults": {"download_dir": "./downloads", "resolution": "", "notify": True}}
-        save_config(default, user=user)
-        return default
-    try:
-        return toml.loads(p.read_text(encoding="utf-8"))
-    except Exception:
-        return {"defaults": {"download_dir": "./downloads", "resolution": "", "notify": True}}
+        save_config({"defaults": {"download_dir": "./downloads", "resolution": "", "notify": True}}, user=user)
+    cfg = _merge(defaults(), load_raw(user))
+    return _merge(cfg, env_overrides())
 
 
 def save_config(cfg: dict, user: str | None = None):
+    import toml
+
+    validate(cfg)
     p = _config_path(user)
-    p.write_text(toml.dumps(cfg), encoding="utf-8")
+    p.parent.mkdir(parents=True, exist_ok=True)
+    tmp = p.with_suffix(".tmp")
+    tmp.write_text(toml.dumps(cfg), encoding="utf-8")
+    tmp.replace(p)
+    _cache.pop(p, None)
@@ -0,0 +1,198 @@
+"""Start and supervise a single aria2c RPC daemon owned by anidl.
+
+All downloads go through this one process, so there is one DHT, one peer pool
+and one session file instead of an unmanaged `aria2c` per URI. The pid, port
+and RPC secret are kept in `~/.anidl/aria2d.json` so later invocations can
+reattach to the same daemon. The secret reaches aria2c through an owner-only
+`--conf-path` file rather than argv, where any local user could read it.
+"""
+from pathlib import Path
+from typing import List, Optional
+import json
+import logging
+import os
+import secrets
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 16800  # not 6800, so we don't collide with a user-run aria2
+
+
+def _anidl_dir() -> Path:
+    d = Path.home() / ".anidl"
+    d.mkdir(parents=True, exist_ok=True)
+    return d
+
+
+def _state_path() -> Path:
+    return _anidl_dir() / "aria2d.json"
+
+
+def session_path() -> Path:
+    return _anidl_dir() / "aria2.session"
+
+
+def conf_path() -> Path:
+    return _anidl_dir() / "aria2d.conf"
+
+
+def _write_private(path: Path, text: str):
+    # create the file 0600 from the start, then swap it in atomically
+    tmp = path.with_name(path.name + ".tmp")
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def load_state() -> Optional[dict]:
+    p = _state_path()
+    if not p.exists():
+        return None
+    try:
+        return json.loads(p.read_text(encoding="utf-8"))
+    except Exception:
+        return None
+
+
+def _port_open(host: str, port: int, timeout: float = 0.5) -> bool:
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+def _pid_alive(pid: int) -> bool:
+    if sys.platform == "win32":
+        # os.kill(pid, 0) terminates the process on Windows; rely on the port check instead
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def is_running(state: Optional[dict] = None) -> bool:
+    state = state if state is not None else load_state()
+    if not state:
+        return False
+    return _pid_alive(int(state.get("pid", 0))) and _port_open(state.get("host", DEFAULT_HOST), int(state["port"]))
+
+
+def build_args(aria2c: str, port: int, conf: Path, session: Path) -> List[str]:
+    d = _anidl_dir()
+    return [
+        aria2c,
+        f"--conf-path={conf}",
+        "--enable-rpc",
+        f"--rpc-listen-port={port}",
+        "--rpc-listen-all=false",
+        f"--input-file={session}",
+        f"--save-session={session}",
+        "--save-session-interval=30",
+        "--enable-dht=true",
+        f"--dht-file-path={d / 'dht.dat'}",
+        "--continue=true",
+    ]
+
+
+def start(port: int = DEFAULT_PORT, aria2c: Optional[str] = None, wait: float = 5.0) -> Optional[dict]:
+    """Launch aria2c with RPC enabled and wait for the RPC port. Returns the saved state."""
+    aria2c = aria2c or shutil.which("aria2c")
+    if not aria2c:
+        return None
+    session = session_path()
+    # --input-file refuses to start when the file is missing
+    session.touch(exist_ok=True)
+    secret = secrets.token_hex(16)
+    conf = conf_path()
+    _write_private(conf, f"rpc-secret={secret}\n")
+    log = open(_anidl_dir() / "aria2d.log", "ab")
+    kwargs = {"stdout": log, "stderr": subprocess.STDOUT, "stdin": subprocess.DEVNULL}
+    if sys.platform == "win32":
+        kwargs["creationflags"] = getattr(subprocess, "CREATE_NEW_PROCESS_GROUP", 0)
+    else:
+        kwargs["start_new_session"] = True
+    try:
+        proc = subprocess.Popen(build_args(aria2c, port, conf, session), **kwargs)
+    finally:
+        log.close()
+    state = {"pid": proc.pid, "host": DEFAULT_HOST, "port": port, "secret": secret}
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            logger.error("aria2c exited during startup with code %s", proc.returncode)
+            return None
+        if _port_open(DEFAULT_HOST, port):
+            _write_private(_state_path(), json.dumps(state))
+            logger.info("Started aria2c daemon pid=%s port=%s", proc.pid, port)
+            return state
+        time.sleep(0.1)
+    logger.error("aria2c did not open RPC port %s within %.1fs", port, wait)
+    proc.terminate()
+    return None
+
+
+def ensure_running(cfg: Optional[dict] = None) -> Optional[dict]:
+    """Return the state of a live managed daemon, (re)starting it when needed."""
+    state = load_state()
+    if is_running(state):
+        return state
+    dc = (cfg or {}).get("daemon", {})
+    if not dc.get("enabled", True):
+        return None
+    return start(port=int(dc.get("port", DEFAULT_PORT)), aria2c=dc.get("aria2c"))
+
+
+def client_kwargs(state: Optional[dict] = None) -> Optional[dict]:
+    """Connection kwargs for aria2p.Client pointing at the managed daemon."""
+    state = state if state is not None else load_state()
+    if not state:
+        return None
+    return {"host": f"http://{state.get('host', DEFAULT_HOST)}", "port": int(state["port"]), "secret": state.get("secret", "")}
+
+
+def stop(timeout: float = 10.0) -> bool:
+    """Shut the daemon down (saving its session) and forget its state."""
+    state = load_state()
+    if not state:
+        return False
+    pid = int(state.get("pid", 0))
+    stopped = False
+    try:
+        import aria2p
+        aria2p.Client(**client_kwargs(state)).shutdown()
+        stopped = True
+    except Exception:
+        pass
+    if not stopped and pid:
+        try:
+            os.kill(pid, signal.SIGTERM)
+            stopped = True
+        except OSError:
+            pass
+    deadline = time.monotonic() + timeout
+    while pid and sys.platform != "win32" and _pid_alive(pid) and time.monotonic() < deadline:
+        try:
+            # reap if it is our child, otherwise just wait for it to go away
+            os.waitpid(pid, os.WNOHANG)
+        except ChildProcessError:
+            pass
+        time.sleep(0.1)
+    for path in (_state_path(), conf_path()):
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+    return stopped
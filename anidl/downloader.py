@@ -1,28 +1,35 @@
 from pathlib import Path
-from typing import Optional, Dict
+from typing import Optional, Dict, List
+import base64
+import logging
 import subprocess
 import shutil
 import time
 import threading
 
+from .torrents import TorrentCache, magnet_infohash
+
 try:
     import aria2p
 except Exception:
     aria2p = None
 
+logger = logging.getLogger(__name__)
+
 try:
     from plyer import notification
 except Exception:
     notification = None
 
-try:
-    from rich.progress import Progress, TextColumn, BarColumn, TimeRemainingColumn, TransferSpeedColumn
-except Exception:
-    Progress = None
+from .progress import Renderer, Snapshot
 
 
 def _aria2_api():
-    """Return an aria2p.API instance or None if aria2p is not available or connection fails."""
+    """Return an aria2p.API instance or None if aria2p is not available or connection fails.
+
+    A user-run aria2 on the default port wins; otherwise the anidl-managed daemon is used
+    when its state file says one is running.
+    """
     if aria2p is None:
         return None
     try:
@@ -32,35 +39,89 @@ def _aria2_api():
         _ = api.get_version()
         return api
     except Exception:
+        pass
+    from . import daemon
+    kwargs = daemon.client_kwargs()
+    if kwargs:
         try:
-            # older aria2p
-            session = aria2p.Session()
-            api = aria2p.API(session)
+            api = aria2p.API(aria2p.Client(**kwargs))
+            _ = api.get_version()
             return api
         except Exception:
+            pass
+    try:
+        # older aria2p
+        session = aria2p.Session()
+        api = aria2p.API(session)
+        return api
+    except Exception:
+        return None
+
+
+def _local_torrent(uri) -> Optional[bytes]:
+    """Return .torrent bytes for a local path or a magnet whose torrent is cached."""
+    if not isinstance(uri, str):
+        return None
+    if uri.startswith("magnet:"):
+        return TorrentCache().get(magnet_infohash(uri))
+    if uri.endswith(".torrent") and "://" not in uri:
+        try:
+            return Path(uri).read_bytes()
+        except OSError:
             return None
+    return None
 
 
-def add_torrent_or_magnet(uri: str, download_dir: Path, pause: bool = False, max_connections: int = 16, verify: bool = True) -> str:
+def add_options(download_dir: Path, pause: bool = False, max_connections: int = 16, verify: bool = True,
+                select_files: Optional[List[int]] = None) -> Dict[str, str]:
+    """aria2 options for a new download (shared by the sync and async add paths)."""
+    opts = {"dir": str(download_dir)}
+    if pause:
+        opts["pause"] = "true"
+    # include max connections and integrity check options if provided
+    try:
+        opts["max-connection-per-server"] = str(int(max_connections))
+    except Exception:
+        pass
+    if verify:
+        opts["check-integrity"] = "true"
+    else:
+        opts["check-integrity"] = "false"
+    if select_files:
+        opts["select-file"] = ",".join(str(i) for i in select_files)
+        opts["bt-prioritize-piece"] = "head,tail"
+    return opts
+
+
+def add_torrent_or_magnet(uri: str, download_dir: Path, pause: bool = False, max_connections: int = 16, verify: bool = True,
+                          select_files: Optional[List[int]] = None) -> str:
     """Add a torrent file URL or magnet to aria2 (via aria2p) or fallback to subprocess aria2c.
 
+    `uri` may also be a local .torrent path (e.g. from the torrent cache); cached torrents are
+    sent with addTorrent instead of the URL or magnet.
+    `select_files` (1-based indices into the torrent's file list) restricts a batch torrent to
+    those files, with their first/last pieces fetched first so they become playable early.
+    When no aria2 RPC is reachable the managed daemon (see `daemon.py`) is started first.
     Returns a gid string (if aria2p) or a generated id for subprocess.
     """
     api = _aria2_api()
+    if api is None and aria2p is not None:
+        # no RPC reachable: start (or restart) the managed daemon and route through it
+        from . import daemon
+        from .config import load_config, ConfigError
+        try:
+            cfg = load_config()
+        except ConfigError:
+            cfg = {}
+        if daemon.ensure_running(cfg):
+            api = _aria2_api()
     if api:
         try:
-            opts = {"dir": str(download_dir)}
-            if pause:
-                opts["pause"] = "true"
-            # include max connections and integrity check options if provided
-            try:
-                opts["max-connection-per-server"] = str(int(max_connections))
-            except Exception:
-                pass
-            if verify:
-                opts["check-integrity"] = "true"
-            else:
-                opts["check-integrity"] = "false"
+            opts = add_options(download_dir, pause, max_connections, verify, select_files)
+            torrent = _local_torrent(uri)
+            if torrent is not None:
+                # hand the metainfo over directly; aria2 needs no HTTP fetch or DHT lookup
+                return api.client.add_torrent(base64.b64encode(torrent).decode("ascii"), [], opts)
             # aria2p API may accept add_uris
             g = api.add(uri if isinstance(uri, list) else [uri], options=opts)
             # g may be a Download object or list; return a string gid
@@ -72,12 +133,14 @@ def add_torrent_or_magnet(uri: str, download_dir: Path, pause: bool = False, max
         except Exception:
             pass
 
-    # Fallback: call aria2c CLI to start download
+    # Last resort: a one-off aria2c that nothing tracks (no RPC client library installed)
     aria2c = shutil.which("aria2c")
     if aria2c:
         args = [aria2c, str(uri), f"--dir={str(download_dir)}"]
         if pause:
             args.append("--pause")
+        if select_files:
+            args.append("--select-file=" + ",".join(str(i) for i in select_files))
         proc = subprocess.Popen(args)
         return f"subproc-{proc.pid}"
 
@@ -87,14 +150,21 @@ def add_torrent_or_magnet(uri: str, download_dir: Path, pause: bool = False, max
 def resolve_magnet(uri: str, download_dir: Optional[Path] = None, timeout: int = 10) -> Optional[Dict]:
     """Try to add magnet in paused state to fetch metadata, then return basic metadata.
 
-    This requires aria2 RPC to be running. If aria2p is not available, return None.
+    Magnets whose torrent is already in the local cache are answered without aria2.
+    Otherwise this requires aria2 RPC to be running. If aria2p is not available, return None.
     """
+    cache = TorrentCache()
+    cached = cache.info(magnet_infohash(uri))
+    if cached:
+        return {"title": cached["name"], "size": cached["size"], "files": cached["files"]}
     api = _aria2_api()
     if not api:
         return None
     try:
-        # add the magnet paused so metadata can be fetched
-        opts = {"pause": "true"}
+        # add the magnet paused so metadata can be fetched; aria2 saves it as
+        # <infohash>.torrent into the cache dir so the next lookup is local
+        cache.root.mkdir(parents=True, exist_ok=True)
+        opts = {"pause": "true", "bt-save-metadata": "true", "dir": str(cache.root)}
         gid = api.add([uri], options=opts).gid
         # poll for metadata (limited time)
         waited = 0
@@ -120,6 +190,28 @@ def resolve_magnet(uri: str, download_dir: Optional[Path] = None, timeout: int =
         return None
 
 
+def torrent_files(item: Dict, timeout: int = 30) -> Optional[List[Dict]]:
+    """File list for a release, from its prefetched metadata, the torrent cache or aria2.
+
+    Magnets not yet cached are resolved through aria2, which saves their metadata into the
+    cache; the item is then annotated so it is added via addTorrent.
+    """
+    if item.get("files"):
+        return item["files"]
+    cache = TorrentCache()
+    url = item.get("torrent_url") or ""
+    ih = item.get("infohash") or magnet_infohash(url)
+    meta = cache.info(ih)
+    if meta is None and url.startswith("magnet:"):
+        resolve_magnet(url, timeout=timeout)
+        meta = cache.info(ih)
+    if meta is None:
+        return None
+    from .torrents import annotate
+    annotate(item, meta, cache)
+    return meta["files"]
+
+
 def notify(title: str, message: str):
     if notification is None:
         return
@@ -129,42 +221,106 @@ def notify(title: str, message: str):
         return
 
 
-def download_with_progress(gids: list, download_dir: Path):
-    """Monitor downloads via aria2p and show progress using rich.Progress.
+def reservation_lookup(api):
+    """`admission.Reservations.refresh` lookup backed by an aria2p API (follows metadata downloads)."""
+    def lookup(gid: str) -> Optional[Dict]:
+        try:
+            dl = api.get_download(gid)
+            followers = getattr(dl, "followed_by_ids", None)
+            if getattr(dl, "status", None) == "complete" and followers:
+                dl = api.get_download(followers[0])
+        except Exception:
+            return None
+        return {
+            "status": getattr(dl, "status", None),
+            "completed": getattr(dl, "completed_length", 0) or 0,
+            "files": [str(f.path) for f in getattr(dl, "files", []) or [] if getattr(f, "selected", True)],
+        }
+    return lookup
+
 
-    This function is best-effort: if rich or aria2p are not available it will return immediately.
+def completion_event(dl) -> Dict:
+    """Describe a finished aria2p Download for post-processing and notifications.
+
+    `selected` lists the 1-based torrent file indices that were downloaded (`--select-file`),
+    or is None when every file was.
+    """
+    files = []
+    all_files = getattr(dl, "files", []) or []
+    for f in all_files:
+        if getattr(f, "selected", True) and str(getattr(f, "path", "")):
+            files.append(str(f.path))
+    selected = [int(getattr(f, "index", i + 1)) for i, f in enumerate(all_files) if getattr(f, "selected", True)]
+    return {
+        "gid": dl.gid,
+        "name": getattr(dl, "name", dl.gid),
+        "status": getattr(dl, "status", None),
+        "dir": str(getattr(dl, "dir", "")),
+        "files": files,
+        "selected": selected if len(selected) < len(all_files) else None,
+        "infohash": getattr(dl, "info_hash", None),
+    }
+
+
+def download_with_progress(gids: list, download_dir: Path, scheduler=None, on_complete=None, journal=None,
+                           fps: float = 4, max_rows: int = 10):
+    """Monitor downloads via aria2p and show progress (see `progress.Renderer`).
+
+    This function is best-effort: if aria2p is not available it will return immediately.
+    When a `scheduler.Scheduler` is given it is ticked from the polling loop. `on_complete` is
+    called once per gid with `completion_event(dl)` when it reaches complete/error/removed;
+    it should hand heavy work off (see `postprocess.Pipeline`) rather than block the loop.
+    Progress snapshots go to `journal` (a `journal.Journal`, which coalesces the writes).
+    The loop only records stats; the display redraws `fps` times a second on its own thread.
+    A magnet's metadata download is replaced by its follower (`followed_by_ids`), which is
+    tracked under the original gid; only the follower's completion is reported.
     """
     api = _aria2_api()
-    if api is None or Progress is None:
+    if api is None:
         return
 
+    snapshot = Snapshot()
     # This function runs a simple loop that polls downloads until they finish
-    with Progress(
-        "{task.description}",
-        TextColumn("{task.fields[title]}", justify="left"),
-        BarColumn(),
-        TransferSpeedColumn(),
-        TimeRemainingColumn(),
-    ) as progress:
-        tasks = {}
+    with Renderer(snapshot, fps=fps, max_rows=max_rows):
+        # aria2 gid currently polled -> gid the caller knows
+        watching = {g: g for g in gids}
         running = True
         while running:
             running = False
-            for gid in gids:
+            for cur, gid in list(watching.items()):
                 try:
-                    dl = api.get_download(gid)
+                    dl = api.get_download(cur)
                 except Exception:
                     continue
-                running = True
+                status = getattr(dl, "status", None)
+                followers = getattr(dl, "followed_by_ids", None)
+                if status == "complete" and followers:
+                    del watching[cur]
+                    watching[followers[0]] = gid
+                    running = True
+                    continue
                 total = getattr(dl, "total_length", 0) or None
                 completed = getattr(dl, "completed_length", 0) or 0
                 speed = getattr(dl, "download_speed", 0) or 0
                 title = getattr(dl, "name", gid)
-                if gid not in tasks:
-                    task_id = progress.add_task("download", total=total, title=title)
-                    tasks[gid] = task_id
-                else:
-                    task_id = tasks[gid]
-                progress.update(task_id, completed=completed)
-            time.sleep(0.5)
-
+                snapshot.update(gid, title, total, completed, speed, status)
+                if journal is not None:
+                    journal.update_progress(gid, completed, total or 0, status)
+                logger.debug("Progress %s %d/%d", gid, completed, total or 0,
+                             extra={"stage": "download", "gid": gid, "completed": completed, "total": total or 0,
+                                    "speed": speed, "sample": f"progress:{gid}"})
+                if status in ("complete", "error", "removed"):
+                    del watching[cur]
+                    if on_complete is not None:
+                        event = completion_event(dl)
+                        event["gid"] = gid
+                        try:
+                            on_complete(event)
+                        except Exception:
+                            pass
+                    continue
+                running = True
+            if scheduler is not None:
+                scheduler.tick()
+            if running:
+                time.sleep(0.5)
@@ -0,0 +1,183 @@
+"""Decide which feed URLs a search actually fetches.
+
+In anime mode `get_feeds` asks TokyoTosho three times for the same terms: once
+per trusted uploader (`submitter=`) and once unfiltered. Unless the unfiltered
+page came back full, the uploader feeds are subsets of it. `FeedPlanner` keeps
+overlap statistics per query and per source in `~/.anidl/cache/feedplan.json`
+and fetches a narrowed feed only while its items haven't reliably shown up in
+the broad one, or when the broad page was truncated. Narrowed feeds it still
+needs go out together with the broad feed, so only the truncated case costs a
+second round trip. The same file counts planned, fetched and skipped feeds.
+"""
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+import json
+import logging
+import time
+import urllib.parse
+import xml.etree.ElementTree as ET
+
+logger = logging.getLogger(__name__)
+
+# query parameter that narrows a feed to one uploader
+NARROW_PARAM = "submitter"
+# per-query overlap records kept (least recently used dropped first)
+MAX_QUERIES = 500
+
+
+def split_feed(url: str) -> Tuple[str, str]:
+    """(broad feed URL, source) for a feed; source is "" for a broad feed."""
+    u = urllib.parse.urlsplit(url)
+    params = urllib.parse.parse_qsl(u.query, keep_blank_values=True)
+    source = ",".join(v for k, v in params if k == NARROW_PARAM).lower()
+    rest = urllib.parse.urlencode(sorted((k, v) for k, v in params if k != NARROW_PARAM))
+    return urllib.parse.urlunsplit((u.scheme, u.netloc.lower(), u.path, rest, "")), source
+
+
+def entry_ids(raw: str) -> Optional[List[str]]:
+    """Identity (link, else guid, else title) of every item in an RSS document; None if unparseable."""
+    if not raw:
+        return None
+    try:
+        root = ET.fromstring(raw.encode("utf-8") if isinstance(raw, str) else raw)
+    except ET.ParseError:
+        return None
+    ids = []
+    for item in root.iter("item"):
+        for tag in ("link", "guid", "title"):
+            text = (item.findtext(tag) or "").strip()
+            if text:
+                ids.append(text)
+                break
+    return ids
+
+
+class FeedStats:
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path
+        self.pages: Dict[str, int] = {}
+        self.sources: Dict[str, dict] = {}
+        self.queries: Dict[str, Dict[str, dict]] = {}
+        self.metrics: Dict[str, int] = {"searches": 0, "planned": 0, "fetched": 0, "skipped": 0, "truncated": 0}
+        self._load()
+
+    def _load(self):
+        if self.path is None or not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except Exception as e:
+            logger.warning("Ignoring unreadable feed stats %s: %s", self.path, e)
+            return
+        self.pages = data.get("pages", {})
+        self.sources = data.get("sources", {})
+        self.queries = data.get("queries", {})
+        self.metrics.update(data.get("metrics", {}))
+
+    def save(self):
+        if self.path is None:
+            return
+        if len(self.queries) > MAX_QUERIES:
+            keep = sorted(self.queries, key=lambda q: max(r["at"] for r in self.queries[q].values()))[-MAX_QUERIES:]
+            self.queries = {q: self.queries[q] for q in keep}
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            data = {"pages": self.pages, "sources": self.sources, "queries": self.queries, "metrics": self.metrics}
+            tmp.write_text(json.dumps(data), encoding="utf-8")
+            tmp.replace(self.path)
+        except OSError as e:
+            logger.warning("Failed to write feed stats: %s", e)
+
+    def page_size(self, broad: str) -> Optional[int]:
+        return self.pages.get(urllib.parse.urlsplit(broad).netloc)
+
+    def observe_page(self, broad: str, count: int):
+        # the largest page ever seen never exceeds the real limit, so `count < page` means complete
+        host = urllib.parse.urlsplit(broad).netloc
+        self.pages[host] = max(self.pages.get(host, 0), count)
+
+    def observe_overlap(self, query: str, source: str, seen: int, covered: int):
+        s = self.sources.setdefault(source, {"samples": 0, "seen": 0, "covered": 0, "checked": 0})
+        s["samples"] += 1
+        s["seen"] += seen
+        s["covered"] += covered
+        s["checked"] = self.metrics["searches"]
+        self.queries.setdefault(query, {})[source] = {"seen": seen, "covered": covered, "at": time.time()}
+
+
+class FeedPlanner:
+    def __init__(self, stats: FeedStats, min_samples: int = 3, min_overlap: float = 0.98, recheck_every: int = 20):
+        self.stats = stats
+        self.min_samples = min_samples
+        self.min_overlap = min_overlap
+        self.recheck_every = recheck_every
+
+    def covered(self, query: str, source: str) -> bool:
+        """Whether the broad feed has reliably contained this source's items."""
+        last = self.stats.queries.get(query, {}).get(source)
+        if last and last["seen"] and last["covered"] < last["seen"] * self.min_overlap:
+            return False
+        s = self.stats.sources.get(source)
+        if not s or s["samples"] < self.min_samples:
+            return False
+        if self.recheck_every and self.stats.metrics["searches"] - s["checked"] >= self.recheck_every:
+            # fetch it anyway now and then so the statistics don't go stale
+            return False
+        return s["covered"] >= s["seen"] * self.min_overlap
+
+    async def fetch(self, feeds: List[str], fetch: Callable[..., Awaitable[List[dict]]], query: str = "",
+                    timeout: int = 10, concurrency: int = 8) -> List[dict]:
+        """Fetch the planned subset of `feeds` with `fetch`; same return shape as `fetch(feeds)`."""
+        stats = self.stats
+        stats.metrics["searches"] += 1
+        split = {u: split_feed(u) for u in feeds}
+        # normalized broad URL -> the feed URL as given
+        broad = {split[u][0]: u for u in feeds if not split[u][1]}
+        narrowed = {u: split[u] for u in feeds if split[u][1] and split[u][0] in broad}
+        deferred = [u for u, (b, src) in narrowed.items() if stats.page_size(b) and self.covered(query, src)]
+        first = [u for u in feeds if u not in deferred]
+
+        raw = list(await fetch(first, timeout=timeout, concurrency=concurrency))
+        ids = {r.get("url"): entry_ids(r.get("raw") or "") for r in raw}
+        truncated = set()
+        for b, url in broad.items():
+            n = ids.get(url)
+            page = stats.page_size(b)
+            if n is None or not page or len(n) >= page:
+                truncated.add(b)
+            if n is not None:
+                stats.observe_page(b, len(n))
+        late = [u for u in deferred if narrowed[u][0] in truncated]
+        if late:
+            more = await fetch(late, timeout=timeout, concurrency=concurrency)
+            raw += more
+            ids.update({r.get("url"): entry_ids(r.get("raw") or "") for r in more})
+
+        for u, (b, src) in narrowed.items():
+            if b in truncated or ids.get(broad[b]) is None or ids.get(u) is None:
+                continue
+            mine, theirs = set(ids[u]), set(ids[broad[b]])
+            stats.observe_overlap(query, src, len(mine), len(mine & theirs))
+
+        skipped = len(deferred) - len(late)
+        stats.metrics["planned"] += len(feeds)
+        stats.metrics["fetched"] += len(first) + len(late)
+        stats.metrics["skipped"] += skipped
+        stats.metrics["truncated"] += sum(1 for b in truncated if ids.get(broad[b]) is not None)
+        stats.save()
+        logger.info("Fetched %d of %d feeds", len(first) + len(late), len(feeds),
+                    extra={"stage": "plan", "feeds": len(feeds), "skipped": skipped, "late": len(late)})
+        # keep the caller's feed order (parse dedupes by first occurrence); pass through unknown urls
+        order = {u: i for i, u in enumerate(feeds)}
+        return sorted(raw, key=lambda r: order.get(r.get("url"), len(feeds)))
+
+
+def from_config(cfg: dict, persist: bool = True) -> Optional[FeedPlanner]:
+    """Planner from `[planner]`, or None when disabled."""
+    pc = (cfg or {}).get("planner", {})
+    if not pc.get("enabled", True):
+        return None
+    path = Path.home() / ".anidl" / "cache" / "feedplan.json" if persist else None
+    return FeedPlanner(FeedStats(path), min_samples=pc.get("min_samples", 3), min_overlap=pc.get("min_overlap", 0.98),
+                       recheck_every=pc.get("recheck_every", 20))
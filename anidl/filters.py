@@ -0,0 +1,175 @@
+"""Client-side filtering of parsed search results.
+
+`TitleIndex` normalizes every title once (tokens, language/category tags, size in
+bytes, uploader) and keeps an inverted token index, so re-filtering a cached
+result set is a few set operations instead of a new feed fetch. `parse_query`
+turns the interactive filter syntax into `TitleIndex.filter` arguments:
+
+    1080p -hevc size:<2G size:>500M by:subsplease -by:someone lang:eng cat:batch re:S0[12]
+"""
+from typing import Dict, Iterable, List, Optional, Set
+import re
+import shlex
+import unicodedata
+
+from .utils import parse_size, parse_size_strict
+
+_TOKEN_RE = re.compile(r"[0-9a-z]+")
+
+# tag -> title tokens that imply it
+LANG_TOKENS: Dict[str, Set[str]] = {
+    "eng": {"eng", "english"},
+    "spa": {"spa", "spanish", "esp", "latino"},
+    "por": {"por", "portuguese", "ptbr", "pt"},
+    "fre": {"fre", "fra", "french", "vostfr"},
+    "ger": {"ger", "deu", "german"},
+    "ita": {"ita", "italian"},
+    "ara": {"ara", "arabic"},
+    "rus": {"rus", "russian"},
+    "chi": {"chi", "chs", "cht", "chinese", "big5", "gb"},
+    "multi": {"multi", "multisub", "multisubs"},
+}
+# releases that name no language are English fansubs on the trackers we read
+DEFAULT_LANG = "eng"
+
+CATEGORY_TOKENS: Dict[str, Set[str]] = {
+    "raw": {"raw", "raws"},
+    "dub": {"dub", "dubbed", "dual"},
+    "batch": {"batch", "complete"},
+}
+# anything not marked raw is subbed
+CATEGORIES = ("sub", "raw", "dub", "batch")
+
+_LANG_ALIASES = {alias: tag for tag, aliases in LANG_TOKENS.items() for alias in aliases}
+
+
+def normalize(text: str) -> str:
+    return unicodedata.normalize("NFKC", text or "").casefold()
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(normalize(text))
+
+
+def lang_tag(value: str) -> str:
+    """'English' / 'en' / 'ENG' -> 'eng'; unknown values are returned normalized."""
+    v = normalize(value).strip()
+    return {"en": "eng", "es": "spa", "fr": "fre", "de": "ger", "it": "ita", "ar": "ara", "ru": "rus",
+            "zh": "chi"}.get(v, _LANG_ALIASES.get(v, v))
+
+
+class TitleIndex:
+    def __init__(self, items: List[dict]):
+        self.items = items
+        self.postings: Dict[str, Set[int]] = {}
+        self._norm: List[str] = []
+        self._size: List[int] = []
+        self._uploader: List[str] = []
+        self._langs: List[Set[str]] = []
+        self._cats: List[Set[str]] = []
+        for i, it in enumerate(items):
+            title = it.get("title") or ""
+            toks = set(tokenize(title))
+            for t in toks:
+                self.postings.setdefault(t, set()).add(i)
+            self._norm.append(normalize(title))
+            self._size.append(int(it.get("size_bytes") or parse_size(it.get("size"))))
+            self._uploader.append(normalize(it.get("uploader") or it.get("submitter") or ""))
+            langs = {tag for tag, words in LANG_TOKENS.items() if toks & words}
+            self._langs.append(langs or {DEFAULT_LANG})
+            # a group called "Erai-raws" doesn't make its subbed releases raw
+            body = set(tokenize(re.sub(r"^\s*\[[^\]]*\]", "", title)))
+            cats = {c for c, words in CATEGORY_TOKENS.items() if body & words}
+            if re.search(r"\b\d{1,4}\s*[-~]\s*\d{1,4}\b", title) and "batch" not in cats:
+                cats.add("batch")  # episode ranges like "01-12"
+            if "raw" not in cats:
+                cats.add("sub")
+            self._cats.append(cats)
+
+    def _matching(self, term: str) -> Set[int]:
+        toks = tokenize(term)
+        if not toks:
+            return set(range(len(self.items)))
+        hits = set.intersection(*(self.postings.get(t, set()) for t in toks))
+        if len(toks) > 1:
+            # multi-word terms must appear as a phrase, not just anywhere
+            phrase = " ".join(toks)
+            hits = {i for i in hits if phrase in " ".join(tokenize(self._norm[i]))}
+        return hits
+
+    def filter(self, include: Iterable[str] = (), exclude: Iterable[str] = (), regex: Optional[str] = None,
+               min_size: Optional[int] = None, max_size: Optional[int] = None,
+               uploaders: Iterable[str] = (), exclude_uploaders: Iterable[str] = (),
+               langs: Iterable[str] = (), category: Optional[str] = None) -> List[dict]:
+        """Items (in their original order) that satisfy every given criterion.
+
+        Sizes are bytes; items of unknown size pass size checks. Uploader names match
+        case-insensitively. `langs` keeps items tagged with any of the languages.
+        """
+        cand = set(range(len(self.items)))
+        for term in include:
+            cand &= self._matching(term)
+        for term in exclude:
+            cand -= self._matching(term)
+        if regex:
+            rx = re.compile(regex, re.IGNORECASE)
+            cand = {i for i in cand if rx.search(self.items[i].get("title") or "")}
+        if min_size:
+            cand = {i for i in cand if not self._size[i] or self._size[i] >= min_size}
+        if max_size:
+            cand = {i for i in cand if not self._size[i] or self._size[i] <= max_size}
+        allow = {normalize(u) for u in uploaders}
+        deny = {normalize(u) for u in exclude_uploaders}
+        if allow:
+            cand = {i for i in cand if self._uploader[i] in allow}
+        if deny:
+            cand = {i for i in cand if self._uploader[i] not in deny}
+        wanted = {lang_tag(l) for l in langs if l}
+        if wanted:
+            cand = {i for i in cand if self._langs[i] & wanted or "multi" in self._langs[i]}
+        if category:
+            cat = normalize(category)
+            if cat not in CATEGORIES:
+                raise ValueError(f"unknown category {category!r} (choose from {', '.join(CATEGORIES)})")
+            cand = {i for i in cand if cat in self._cats[i]}
+        return [self.items[i] for i in sorted(cand)]
+
+
+def parse_query(text: str) -> dict:
+    """Turn '1080p -hevc size:<2G by:group lang:eng cat:batch re:S0[12]' into `filter()` kwargs."""
+    spec: dict = {"include": [], "exclude": [], "uploaders": [], "exclude_uploaders": [], "langs": []}
+    try:
+        words = shlex.split(text or "")
+    except ValueError:
+        words = (text or "").split()
+    for w in words:
+        neg = w.startswith("-") and len(w) > 1
+        body = w[1:] if neg else w
+        key, sep, value = body.partition(":")
+        key = key.lower()
+        if sep and key in ("by", "uploader"):
+            spec["exclude_uploaders" if neg else "uploaders"].append(value)
+        elif sep and key == "lang":
+            spec["langs"].append(value)
+        elif sep and key in ("cat", "category"):
+            spec["category"] = value
+        elif sep and key in ("re", "regex"):
+            spec["regex"] = value
+        elif sep and key == "size":
+            op, num = (value[0], value[1:]) if value[:1] in ("<", ">") else ("<", value)
+            try:
+                size = parse_size_strict(num)
+            except ValueError:
+                raise ValueError(f"bad size in {w!r} (e.g. size:<2G)") from None
+            spec["max_size" if op == "<" else "min_size"] = size
+        else:
+            spec["exclude" if neg else "include"].append(body)
+    return spec
+
+
+def combine(base: dict, extra: dict) -> dict:
+    """Merge two `parse_query` specs: term lists are concatenated, scalar criteria in `extra` win."""
+    out = dict(base)
+    for k, v in extra.items():
+        out[k] = list(base.get(k, [])) + list(v) if isinstance(v, list) else v
+    return out
@@ -0,0 +1,191 @@
+"""Optional background helper that keeps feed connections and caches warm.
+
+Every `anidl search` is a new process, so it pays DNS, TCP and TLS set-up to
+tokyotosho.info before the first byte. `anidl helper start` runs the `serve` app
+(the same `ServerState`: one aiohttp session, the result cache, the aria2
+connection) on a Unix socket instead of a TCP port. CLI commands send their work
+there when it answers and run in-process when it doesn't. The helper exits after
+`[helper] idle_timeout` seconds without a request; with `[helper] auto_spawn` a
+command that finds no helper starts one in the background for the next call.
+"""
+from pathlib import Path
+from typing import Any, List, Optional
+import asyncio
+import logging
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.parse
+
+import aiohttp
+from aiohttp import web
+
+from . import sources
+from .config import ENV_PREFIX
+from .server import ServerState, api_token, create_app
+from .search import build_feeds
+
+logger = logging.getLogger(__name__)
+
+# fake origin for requests over the socket; only the path matters
+_ORIGIN = "http://anidl"
+
+
+def socket_path() -> Path:
+    return Path.home() / ".anidl" / "helper.sock"
+
+
+def supported() -> bool:
+    return hasattr(socket, "AF_UNIX") and sys.platform != "win32"
+
+
+def is_running(path: Optional[Path] = None) -> bool:
+    """True when something accepts connections on the helper socket."""
+    path = Path(path or socket_path())
+    if not supported() or not path.exists():
+        return False
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.settimeout(0.2)
+        try:
+            s.connect(str(path))
+            return True
+        except OSError:
+            return False
+
+
+async def _warm(session: aiohttp.ClientSession, cfg: dict):
+    # resolve and handshake with every feed host up front so the first search skips it
+    origins = set()
+    for url in build_feeds("anime", "", "", cfg, sources.get_feeds):
+        u = urllib.parse.urlsplit(url)
+        origins.add(f"{u.scheme}://{u.netloc}/")
+    for origin in origins:
+        try:
+            async with session.head(origin, timeout=aiohttp.ClientTimeout(total=10)):
+                pass
+        except Exception as e:
+            logger.debug("Warm-up of %s failed: %s", origin, e)
+
+
+async def run(cfg: Optional[dict] = None, path: Optional[Path] = None, idle_timeout: Optional[float] = None,
+              state: Optional[ServerState] = None, warm: bool = True):
+    """Serve the API on the Unix socket until idle for `idle_timeout` seconds (0 = never) or shut down."""
+    path = Path(path or socket_path())
+    state = state or ServerState(cfg)
+    if idle_timeout is None:
+        idle_timeout = state.cfg["helper"]["idle_timeout"]
+    if state.keepalive is None:
+        state.keepalive = idle_timeout or None
+    app = create_app(state)
+    stop = asyncio.Event()
+    last = [time.monotonic()]
+    active = [0]
+
+    @web.middleware
+    async def touch(request, handler):
+        # an open /events stream counts as activity for as long as it lasts
+        active[0] += 1
+        try:
+            return await handler(request)
+        finally:
+            active[0] -= 1
+            last[0] = time.monotonic()
+
+    async def status(request):
+        return web.json_response({"pid": os.getpid(), "idle": round(time.monotonic() - last[0], 1),
+                                  "idle_timeout": idle_timeout})
+
+    async def shutdown(request):
+        stop.set()
+        return web.json_response({"ok": True})
+
+    app.middlewares.append(touch)
+    app.router.add_get("/helper/status", status)
+    app.router.add_post("/helper/shutdown", shutdown)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # a socket file left by a helper that died doesn't stop us from binding
+    path.unlink(missing_ok=True)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    try:
+        await web.UnixSite(runner, str(path)).start()
+        os.chmod(path, 0o600)
+        logger.info("Helper listening on %s (pid %d)", path, os.getpid())
+        warming = asyncio.create_task(_warm(state.session, state.cfg)) if warm else None
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=min(idle_timeout or 5, 5))
+            except asyncio.TimeoutError:
+                pass
+            if idle_timeout and not active[0] and time.monotonic() - last[0] >= idle_timeout:
+                logger.info("Helper idle for %ss, exiting", idle_timeout)
+                break
+        if warming is not None:
+            warming.cancel()
+    finally:
+        await runner.cleanup()
+        path.unlink(missing_ok=True)
+
+
+def spawn() -> Optional[int]:
+    """Start a detached helper process and return its pid (None when unsupported)."""
+    if not supported():
+        return None
+    log = open(socket_path().parent / "helper.log", "ab")
+    # one command's ANIDL_* overrides must not stick to the helper that outlives it
+    env = {k: v for k, v in os.environ.items() if not k.startswith(ENV_PREFIX)}
+    try:
+        proc = subprocess.Popen([sys.executable, "-m", "anidl.cli", "helper", "run"], stdout=log, env=env,
+                                stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, start_new_session=True)
+    finally:
+        log.close()
+    return proc.pid
+
+
+def maybe_spawn(cfg: dict) -> Optional[int]:
+    """Start a helper in the background when `[helper] auto_spawn` is on and none is running."""
+    if not cfg["helper"]["auto_spawn"] or is_running():
+        return None
+    socket_path().parent.mkdir(parents=True, exist_ok=True)
+    pid = spawn()
+    logger.info("Spawned helper pid=%s", pid)
+    return pid
+
+
+async def request(method: str, endpoint: str, params: Optional[dict] = None, json: Any = None,
+                  timeout: float = 30, path: Optional[Path] = None) -> Optional[Any]:
+    """Send one request to the helper and return the decoded JSON body; None when it isn't running."""
+    path = Path(path or socket_path())
+    if not supported() or not path.exists():
+        return None
+    headers = None
+    if method not in ("GET", "HEAD"):
+        headers = {"X-Anidl-Token": api_token(), "Content-Type": "application/json"}
+    try:
+        async with aiohttp.ClientSession(connector=aiohttp.UnixConnector(path=str(path)),
+                                         timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+            async with session.request(method, _ORIGIN + endpoint, params=params, json=json,
+                                       headers=headers) as resp:
+                return await resp.json()
+    except (aiohttp.ClientError, OSError, asyncio.TimeoutError, ValueError) as e:
+        logger.debug("Helper request %s %s failed: %s", method, endpoint, e)
+        return None
+
+
+def call(method: str, endpoint: str, json: Any = None, timeout: float = 30) -> Optional[Any]:
+    """Blocking `request()` for the synchronous CLI commands."""
+    return asyncio.run(request(method, endpoint, json=json, timeout=timeout))
+
+
+async def search(cfg: dict, mode: str, query: str, resolution: str, meta: bool = True,
+                 refresh: bool = False, path: Optional[Path] = None) -> Optional[List[dict]]:
+    """Run a search in the helper; None means do it in-process."""
+    params = {"q": query, "mode": mode, "resolution": resolution, "meta": int(meta), "refresh": int(refresh)}
+    # the helper fetches every feed (and maybe resolves magnets) before answering
+    data = await request("GET", "/search", params=params, timeout=cfg["sources"]["timeout"] * 4, path=path)
+    if not isinstance(data, dict) or "items" not in data:
+        return None
+    return data["items"]
@@ -0,0 +1,223 @@
+"""Crash-safe session state: which gid is which release, how far it got, and
+whether post-processing ran.
+
+The journal lives in `~/.anidl/state.json`. Updates only mark it dirty; a timer
+coalesces everything within `debounce` seconds into one write, and writes go to
+a temp file that is fsynced and renamed over the old one, so a crash leaves
+either the previous or the new state, never a torn file. On startup `reattach()`
+replays unfinished entries against aria2 so monitoring and post-processing pick
+up where they left off without resolving or adding anything again.
+
+Several processes (`search` runs, `serve`, the helper, `queue remove`) share the
+file, so a flush re-reads it under a lock and writes back only the gids this
+process changed on top of what is there.
+"""
+from pathlib import Path
+from typing import Dict, List, Optional
+import base64
+import json
+import logging
+import os
+import threading
+import time
+
+from .utils import file_lock
+
+logger = logging.getLogger(__name__)
+
+FINISHED = ("complete", "removed", "error")
+# finished entries are kept this long (seconds) before being pruned on load
+KEEP_FINISHED = 24 * 3600
+
+
+def _state_path() -> Path:
+    return Path.home() / ".anidl" / "state.json"
+
+
+class Journal:
+    def __init__(self, path: Optional[Path] = None, debounce: float = 2.0):
+        self.path = Path(path) if path else _state_path()
+        self.debounce = debounce
+        self.entries: Dict[str, dict] = {}
+        self.meta: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self._dirty = False
+        # gids added, updated or forgotten here since the last flush
+        self._changed: set = set()
+        self.writes = 0
+        self.meta, self.entries = self._read()
+
+    def _read(self):
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return {}, {}
+        except Exception as e:
+            logger.warning("Ignoring unreadable state journal %s: %s", self.path, e)
+            return {}, {}
+        cutoff = time.time() - KEEP_FINISHED
+        entries = {gid: e for gid, e in data.get("entries", {}).items()
+                   if not (self.is_finished(e) and e.get("updated", 0) < cutoff)}
+        return data.get("meta", {}), entries
+
+    @staticmethod
+    def is_finished(entry: dict) -> bool:
+        return entry.get("status") in FINISHED and entry.get("post", {}).get("status") in (None, "done", "failed", "skipped")
+
+    def _touch(self, gid: str) -> dict:
+        e = self.entries.setdefault(gid, {"gid": gid})
+        e["updated"] = time.time()
+        return e
+
+    def _mark_dirty(self, gid: str):
+        # caller holds the lock
+        self._changed.add(gid)
+        self._dirty = True
+        if self._timer is None:
+            self._timer = threading.Timer(self.debounce, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def record_add(self, gid: str, item: dict, uri: str, download_dir, options: Optional[dict] = None):
+        with self._lock:
+            e = self._touch(gid)
+            e.update({
+                "item": {k: item.get(k) for k in ("title", "date", "source", "infohash", "torrent_url", "torrent_path", "size")},
+                "uri": uri,
+                "dir": str(download_dir),
+                "options": options or {},
+                "status": "active",
+            })
+            self._mark_dirty(gid)
+
+    def update_progress(self, gid: str, completed: int, total: int, status: Optional[str] = None):
+        with self._lock:
+            e = self.entries.get(gid)
+            if e is None:
+                return
+            if e.get("progress") == [completed, total] and (status is None or status == e.get("status")):
+                return
+            e["progress"] = [completed, total]
+            if status:
+                e["status"] = status
+            e["updated"] = time.time()
+            self._mark_dirty(gid)
+
+    def record_complete(self, gid: str, event: dict, post_pending: bool):
+        """Store the completion event so post-processing can be re-run after a crash."""
+        with self._lock:
+            e = self._touch(gid)
+            e["status"] = event.get("status") or "complete"
+            e["event"] = {k: v for k, v in event.items() if k != "item"}
+            if post_pending:
+                e["post"] = {"status": "pending", "error": None, "files": []}
+            self._mark_dirty(gid)
+
+    def set_post(self, gid: str, status: str, error: Optional[str] = None, files: Optional[List[str]] = None):
+        with self._lock:
+            e = self._touch(gid)
+            e["post"] = {"status": status, "error": error, "files": [str(f) for f in files or []]}
+            self._mark_dirty(gid)
+
+    def forget(self, gid: str):
+        with self._lock:
+            if self.entries.pop(gid, None) is not None:
+                self._mark_dirty(gid)
+
+    def pending(self) -> List[dict]:
+        with self._lock:
+            return [dict(e) for e in self.entries.values() if not self.is_finished(e)]
+
+    def flush(self):
+        with self._lock:
+            self._timer = None
+            if not self._dirty:
+                return
+        changed: set = set()
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with file_lock(self.path):
+                meta, entries = self._read()
+                with self._lock:
+                    # our changes go on top of whatever the other processes wrote
+                    for gid in self._changed:
+                        if gid in self.entries:
+                            entries[gid] = self.entries[gid]
+                        else:
+                            entries.pop(gid, None)
+                    meta.update(self.meta)
+                    data = json.dumps({"meta": meta, "entries": entries}, default=str)
+                    changed, self._changed = self._changed, set()
+                    self._dirty = False
+                    self.meta, self.entries = meta, entries
+                tmp = self.path.with_suffix(".tmp")
+                with open(tmp, "w", encoding="utf-8") as fh:
+                    fh.write(data)
+                    fh.flush()
+                    os.fsync(fh.fileno())
+                os.replace(tmp, self.path)
+            self.writes += 1
+        except OSError as e:
+            logger.error("Failed to write state journal %s: %s", self.path, e)
+            with self._lock:
+                self._changed |= changed
+                self._dirty = True
+
+    def close(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        self.flush()
+
+
+def reattach(journal: Journal, api) -> List[dict]:
+    """Reconnect unfinished journal entries to aria2; returns the entries now being tracked.
+
+    Completed entries whose post-processing never finished are returned untouched (with
+    their stored `event`) so the caller can resubmit them. Entries whose gid aria2 still
+    knows (e.g. restored from the managed daemon's session) are reattached as-is while they
+    are active; paused or queued ones only get their progress refreshed, since waiting on
+    them would keep the caller's monitor from ever finishing. If aria2
+    lost one, it is re-added from the cached .torrent under the same gid; entries with
+    nothing cached are marked lost rather than re-resolved.
+    """
+    if api is None:
+        return []
+    from .torrents import TorrentCache
+
+    live = []
+    for e in journal.pending():
+        gid = e["gid"]
+        if ":" in gid:
+            # placed by the multi-node router (`node:gid`); polled through it, not this api
+            live.append(e)
+            continue
+        if e.get("status") in FINISHED:
+            # finished but post-processing never completed; the caller re-runs it
+            if e.get("event"):
+                live.append(e)
+            continue
+        try:
+            dl = api.get_download(gid)
+            status = getattr(dl, "status", None)
+            journal.update_progress(gid, getattr(dl, "completed_length", 0) or 0, getattr(dl, "total_length", 0) or 0,
+                                    status)
+            if status not in ("paused", "waiting"):
+                live.append(e)
+            continue
+        except Exception:
+            pass
+        torrent = TorrentCache().get((e.get("item") or {}).get("infohash"))
+        if torrent is None:
+            logger.warning("aria2 no longer knows %s (%s) and no torrent is cached", gid, (e.get("item") or {}).get("title"))
+            journal.update_progress(gid, *(e.get("progress") or [0, 0]), status="removed")
+            continue
+        opts = dict(e.get("options") or {}, gid=gid, dir=e.get("dir"))
+        try:
+            api.client.add_torrent(base64.b64encode(torrent).decode("ascii"), [], opts)
+            live.append(e)
+        except Exception as ex:
+            logger.error("Failed to re-add %s: %s", gid, ex)
+    return live
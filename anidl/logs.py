@@ -0,0 +1,135 @@
+"""Logging that stays off the hot path.
+
+Log calls only put the record on an in-memory queue (`QueueHandler`); a
+`QueueListener` thread formats and writes it. The file rotates by size and
+rolled files are gzip-compressed on that thread. Optional JSON-lines output
+keeps `extra=` fields (stage, gid, elapsed_ms, ...) as keys. Records tagged
+`extra={"sample": <key>}` are rate-limited per key so progress events from a
+long-running process don't flood the log.
+"""
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from pathlib import Path
+from typing import Dict, Optional
+import atexit
+import gzip
+import json
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+
+# attributes every LogRecord has; anything else came in through `extra=`
+_STANDARD = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[QueueHandler] = None
+_lock = threading.Lock()
+
+
+def log_path() -> Path:
+    return Path.home() / ".anidl" / "anidl.log"
+
+
+def _gzip_namer(name: str) -> str:
+    return name + ".gz"
+
+
+def _gzip_rotator(source: str, dest: str):
+    with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+def rotating_handler(path: Path, max_bytes: int, backups: int) -> RotatingFileHandler:
+    """Size-rotated file handler whose rolled files are `anidl.log.N.gz`."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8", delay=True)
+    handler.namer = _gzip_namer
+    handler.rotator = _gzip_rotator
+    return handler
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        out = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for k, v in vars(record).items():
+            if k not in _STANDARD and k != "sample":
+                out[k] = v
+        if record.exc_info:
+            out["exc"] = self.formatException(record.exc_info)
+        return json.dumps(out, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Let through at most one record per `interval` seconds for each `sample` key.
+
+    Records without a `sample` attribute, and anything at WARNING or above, always pass.
+    Dropped records are counted and the count rides along on the next one let through.
+    """
+
+    def __init__(self, interval: float = 5.0):
+        super().__init__()
+        self.interval = interval
+        self._last: Dict[str, float] = {}
+        self._dropped: Dict[str, int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = getattr(record, "sample", None)
+        if key is None or self.interval <= 0 or record.levelno >= logging.WARNING:
+            return True
+        now = time.monotonic()
+        if now - self._last.get(key, float("-inf")) < self.interval:
+            self._dropped[key] = self._dropped.get(key, 0) + 1
+            return False
+        self._last[key] = now
+        dropped = self._dropped.pop(key, 0)
+        if dropped:
+            record.sampled_out = dropped
+        return True
+
+
+def setup(verbose: bool = False, cfg: Optional[dict] = None, path: Optional[Path] = None) -> QueueListener:
+    """Route the root logger through a queue to a rotating (optionally JSON) file handler.
+
+    Safe to call repeatedly: later calls only adjust the level.
+    """
+    global _listener, _queue_handler
+    lc = (cfg or {}).get("logging", {})
+    root = logging.getLogger()
+    root.setLevel(logging.DEBUG if verbose else logging.INFO)
+    with _lock:
+        if _listener is not None:
+            return _listener
+        handler = rotating_handler(path or log_path(), int(lc.get("max_bytes", 5 * 1024 * 1024)),
+                                   int(lc.get("backups", 5)))
+        handler.setFormatter(JsonFormatter() if lc.get("json") else logging.Formatter(TEXT_FORMAT))
+        _queue_handler = QueueHandler(queue.SimpleQueue())
+        # sampling runs in the caller's thread so dropped records never reach the queue
+        _queue_handler.addFilter(SamplingFilter(float(lc.get("sample_interval", 5.0))))
+        root.addHandler(_queue_handler)
+        _listener = QueueListener(_queue_handler.queue, handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown)
+        return _listener
+
+
+def shutdown():
+    """Flush queued records and detach (runs at exit)."""
+    global _listener, _queue_handler
+    with _lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        for h in _listener.handlers:
+            h.close()
+        logging.getLogger().removeHandler(_queue_handler)
+        _listener = _queue_handler = None
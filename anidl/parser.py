@@ -1,9 +1,13 @@
 from typing import List, Dict
 from datetime import datetime, timedelta
+import re
 import time
 import feedparser
 from difflib import SequenceMatcher
 
+from .torrents import magnet_infohash
+from .utils import format_size
+
 
 TRUSTED_UPLOADERS = {"subsplease": 0.9, "erai-raws": 0.8, "varyg1001": 0.7}
 
@@ -41,6 +45,48 @@ def health_score(seeders: int, published: datetime, uploader: str) -> float:
     return score
 
 
+_GROUP_RE = re.compile(r"^\s*\[([^\]]+)\]\s*")
+_TAGS_RE = re.compile(r"\s*[\[\(][^\]\)]*[\]\)]")
+_EPISODE_RES = [
+    re.compile(r"^(?P<series>.+?)\s+-\s+(?P<ep>\d{1,4})(?:v\d)?(?:\s|$)"),
+    re.compile(r"^(?P<series>.+?)\s+S\d{1,2}E(?P<ep>\d{1,4})", re.IGNORECASE),
+    re.compile(r"^(?P<series>.+?)\s+(?:Episode|Ep\.?|E)\s*(?P<ep>\d{1,4})\b", re.IGNORECASE),
+]
+
+
+def parse_release_title(title: str) -> Dict:
+    """Split a release name like '[Group] Show Name - 05 (1080p) [ABCD].mkv' into parts.
+
+    Returns {"group", "series", "episode"}; episode is None for batches/movies.
+    """
+    name = re.sub(r"\.(mkv|mp4|avi|ts)$", "", (title or "").strip(), flags=re.IGNORECASE)
+    group = None
+    m = _GROUP_RE.match(name)
+    if m:
+        group = m.group(1)
+        name = name[m.end():]
+    name = _TAGS_RE.sub("", name).replace("_", " ").strip()
+    if " " not in name:
+        # scene-style dotted names
+        name = name.replace(".", " ")
+    for rx in _EPISODE_RES:
+        m = rx.match(name)
+        if m:
+            return {"group": group, "series": m.group("series").strip(" -"), "episode": int(m.group("ep"))}
+    return {"group": group, "series": name.strip(" -"), "episode": None}
+
+
+def match_episode_files(files: List[Dict], episodes: List[int]) -> List[int]:
+    """1-based indices of torrent files whose name carries one of `episodes`."""
+    wanted = set(episodes)
+    out = []
+    for i, f in enumerate(files, start=1):
+        name = str(f.get("path", "")).replace("\\", "/").rsplit("/", 1)[-1]
+        if parse_release_title(name)["episode"] in wanted:
+            out.append(i)
+    return out
+
+
 def _is_similar(a: str, b: str, threshold: float = 0.8) -> bool:
     return SequenceMatcher(None, a, b).ratio() >= threshold
 
@@ -99,6 +145,7 @@ def parse_feeds(raw_feeds: List[dict], max_results: int = 50, resolve_magnets: b
                 "date": published,
                 "seeders": seeders,
                 "torrent_url": torrent_url,
+                "infohash": magnet_infohash(torrent_url),
                 "source": url,
             }
             # dedupe by similar title
@@ -136,11 +183,8 @@ def parse_feeds(raw_feeds: List[dict], max_results: int = 50, resolve_magnets: b
                                     s = meta.get("size")
                                     try:
                                         # aria2 returns bytes; convert to MB/GB
-                                        s_n = int(s)
-                                        if s_n > 1024 * 1024 * 1024:
-                                            it["size"] = f"{s_n / (1024**3):.2f} GB"
-                                        else:
-                                            it["size"] = f"{s_n / (1024**2):.0f} MB"
+                                        it["size"] = format_size(s)
+                                        it["size_bytes"] = int(s)
                                     except Exception:
                                         it["size"] = str(s)
                         except Exception:
@@ -0,0 +1,259 @@
+"""Post-download pipeline: verify, move into the library, rename, run a user hook.
+
+Completion events come from the download monitor and are processed on a bounded
+thread pool so hashing or copying a large file never stalls progress polling.
+Steps are configured in the `[postprocess]` config section:
+
+    [postprocess]
+    enabled = true
+    workers = 2
+    steps = ["verify", "move", "rename", "hook"]
+    library_dir = "~/Anime"
+    rename_template = "{series} - {episode:02d}{ext}"
+    hook = "notify-send anidl {path}"
+"""
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+import errno
+import hashlib
+import logging
+import os
+import re
+import shlex
+import shutil
+import subprocess
+
+from .parser import parse_release_title
+
+logger = logging.getLogger(__name__)
+
+VIDEO_EXTS = {".mkv", ".mp4", ".avi", ".ts", ".webm"}
+
+
+class StepError(RuntimeError):
+    """Raised by a step to stop processing of one download."""
+
+
+def _copy_fast(src: Path, dst: Path):
+    """Copy file contents in-kernel where possible (copy_file_range, then sendfile)."""
+    with open(src, "rb") as fi, open(dst, "wb") as fo:
+        size = os.fstat(fi.fileno()).st_size
+        for how in ("copy_file_range", "sendfile"):
+            fn = getattr(os, how, None)
+            if fn is None:
+                continue
+            fi.seek(0)
+            fo.seek(0)
+            fo.truncate()
+            try:
+                copied = 0
+                while copied < size:
+                    if how == "copy_file_range":
+                        n = fn(fi.fileno(), fo.fileno(), size - copied)
+                    else:
+                        n = fn(fo.fileno(), fi.fileno(), copied, size - copied)
+                    if n == 0:
+                        break
+                    copied += n
+                if copied == size:
+                    break
+            except OSError as e:
+                # EXDEV/ENOSYS/EINVAL on older kernels or odd filesystems: try the next method
+                logger.debug("%s failed for %s: %s", how, src, e)
+        else:
+            fi.seek(0)
+            fo.seek(0)
+            fo.truncate()
+            shutil.copyfileobj(fi, fo, 1024 * 1024)
+    shutil.copystat(src, dst)
+
+
+def move_file(src: Path, dst: Path) -> Path:
+    """Rename when possible, otherwise copy across filesystems and unlink the source."""
+    src, dst = Path(src), Path(dst)
+    if src == dst:
+        return dst
+    if dst.exists():
+        raise StepError(f"destination already exists: {dst}")
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.rename(src, dst)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        tmp = dst.with_name(dst.name + ".part")
+        _copy_fast(src, tmp)
+        os.replace(tmp, dst)
+        src.unlink()
+    return dst
+
+
+def verify_torrent(torrent: bytes, base_dir: Path, selected: Optional[List[int]] = None) -> bool:
+    """Check downloaded data against the piece hashes of a .torrent.
+
+    With `selected` (1-based file indices, as given to aria2's `--select-file`) only the
+    pieces that lie entirely within those files are hashed; the other files may not exist.
+    """
+    from .torrents import torrent_info, bdecode, _info_span
+
+    start, end = _info_span(torrent)
+    info = bdecode(torrent[start:end])
+    piece_len = int(info[b"piece length"])
+    pieces = info[b"pieces"]
+    meta = torrent_info(torrent)
+    if b"files" in info:
+        paths = [Path(base_dir) / meta["name"] / f["path"] for f in meta["files"]]
+    else:
+        paths = [Path(base_dir) / meta["name"]]
+    wanted = set(selected) if selected else set(range(1, len(paths) + 1))
+
+    # (offset in the torrent's byte stream, length, path, selected) per file
+    spans = []
+    offset = 0
+    for n, (p, f) in enumerate(zip(paths, meta["files"]), 1):
+        spans.append((offset, f["length"], p, n in wanted))
+        offset += f["length"]
+    count = -(-offset // piece_len)
+    if count * 20 != len(pieces):
+        return False
+
+    handles = {}
+    try:
+        for idx in range(count):
+            lo, hi = idx * piece_len, min((idx + 1) * piece_len, offset)
+            parts = [s for s in spans if s[1] and s[0] < hi and s[0] + s[1] > lo]
+            if not all(s[3] for s in parts):
+                # shares bytes with a file that wasn't downloaded
+                continue
+            h = hashlib.sha1()
+            for first, length, p, _ in parts:
+                if p not in handles:
+                    handles[p] = open(p, "rb")
+                fh = handles[p]
+                a = max(lo, first)
+                fh.seek(a - first)
+                h.update(fh.read(min(hi, first + length) - a))
+            if h.digest() != pieces[idx * 20:(idx + 1) * 20]:
+                return False
+    finally:
+        for fh in handles.values():
+            fh.close()
+    return True
+
+
+def step_verify(ctx: Dict, cfg: Dict):
+    from .torrents import TorrentCache
+    torrent = TorrentCache().get(ctx.get("infohash"))
+    if torrent is None:
+        logger.info("No cached torrent for %s; skipping hash verification", ctx.get("name"))
+        return
+    if not verify_torrent(torrent, Path(ctx["dir"]), ctx.get("selected")):
+        raise StepError(f"hash verification failed for {ctx.get('name')}")
+    ctx["verified"] = True
+
+
+def _series(ctx: Dict, path: Path) -> str:
+    parsed = parse_release_title(path.name)
+    if not parsed["series"] or parsed["episode"] is None:
+        parsed = parse_release_title((ctx.get("item") or {}).get("title") or ctx.get("name") or path.stem)
+    # keep directory names portable
+    return re.sub(r'[<>:"/\\|?*]', "", parsed["series"]).strip() or "Unsorted"
+
+
+def step_move(ctx: Dict, cfg: Dict):
+    library = cfg.get("library_dir")
+    if not library:
+        return
+    library = Path(os.path.expanduser(library))
+    moved = []
+    for f in ctx["files"]:
+        f = Path(f)
+        if f.suffix.lower() not in VIDEO_EXTS:
+            moved.append(f)
+            continue
+        moved.append(move_file(f, library / _series(ctx, f) / f.name))
+    ctx["files"] = moved
+
+
+def step_rename(ctx: Dict, cfg: Dict):
+    template = cfg.get("rename_template")
+    if not template:
+        return
+    renamed = []
+    for f in ctx["files"]:
+        f = Path(f)
+        parsed = parse_release_title(f.name)
+        if f.suffix.lower() not in VIDEO_EXTS or parsed["episode"] is None:
+            renamed.append(f)
+            continue
+        name = template.format(series=_series(ctx, f), episode=parsed["episode"], group=parsed["group"] or "",
+                               ext=f.suffix, stem=f.stem)
+        renamed.append(move_file(f, f.with_name(name)))
+    ctx["files"] = renamed
+
+
+def step_hook(ctx: Dict, cfg: Dict):
+    hook = cfg.get("hook")
+    if not hook:
+        return
+    timeout = float(cfg.get("hook_timeout", 300))
+    for f in ctx["files"]:
+        args = [a.format(path=str(f), name=ctx.get("name") or "", gid=ctx.get("gid") or "") for a in shlex.split(hook)]
+        env = dict(os.environ, ANIDL_PATH=str(f), ANIDL_GID=str(ctx.get("gid") or ""), ANIDL_NAME=str(ctx.get("name") or ""))
+        res = subprocess.run(args, env=env, timeout=timeout, capture_output=True)
+        if res.returncode != 0:
+            raise StepError(f"hook exited with {res.returncode}: {res.stderr.decode(errors='replace').strip()}")
+
+
+STEPS: Dict[str, Callable[[Dict, Dict], None]] = {
+    "verify": step_verify,
+    "move": step_move,
+    "rename": step_rename,
+    "hook": step_hook,
+}
+
+
+class Pipeline:
+    """Run configured steps for each completed download on a bounded worker pool."""
+
+    def __init__(self, cfg: Optional[Dict] = None, on_done: Optional[Callable[[Dict], None]] = None):
+        self.cfg = cfg or {}
+        self.steps: List[str] = list(self.cfg.get("steps", ["verify", "move", "rename", "hook"]))
+        unknown = [s for s in self.steps if s not in STEPS]
+        if unknown:
+            raise ValueError(f"Unknown post-processing steps: {', '.join(unknown)}")
+        self.on_done = on_done
+        self._pool = ThreadPoolExecutor(max_workers=int(self.cfg.get("workers", 2)), thread_name_prefix="anidl-post")
+
+    def _run(self, ctx: Dict) -> Dict:
+        ctx.setdefault("done", [])
+        for name in self.steps:
+            try:
+                STEPS[name](ctx, self.cfg)
+                ctx["done"].append(name)
+            except Exception as e:
+                logger.error("Post-processing step %s failed for %s: %s", name, ctx.get("name"), e)
+                ctx["error"] = f"{name}: {e}"
+                break
+        if self.on_done is not None:
+            try:
+                self.on_done(ctx)
+            except Exception:
+                logger.exception("Post-processing callback failed")
+        return ctx
+
+    def submit(self, event: Dict) -> Future:
+        ctx = dict(event)
+        ctx["files"] = [Path(f) for f in event.get("files", [])]
+        return self._pool.submit(self._run, ctx)
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait)
+
+
+def from_config(cfg: Dict, on_done: Optional[Callable[[Dict], None]] = None) -> Optional[Pipeline]:
+    pc = (cfg or {}).get("postprocess", {})
+    if not pc.get("enabled", False):
+        return None
+    return Pipeline(pc, on_done=on_done)
@@ -0,0 +1,162 @@
+"""Download progress display, decoupled from polling.
+
+Pollers (`downloader.download_with_progress` and its async twin) only write
+the latest stats into a `Snapshot`. A `Renderer` thread redraws at a fixed
+frame rate, whatever the RPC latency. It shows the first `max_rows` active
+downloads, the totals across all of them (speed, ETA) and one summary line for
+everything already finished, so the cost of a frame doesn't grow with the
+number of gids.
+"""
+from typing import Dict, Optional
+import threading
+
+from .utils import format_size
+
+try:
+    from rich.console import Group
+    from rich.live import Live
+    from rich.progress_bar import ProgressBar
+    from rich.table import Table
+    from rich.text import Text
+except Exception:
+    Live = None
+
+TERMINAL = ("complete", "error", "removed")
+
+
+def format_rate(bps: int) -> str:
+    if bps < 1024 * 1024:
+        return f"{bps / 1024:.0f} KB/s"
+    return f"{bps / 1024 ** 2:.1f} MB/s"
+
+
+def format_eta(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "-:--:--"
+    s = int(seconds)
+    return f"{s // 3600}:{s % 3600 // 60:02d}:{s % 60:02d}"
+
+
+class Snapshot:
+    """Latest stats per gid, written by the poller and read by the renderer."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active: Dict[str, dict] = {}
+        self._finished = set()
+        self.done = 0
+        self.failed = 0
+        self.done_bytes = 0
+        # bumped on every write so the renderer can skip unchanged frames
+        self.version = 0
+
+    def update(self, gid: str, title: str, total: Optional[int], completed: int, speed: int = 0,
+               status: Optional[str] = None):
+        with self._lock:
+            if gid in self._finished:
+                return
+            self.version += 1
+            if status in TERMINAL:
+                # folded into the summary line from here on
+                self._active.pop(gid, None)
+                self._finished.add(gid)
+                if status == "complete":
+                    self.done += 1
+                    self.done_bytes += total or completed
+                else:
+                    self.failed += 1
+                return
+            self._active[gid] = {"title": title, "total": total, "completed": completed, "speed": speed,
+                                 "status": status}
+
+    def view(self, max_rows: int = 10) -> dict:
+        """Totals over every active download plus the first `max_rows` of them."""
+        with self._lock:
+            rows = []
+            speed = remaining = 0
+            unknown = False
+            for i, d in enumerate(self._active.values()):
+                if i < max_rows:
+                    rows.append(dict(d))
+                speed += d["speed"] or 0
+                if d["total"]:
+                    remaining += max(0, d["total"] - d["completed"])
+                elif d["status"] != "paused":
+                    unknown = True
+            return {
+                "rows": rows,
+                "active": len(self._active),
+                "speed": speed,
+                "remaining": remaining,
+                "eta": remaining / speed if speed and not unknown else None,
+                "done": self.done,
+                "failed": self.failed,
+                "done_bytes": self.done_bytes,
+            }
+
+
+class Renderer:
+    """Redraw a `Snapshot` `fps` times per second from a background thread.
+
+    Use as a context manager around the polling loop. Without rich it only
+    keeps the snapshot (no output).
+    """
+
+    def __init__(self, snapshot: Snapshot, fps: float = 4, max_rows: int = 10, console=None):
+        self.snapshot = snapshot
+        self.interval = 1.0 / max(fps, 0.1)
+        self.max_rows = max_rows
+        self.console = console
+        self.frames = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._live = None
+
+    def render(self):
+        v = self.snapshot.view(self.max_rows)
+        table = Table.grid(padding=(0, 1), expand=False)
+        for _ in range(5):
+            table.add_column()
+        for d in v["rows"]:
+            total = d["total"]
+            pct = f"{100 * d['completed'] / total:5.1f}%" if total else "  ?  "
+            eta = (total - d["completed"]) / d["speed"] if total and d["speed"] else None
+            table.add_row(Text(d["title"] or "", overflow="ellipsis", no_wrap=True),
+                          ProgressBar(total=total, completed=d["completed"], width=30),
+                          pct, format_rate(d["speed"]), format_eta(eta))
+        lines = [table]
+        hidden = v["active"] - len(v["rows"])
+        if hidden > 0:
+            lines.append(Text(f"... and {hidden} more active", style="dim"))
+        lines.append(Text(f"{v['active']} active, {format_rate(v['speed'])}, "
+                          f"{format_size(v['remaining'])} left, ETA {format_eta(v['eta'])}", style="bold"))
+        if v["done"] or v["failed"]:
+            failed = f", {v['failed']} failed" if v["failed"] else ""
+            lines.append(Text(f"Finished {v['done']} ({format_size(v['done_bytes'])}){failed}", style="green"))
+        return Group(*lines)
+
+    def _run(self):
+        seen = -1
+        while not self._stop.wait(self.interval):
+            # nothing new from the poller: keep the last frame
+            if self.snapshot.version != seen:
+                seen = self.snapshot.version
+                self._live.update(self.render(), refresh=True)
+                self.frames += 1
+
+    def __enter__(self):
+        if Live is None:
+            return self
+        self._live = Live(self.render(), console=self.console, auto_refresh=False, transient=False)
+        self._live.__enter__()
+        self._thread = threading.Thread(target=self._run, name="anidl-progress", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self._live is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._live.update(self.render(), refresh=True)
+        self._live.__exit__(*exc)
@@ -1,55 +1,65 @@
 from typing import List
+import logging
 import shutil
 import subprocess
+import time
 
 try:
     import aria2p
 except Exception:
     aria2p = None
 
+logger = logging.getLogger(__name__)
+
 
 def _api():
-    if aria2p is None:
-        return None
-    try:
-        session = aria2p.Client()
-        return aria2p.API(session)
-    except Exception:
-        try:
-            session = aria2p.Session()
-            return aria2p.API(session)
-        except Exception:
-            return None
+    from .downloader import _aria2_api
+    return _aria2_api()
 
 
 def _session_path():
-    from pathlib import Path
-    return Path.home() / ".anidl" / "aria2.session"
+    from .daemon import session_path
+    return session_path()
 
 
-def _save_session(api):
+def _save_session(api, min_interval: float = 30.0):
+    """Ask aria2 to write its session file, at most once per `min_interval` seconds.
+
+    Each CLI call is its own process, so the session file's mtime is what coalesces
+    saves across pause/resume/remove calls. The managed daemon also saves on its own
+    (`--save-session-interval`).
+    """
+    sp = _session_path()
+    try:
+        if time.time() - sp.stat().st_mtime < min_interval:
+            return
+    except FileNotFoundError:
+        pass
     try:
-        sp = _session_path()
-        # ensure dir exists
         sp.parent.mkdir(parents=True, exist_ok=True)
-        if hasattr(api, "save_session"):
+        if hasattr(api, "client"):
+            api.client.save_session()
+        elif hasattr(api, "save_session"):
             api.save_session(str(sp))
-    except Exception:
-        pass
+    except Exception as e:
+        logger.warning("Failed to save aria2 session: %s", e)
 
 
-def list_downloads() -> List[dict]:
-    api = _api()
+def list_downloads(api=None) -> List[dict]:
+    api = api or _api()
     if api:
         try:
             downloads = api.get_downloads()
             out = []
             for d in downloads:
-                out.append({"gid": d.gid, "name": getattr(d, "name", None), "status": d.status})
-            try:
-                _save_session(api)
-            except Exception:
-                pass
+                out.append({
+                    "gid": d.gid,
+                    "name": getattr(d, "name", None),
+                    "status": d.status,
+                    "total": getattr(d, "total_length", 0) or 0,
+                    "completed": getattr(d, "completed_length", 0) or 0,
+                    "speed": getattr(d, "download_speed", 0) or 0,
+                })
             return out
         except Exception:
             return []
@@ -57,45 +67,36 @@ def list_downloads() -> List[dict]:
     return []
 
 
-def pause(gid: str) -> bool:
-    api = _api()
+def pause(gid: str, api=None) -> bool:
+    api = api or _api()
     if api:
         try:
             api.pause(gid)
-            try:
-                _save_session(api)
-            except Exception:
-                pass
+            _save_session(api)
             return True
         except Exception:
             return False
     return False
 
 
-def resume(gid: str) -> bool:
-    api = _api()
+def resume(gid: str, api=None) -> bool:
+    api = api or _api()
     if api:
         try:
             api.unpause(gid)
-            try:
-                _save_session(api)
-            except Exception:
-                pass
+            _save_session(api)
             return True
         except Exception:
             return False
     return False
 
 
-def remove(gid: str) -> bool:
-    api = _api()
+def remove(gid: str, api=None) -> bool:
+    api = api or _api()
     if api:
         try:
             api.remove(gid)
-            try:
-                _save_session(api)
-            except Exception:
-                pass
+            _save_session(api)
             return True
         except Exception:
             return False
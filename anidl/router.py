@@ -0,0 +1,265 @@
+"""Spread downloads over several aria2 instances.
+
+Nodes come from `[nodes] endpoints` in the config. `Router` looks like a single
+`rpc.Aria2RPC` to the async downloader: new downloads are placed on one node
+(least-loaded, or consistent hashing on the infohash so re-adds land on the same
+box) and gids are returned node-qualified as `<node>:<gid>`, so later status,
+pause, resume and remove calls go straight to the right node. Listing and
+status polling fan out to every node concurrently.
+
+Placement is serialized and a node's slot is taken before the add is sent, so a
+burst of concurrent adds spreads out instead of all seeing the same load; adds
+stay counted as pending until a refresh that started after they landed.
+"""
+from bisect import bisect
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+import asyncio
+import base64
+import hashlib
+import logging
+import shutil
+import time
+
+import aiohttp
+
+from .rpc import Aria2RPC, Aria2RPCError
+from .torrents import magnet_infohash, torrent_info
+from .utils import parse_size
+
+logger = logging.getLogger(__name__)
+
+PLACEMENTS = ("least-loaded", "hash")
+# virtual points per unit of weight on the hash ring
+VNODES = 64
+SEP = ":"
+# node stats younger than this (seconds) are reused for placement
+REFRESH_EVERY = 1.0
+
+
+class Node:
+    def __init__(self, name: str, rpc: Aria2RPC, weight: float = 1.0, download_dir: Optional[str] = None):
+        self.name = name
+        self.rpc = rpc
+        self.weight = weight or 1.0
+        self.download_dir = download_dir
+        self.up = True
+        self.active = 0
+        self.waiting = 0
+        self.speed = 0
+        self.free: Optional[int] = None  # bytes; None when the node's disk can't be seen from here
+        # adds placed here that the last refresh can't have counted yet, and how many of them landed
+        self.pending = 0
+        self.landed = 0
+
+    @property
+    def local(self) -> bool:
+        return urlsplit(self.rpc.url).hostname in ("localhost", "127.0.0.1", "::1")
+
+    def load(self) -> float:
+        return (self.active + self.waiting + self.pending) / self.weight
+
+    async def refresh(self, timeout: float = 2.0):
+        # adds that landed before the stats were asked for are in them from now on
+        landed = self.landed
+        try:
+            stat, opts = await asyncio.wait_for(self.rpc.multicall([
+                ("aria2.getGlobalStat", []),
+                ("aria2.getGlobalOption", []),
+            ]), timeout)
+            if isinstance(stat, Exception):
+                raise stat
+        except Exception as e:
+            if self.up:
+                logger.warning("aria2 node %s is unreachable: %s", self.name, e)
+            self.up = False
+            return
+        self.up = True
+        self.pending -= landed
+        self.landed -= landed
+        self.active = int(stat.get("numActive", 0))
+        self.waiting = int(stat.get("numWaiting", 0))
+        self.speed = int(stat.get("downloadSpeed", 0))
+        d = self.download_dir or (opts.get("dir") if isinstance(opts, dict) else None)
+        # aria2 doesn't report free space; only measurable when the node shares our filesystem
+        if self.local and d:
+            try:
+                self.free = shutil.disk_usage(Path(d).expanduser()).free
+            except OSError:
+                self.free = None
+
+
+def split_gid(qgid: str) -> Tuple[Optional[str], str]:
+    node, sep, gid = qgid.rpartition(SEP)
+    return (node, gid) if sep else (None, qgid)
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.sha1(key.encode("utf-8")).digest()[:8], "big")
+
+
+class Router:
+    def __init__(self, nodes: List[Node], placement: str = "least-loaded", min_free: int = 0):
+        if placement not in PLACEMENTS:
+            raise ValueError(f"unknown placement {placement!r} (choose from {', '.join(PLACEMENTS)})")
+        self.nodes = {n.name: n for n in nodes}
+        self.placement = placement
+        self.min_free = min_free
+        self._ring = sorted((_hash(f"{n.name}#{i}"), n.name) for n in nodes for i in range(int(VNODES * n.weight)))
+        self._ring_keys = [h for h, _ in self._ring]
+        self._placing = asyncio.Lock()
+        self._refreshed = 0.0
+
+    async def close(self):
+        await asyncio.gather(*(n.rpc.close() for n in self.nodes.values()))
+
+    async def refresh(self):
+        await asyncio.gather(*(n.refresh() for n in self.nodes.values()))
+        self._refreshed = time.monotonic()
+
+    def _eligible(self, node: Node) -> bool:
+        return node.up and (node.free is None or node.free >= self.min_free)
+
+    def place(self, key: str = "") -> Node:
+        """Pick the node for a new download (call `refresh()` first for current load)."""
+        candidates = [n for n in self.nodes.values() if self._eligible(n)]
+        if not candidates:
+            raise RuntimeError("no aria2 node is reachable with enough free space")
+        if self.placement == "hash" and key:
+            start = bisect(self._ring_keys, _hash(key))
+            for i in range(len(self._ring)):
+                node = self.nodes[self._ring[(start + i) % len(self._ring)][1]]
+                if self._eligible(node):
+                    return node
+        return min(candidates, key=lambda n: (n.load(), -(n.free or 0), n.name))
+
+    def _node(self, qgid: str) -> Tuple[Node, str]:
+        name, gid = split_gid(qgid)
+        if name not in self.nodes:
+            raise Aria2RPCError(1, f"unknown node in gid {qgid!r}")
+        return self.nodes[name], gid
+
+    async def _add(self, method: str, key: str, params: list, options: Optional[dict]) -> str:
+        async with self._placing:
+            if time.monotonic() - self._refreshed >= REFRESH_EVERY:
+                await self.refresh()
+            node = self.place(key)
+            # take the slot before sending, so concurrent adds see it
+            node.pending += 1
+        options = dict(options or {})
+        if node.download_dir:
+            # the node's own library path; the caller's dir is a local path
+            options["dir"] = node.download_dir
+        try:
+            gid = await node.rpc.call(method, *params, options)
+        except BaseException:
+            node.pending -= 1
+            raise
+        node.landed += 1
+        return f"{node.name}{SEP}{gid}"
+
+    # the Aria2RPC surface used by async_downloader / async_queue
+    async def add_uri(self, uris: List[str], options: Optional[dict] = None) -> str:
+        key = magnet_infohash(uris[0]) or uris[0] if uris else ""
+        return await self._add("aria2.addUri", key, [uris], options)
+
+    async def add_torrent(self, torrent_b64: str, uris: Optional[List[str]] = None, options: Optional[dict] = None) -> str:
+        try:
+            key = torrent_info(base64.b64decode(torrent_b64))["infohash"]
+        except Exception:
+            key = torrent_b64[:64]
+        return await self._add("aria2.addTorrent", key, [torrent_b64, uris or []], options)
+
+    async def tell_status(self, qgid: str, keys: Optional[List[str]] = None) -> dict:
+        node, gid = self._node(qgid)
+        return self._qualify(node, await node.rpc.tell_status(gid, keys))
+
+    async def tell_many(self, qgids: List[str], keys: Optional[List[str]] = None) -> Dict[str, Any]:
+        by_node: Dict[str, List[str]] = {}
+        out: Dict[str, Any] = {}
+        for q in qgids:
+            name, gid = split_gid(q)
+            if name in self.nodes:
+                by_node.setdefault(name, []).append(gid)
+            else:
+                out[q] = Aria2RPCError(1, f"unknown node in gid {q!r}")
+
+        async def one(name):
+            node = self.nodes[name]
+            try:
+                res = await node.rpc.tell_many(by_node[name], keys)
+            except Exception as e:
+                # a node that doesn't answer this tick is retried on the next one
+                logger.debug("Polling %s failed: %s", name, e)
+                return
+            for gid, st in res.items():
+                out[f"{name}{SEP}{gid}"] = st if isinstance(st, Exception) else self._qualify(node, st)
+
+        await asyncio.gather(*(one(n) for n in by_node))
+        return out
+
+    async def tell_all(self, keys: Optional[List[str]] = None, limit: int = 1000) -> List[dict]:
+        async def one(node):
+            try:
+                return [self._qualify(node, d) for d in await node.rpc.tell_all(keys, limit)]
+            except Exception as e:
+                logger.warning("Listing %s failed: %s", node.name, e)
+                return []
+        parts = await asyncio.gather(*(one(n) for n in self.nodes.values()))
+        return [d for part in parts for d in part]
+
+    @staticmethod
+    def _qualify(node: Node, st: dict) -> dict:
+        st = dict(st)
+        for k in ("gid", "following", "belongsTo"):
+            if st.get(k):
+                st[k] = f"{node.name}{SEP}{st[k]}"
+        if st.get("followedBy"):
+            st["followedBy"] = [f"{node.name}{SEP}{g}" for g in st["followedBy"]]
+        st["node"] = node.name
+        return st
+
+    async def _on_node(self, method: str, qgid: str) -> Any:
+        name, gid = split_gid(qgid)
+        if name is not None:
+            node, gid = self._node(qgid)
+            return await node.rpc.call(method, gid)
+        # bare gid (e.g. typed from an older listing): whichever node knows it
+        results = await asyncio.gather(*(n.rpc.call(method, gid) for n in self.nodes.values()), return_exceptions=True)
+        for r in results:
+            if not isinstance(r, Exception):
+                return r
+        raise Aria2RPCError(1, f"no node knows gid {gid}")
+
+    async def pause(self, qgid: str):
+        return await self._on_node("aria2.pause", qgid)
+
+    async def unpause(self, qgid: str):
+        return await self._on_node("aria2.unpause", qgid)
+
+    async def remove(self, qgid: str):
+        return await self._on_node("aria2.remove", qgid)
+
+    async def remove_download_result(self, qgid: str):
+        return await self._on_node("aria2.removeDownloadResult", qgid)
+
+    async def save_session(self):
+        await asyncio.gather(*(n.rpc.save_session() for n in self.nodes.values() if n.up), return_exceptions=True)
+        return "OK"
+
+
+def from_config(cfg: Optional[dict], session: Optional[aiohttp.ClientSession] = None) -> Optional[Router]:
+    """Router over `[nodes] endpoints`, or None when no nodes are configured."""
+    nc = (cfg or {}).get("nodes", {})
+    endpoints = nc.get("endpoints") or []
+    if not endpoints:
+        return None
+    nodes = []
+    for i, ep in enumerate(endpoints):
+        name = ep.get("name") or urlsplit(ep["url"]).hostname or f"node{i}"
+        if SEP in name:
+            raise ValueError(f"node name {name!r} may not contain {SEP!r}")
+        nodes.append(Node(name, Aria2RPC(ep["url"], ep.get("secret", ""), session=session),
+                          weight=float(ep.get("weight", 1.0)), download_dir=ep.get("download_dir") or None))
+    return Router(nodes, placement=nc.get("placement", "least-loaded"), min_free=parse_size(nc.get("min_free", 0)))
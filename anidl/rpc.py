@@ -0,0 +1,169 @@
+"""Minimal async JSON-RPC client for aria2 on aiohttp.
+
+The blocking `aria2p` client stalls the event loop on every call; this one
+shares the loop with feed fetching so adding, resolving and monitoring can
+overlap. Only the handful of methods anidl uses are wrapped; `call()` reaches
+anything else and `multicall()` batches several calls into one round trip.
+"""
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import asyncio
+import itertools
+import logging
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_URL = "http://localhost:6800/jsonrpc"
+
+# tellStatus keys needed for progress and completion events
+STATUS_KEYS = ["gid", "status", "totalLength", "completedLength", "downloadSpeed", "dir", "files",
+               "infoHash", "bittorrent", "followedBy", "errorMessage"]
+
+
+class Aria2RPCError(RuntimeError):
+    def __init__(self, code: int, message: str):
+        super().__init__(f"aria2 error {code}: {message}")
+        self.code = code
+
+
+class Aria2RPC:
+    def __init__(self, url: str = DEFAULT_URL, secret: str = "", session: Optional[aiohttp.ClientSession] = None,
+                 timeout: float = 10.0):
+        self.url = url
+        self.secret = secret
+        self.timeout = timeout
+        self._session = session
+        self._own_session = session is None
+        self._ids = itertools.count(1)
+
+    async def __aenter__(self) -> "Aria2RPC":
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        if self._own_session and self._session is not None:
+            await self._session.close()
+        self._session = None
+
+    def _params(self, params: Sequence) -> list:
+        return ([f"token:{self.secret}"] if self.secret else []) + list(params)
+
+    async def _post(self, payload: dict) -> Any:
+        if self._session is None:
+            self._session = aiohttp.ClientSession()
+            self._own_session = True
+        async with self._session.post(self.url, json=payload,
+                                      timeout=aiohttp.ClientTimeout(total=self.timeout)) as resp:
+            data = await resp.json(content_type=None)
+        if data.get("error"):
+            raise Aria2RPCError(data["error"].get("code", -1), data["error"].get("message", ""))
+        return data.get("result")
+
+    async def call(self, method: str, *params) -> Any:
+        return await self._post({"jsonrpc": "2.0", "id": next(self._ids), "method": method,
+                                 "params": self._params(params)})
+
+    async def multicall(self, calls: List[Tuple[str, Sequence]]) -> List[Any]:
+        """Run [(method, params), ...] in one request; failed calls come back as Aria2RPCError."""
+        if not calls:
+            return []
+        batch = [{"methodName": m, "params": self._params(p)} for m, p in calls]
+        out = []
+        for r in await self.call_raw("system.multicall", [batch]):
+            if isinstance(r, dict) and "code" in r:
+                out.append(Aria2RPCError(r["code"], r.get("message", "")))
+            else:
+                out.append(r[0] if isinstance(r, list) else r)
+        return out
+
+    async def call_raw(self, method: str, params: list) -> Any:
+        """Call without the secret token (system.* methods take it per inner call)."""
+        return await self._post({"jsonrpc": "2.0", "id": next(self._ids), "method": method, "params": params})
+
+    # wrappers named after the aria2 methods
+    async def get_version(self) -> dict:
+        return await self.call("aria2.getVersion")
+
+    async def add_uri(self, uris: List[str], options: Optional[dict] = None) -> str:
+        return await self.call("aria2.addUri", uris, options or {})
+
+    async def add_torrent(self, torrent_b64: str, uris: Optional[List[str]] = None, options: Optional[dict] = None) -> str:
+        return await self.call("aria2.addTorrent", torrent_b64, uris or [], options or {})
+
+    async def tell_status(self, gid: str, keys: Optional[List[str]] = None) -> dict:
+        return await self.call("aria2.tellStatus", gid, keys or STATUS_KEYS)
+
+    async def tell_many(self, gids: List[str], keys: Optional[List[str]] = None) -> Dict[str, Any]:
+        """tellStatus for many gids in one round trip; unknown gids map to an Aria2RPCError."""
+        results = await self.multicall([("aria2.tellStatus", [g, keys or STATUS_KEYS]) for g in gids])
+        return dict(zip(gids, results))
+
+    async def tell_all(self, keys: Optional[List[str]] = None, limit: int = 1000) -> List[dict]:
+        keys = keys or STATUS_KEYS
+        active, waiting, stopped = await self.multicall([
+            ("aria2.tellActive", [keys]),
+            ("aria2.tellWaiting", [0, limit, keys]),
+            ("aria2.tellStopped", [0, limit, keys]),
+        ])
+        return [d for part in (active, waiting, stopped) if isinstance(part, list) for d in part]
+
+    async def pause(self, gid: str) -> str:
+        return await self.call("aria2.pause", gid)
+
+    async def unpause(self, gid: str) -> str:
+        return await self.call("aria2.unpause", gid)
+
+    async def remove(self, gid: str) -> str:
+        return await self.call("aria2.remove", gid)
+
+    async def remove_download_result(self, gid: str) -> str:
+        return await self.call("aria2.removeDownloadResult", gid)
+
+    async def save_session(self) -> str:
+        return await self.call("aria2.saveSession")
+
+
+def endpoints() -> List[Tuple[str, str]]:
+    """Candidate (url, secret) pairs: a user-run aria2 on the default port, then the managed daemon."""
+    from . import daemon
+
+    out = [(DEFAULT_URL, "")]
+    kwargs = daemon.client_kwargs()
+    if kwargs:
+        out.append((f"{kwargs['host']}:{kwargs['port']}/jsonrpc", kwargs.get("secret", "")))
+    return out
+
+
+async def connect(cfg: Optional[dict] = None, start_daemon: bool = True,
+                  session: Optional[aiohttp.ClientSession] = None) -> Optional[Aria2RPC]:
+    """First reachable aria2 endpoint, starting the managed daemon if none answers; None otherwise.
+
+    With `[nodes] endpoints` configured this returns a `router.Router` over all of them instead.
+    """
+    from . import router
+    multi = router.from_config(cfg, session=session)
+    if multi is not None:
+        await multi.refresh()
+        if any(n.up for n in multi.nodes.values()):
+            return multi
+        await multi.close()
+        return None
+    for attempt in range(2):
+        for url, secret in endpoints():
+            rpc = Aria2RPC(url, secret, session=session, timeout=2.0)
+            try:
+                await rpc.get_version()
+                rpc.timeout = 10.0
+                return rpc
+            except Exception:
+                await rpc.close()
+        if attempt or not start_daemon:
+            return None
+        from . import daemon
+        # spawning and waiting for the port blocks; keep it off the loop
+        if not await asyncio.get_running_loop().run_in_executor(None, daemon.ensure_running, cfg or {}):
+            return None
+    return None
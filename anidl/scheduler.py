@@ -0,0 +1,196 @@
+"""Bandwidth scheduling and queue priority on top of aria2 global options.
+
+The scheduler owns two aria2 global options, `max-overall-download-limit` and
+`max-concurrent-downloads`, and picks their values from time windows in the
+config. It also keeps the waiting queue ordered by priority so new episodes
+start before backfill.
+"""
+from datetime import datetime, timedelta, time as dtime
+from typing import Dict, List, Optional
+import logging
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_NEW = 0
+PRIORITY_BACKFILL = 10
+
+DEFAULT_MAX_CONCURRENT = 5
+DEFAULT_MIN_SPEED = 50 * 1024  # bytes/s per active download before we shed concurrency
+
+
+def _parse_clock(value: str) -> dtime:
+    h, m = str(value).strip().split(":", 1)
+    return dtime(int(h), int(m))
+
+
+def _parse_rate(value) -> int:
+    """Parse an aria2-style rate ('2M', '512K', 1048576) into bytes per second."""
+    if value is None or value == "":
+        return 0
+    if isinstance(value, (int, float)):
+        return int(value)
+    m = re.fullmatch(r"\s*([0-9\.]+)\s*([KkMmGg]?)\s*", str(value))
+    if not m:
+        raise ValueError(f"Invalid rate: {value!r}")
+    mult = {"": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}[m.group(2).lower()]
+    return int(float(m.group(1)) * mult)
+
+
+def active_window(windows: List[dict], now: Optional[datetime] = None) -> dict:
+    """Return the first window covering `now`, or an empty dict.
+
+    Windows look like {"start": "08:00", "end": "23:00", "max_download_limit": "2M",
+    "max_concurrent": 2}. A window whose end is before its start wraps midnight.
+    """
+    now = now or datetime.now()
+    t = now.time()
+    for w in windows or []:
+        try:
+            start = _parse_clock(w.get("start", "00:00"))
+            end = _parse_clock(w.get("end", "00:00"))
+        except Exception:
+            logger.warning("Ignoring scheduler window with invalid times: %s", w)
+            continue
+        if start == end:
+            return w
+        if start < end and start <= t < end:
+            return w
+        if start > end and (t >= start or t < end):
+            return w
+    return {}
+
+
+def priority_for(item: dict, now: Optional[datetime] = None, new_days: int = 7) -> int:
+    """New episodes (published within `new_days`) beat backfill."""
+    published = item.get("date")
+    if not isinstance(published, datetime):
+        return PRIORITY_BACKFILL
+    now = now or datetime.utcnow()
+    return PRIORITY_NEW if now - published <= timedelta(days=new_days) else PRIORITY_BACKFILL
+
+
+class Scheduler:
+    """Apply time-windowed limits to aria2 and keep its waiting queue in priority order.
+
+    `api` is an aria2p.API (only `api.client` is used). Call `tick()` periodically;
+    it is cheap to call often since it rate-limits itself to `interval` seconds.
+    """
+
+    def __init__(self, api, windows: Optional[List[dict]] = None, min_speed: int = DEFAULT_MIN_SPEED,
+                 interval: float = 5.0, smoothing: float = 0.3):
+        self.client = getattr(api, "client", api)
+        self.windows = windows or []
+        self.min_speed = min_speed
+        self.interval = interval
+        self.smoothing = smoothing
+        self.priorities: Dict[str, int] = {}
+        self.speed = None  # EWMA of overall download speed
+        self.active = 0
+        self._window = None
+        self._concurrency = None
+        self._applied: Dict[str, str] = {}
+        self._last_tick = 0.0
+
+    def set_priority(self, gid: str, priority: int):
+        self.priorities[gid] = priority
+
+    def _limits(self, now: Optional[datetime] = None):
+        w = active_window(self.windows, now)
+        ceiling = int(w.get("max_concurrent", DEFAULT_MAX_CONCURRENT))
+        limit = _parse_rate(w.get("max_download_limit", 0))
+        if w != self._window:
+            # new window: start from its ceiling and let observe() adapt from there
+            self._window = w
+            self._concurrency = ceiling
+        return ceiling, limit
+
+    def observe(self) -> Optional[dict]:
+        """Sample aria2's global stats and adapt concurrency to measured throughput."""
+        try:
+            stat = self.client.get_global_stat()
+        except Exception as e:
+            logger.debug("getGlobalStat failed: %s", e)
+            return None
+        speed = int(stat.get("downloadSpeed", 0) or 0)
+        self.active = int(stat.get("numActive", 0) or 0)
+        if self.speed is None:
+            self.speed = float(speed)
+        else:
+            self.speed = self.smoothing * speed + (1 - self.smoothing) * self.speed
+        return stat
+
+    def _adapt(self, ceiling: int, limit: int):
+        current = self._concurrency or ceiling
+        if self.speed is not None and self.active:
+            per_download = self.speed / self.active
+            if self.active >= current and per_download < self.min_speed and current > 1:
+                # downloads are starving each other on a shared link; run fewer at once
+                current -= 1
+            elif per_download >= self.min_speed and (not limit or self.speed < 0.8 * limit):
+                current += 1
+        self._concurrency = max(1, min(ceiling, current))
+
+    def apply(self, now: Optional[datetime] = None) -> Dict[str, str]:
+        """Push the effective global options to aria2, skipping values already applied."""
+        ceiling, limit = self._limits(now)
+        self._adapt(ceiling, limit)
+        opts = {
+            "max-overall-download-limit": str(limit),
+            "max-concurrent-downloads": str(self._concurrency),
+        }
+        changed = {k: v for k, v in opts.items() if self._applied.get(k) != v}
+        if changed:
+            try:
+                self.client.change_global_option(changed)
+                self._applied.update(changed)
+            except Exception as e:
+                logger.warning("Failed to change aria2 global options: %s", e)
+        return opts
+
+    def reorder(self) -> int:
+        """Move waiting downloads into priority order; returns the number of moves."""
+        try:
+            waiting = self.client.tell_waiting(0, 1000, ["gid"])
+        except Exception as e:
+            logger.debug("tellWaiting failed: %s", e)
+            return 0
+        gids = [w.get("gid") for w in waiting]
+        # stable sort keeps aria2's order among equal priorities; unknown gids go last
+        wanted = sorted(gids, key=lambda g: self.priorities.get(g, PRIORITY_BACKFILL + 1))
+        moves = 0
+        for pos, gid in enumerate(wanted):
+            if gids[pos] == gid:
+                continue
+            try:
+                self.client.change_position(gid, pos, "POS_SET")
+            except Exception as e:
+                logger.debug("changePosition(%s) failed: %s", gid, e)
+                continue
+            gids.remove(gid)
+            gids.insert(pos, gid)
+            moves += 1
+        return moves
+
+    def tick(self, now: Optional[datetime] = None, force: bool = False):
+        mono = time.monotonic()
+        if not force and mono - self._last_tick < self.interval:
+            return
+        self._last_tick = mono
+        self.observe()
+        self.apply(now)
+        self.reorder()
+
+
+def from_config(api, cfg: dict) -> Optional[Scheduler]:
+    """Build a Scheduler from the `[scheduler]` config section, or None when disabled."""
+    sc = (cfg or {}).get("scheduler", {})
+    if not sc.get("enabled", False) or api is None:
+        return None
+    return Scheduler(
+        api,
+        windows=sc.get("windows", []),
+        min_speed=_parse_rate(sc.get("min_speed", DEFAULT_MIN_SPEED)),
+        interval=float(sc.get("interval", 5.0)),
+    )
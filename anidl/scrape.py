@@ -0,0 +1,266 @@
+"""Live seeder/leecher counts from tracker scrapes.
+
+RSS seeder counts go stale (often 0) for older releases. This module asks the
+trackers directly, batching many infohashes per request (BEP 15 for UDP, the
+`/scrape` convention for HTTP), queries all trackers concurrently with a short
+per-tracker timeout, and caches results in `~/.anidl/cache/scrape.json`.
+"""
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+import asyncio
+import json
+import logging
+import random
+import struct
+import time
+import urllib.parse
+
+from .torrents import TorrentCache, bdecode
+
+logger = logging.getLogger(__name__)
+
+UDP_PROTOCOL_ID = 0x41727101980
+ACTION_CONNECT, ACTION_SCRAPE, ACTION_ERROR = 0, 2, 3
+UDP_BATCH = 74  # BEP 15: at most ~74 hashes fit in one scrape packet
+HTTP_BATCH = 50
+
+DEFAULT_TRACKERS = [
+    "udp://tracker.opentrackr.org:1337/announce",
+    "udp://open.stealth.si:80/announce",
+]
+
+# infohash -> (seeders, leechers)
+Counts = Dict[str, Tuple[int, int]]
+
+
+class TrackerError(RuntimeError):
+    pass
+
+
+class _UDPClient(asyncio.DatagramProtocol):
+    def __init__(self):
+        self.transport = None
+        self.waiters: Dict[int, asyncio.Future] = {}
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        if len(data) < 8:
+            return
+        action, tid = struct.unpack(">II", data[:8])
+        fut = self.waiters.pop(tid, None)
+        if fut is not None and not fut.done():
+            fut.set_result((action, data[8:]))
+
+    def error_received(self, exc):
+        for fut in self.waiters.values():
+            if not fut.done():
+                fut.set_exception(exc)
+        self.waiters.clear()
+
+    async def request(self, payload_for_tid, timeout: float) -> Tuple[int, bytes]:
+        tid = random.getrandbits(32)
+        fut = asyncio.get_running_loop().create_future()
+        self.waiters[tid] = fut
+        self.transport.sendto(payload_for_tid(tid))
+        try:
+            return await asyncio.wait_for(fut, timeout)
+        finally:
+            self.waiters.pop(tid, None)
+
+
+async def scrape_udp(host: str, port: int, infohashes: List[str], timeout: float = 3.0) -> Counts:
+    loop = asyncio.get_running_loop()
+    transport, proto = await loop.create_datagram_endpoint(_UDPClient, remote_addr=(host, port))
+    try:
+        action, body = await proto.request(lambda tid: struct.pack(">QII", UDP_PROTOCOL_ID, ACTION_CONNECT, tid), timeout)
+        if action != ACTION_CONNECT or len(body) < 8:
+            raise TrackerError(body.decode(errors="replace") if action == ACTION_ERROR else "bad connect response")
+        (conn_id,) = struct.unpack(">Q", body[:8])
+        out: Counts = {}
+        for i in range(0, len(infohashes), UDP_BATCH):
+            batch = infohashes[i:i + UDP_BATCH]
+            hashes = b"".join(bytes.fromhex(h) for h in batch)
+            action, body = await proto.request(lambda tid: struct.pack(">QII", conn_id, ACTION_SCRAPE, tid) + hashes, timeout)
+            if action != ACTION_SCRAPE:
+                raise TrackerError(body.decode(errors="replace") if action == ACTION_ERROR else "bad scrape response")
+            for n, h in enumerate(batch):
+                chunk = body[n * 12:(n + 1) * 12]
+                if len(chunk) < 12:
+                    break
+                seeders, _completed, leechers = struct.unpack(">III", chunk)
+                out[h] = (seeders, leechers)
+        return out
+    finally:
+        transport.close()
+
+
+def scrape_url(announce: str) -> Optional[str]:
+    """Derive the scrape URL from an HTTP announce URL (None if the tracker can't scrape)."""
+    parts = urllib.parse.urlsplit(announce)
+    head, _, last = parts.path.rpartition("/")
+    if not last.startswith("announce"):
+        return None
+    return urllib.parse.urlunsplit(parts._replace(path=f"{head}/scrape{last[len('announce'):]}"))
+
+
+async def scrape_http(announce: str, infohashes: List[str], timeout: float = 3.0) -> Counts:
+    from .sources import shared_session
+
+    url = scrape_url(announce)
+    if url is None:
+        return {}
+    out: Counts = {}
+    async with shared_session() as session:
+        for i in range(0, len(infohashes), HTTP_BATCH):
+            batch = infohashes[i:i + HTTP_BATCH]
+            qs = "&".join("info_hash=" + urllib.parse.quote(bytes.fromhex(h), safe="") for h in batch)
+            sep = "&" if "?" in url else "?"
+            async with session.get(f"{url}{sep}{qs}", timeout=timeout) as resp:
+                data = bdecode(await resp.read())
+            for raw, stats in (data.get(b"files") or {}).items():
+                out[raw.hex()] = (int(stats.get(b"complete", 0)), int(stats.get(b"incomplete", 0)))
+    return out
+
+
+async def _scrape_tracker(tracker: str, infohashes: List[str], timeout: float) -> Counts:
+    parts = urllib.parse.urlsplit(tracker)
+    try:
+        if parts.scheme == "udp":
+            return await asyncio.wait_for(scrape_udp(parts.hostname, parts.port or 80, infohashes, timeout), timeout * 2)
+        if parts.scheme in ("http", "https"):
+            return await asyncio.wait_for(scrape_http(tracker, infohashes, timeout), timeout * 2)
+    except Exception as e:
+        logger.debug("Scrape of %s failed: %s", tracker, e)
+    return {}
+
+
+def item_trackers(item: dict, cache: Optional[TorrentCache] = None) -> List[str]:
+    """Trackers named by the magnet (`tr=`) or the cached torrent's announce list."""
+    out = []
+    url = item.get("torrent_url") or ""
+    if url.startswith("magnet:"):
+        out += urllib.parse.parse_qs(urllib.parse.urlsplit(url).query).get("tr", [])
+    data = (cache or TorrentCache()).get(item.get("infohash"))
+    if data:
+        try:
+            meta = bdecode(data)
+            if meta.get(b"announce"):
+                out.append(meta[b"announce"].decode(errors="replace"))
+            for tier in meta.get(b"announce-list", []):
+                out += [t.decode(errors="replace") for t in tier]
+        except Exception:
+            pass
+    return out
+
+
+class ScrapeCache:
+    def __init__(self, path: Optional[Path] = None, ttl: float = 1800):
+        self.path = path
+        self.ttl = ttl
+        self.entries: Dict[str, list] = {}
+        if path is not None and path.exists():
+            try:
+                self.entries = json.loads(path.read_text(encoding="utf-8"))
+            except Exception:
+                self.entries = {}
+
+    def known(self, infohash: str) -> bool:
+        """True when `infohash` was scraped within the TTL, even if no tracker knew it."""
+        e = self.entries.get(infohash)
+        return bool(e) and time.time() - e[0] < self.ttl
+
+    def get(self, infohash: str) -> Optional[Tuple[int, int]]:
+        e = self.entries.get(infohash)
+        if e and time.time() - e[0] < self.ttl and e[1] is not None:
+            return e[1], e[2]
+        return None
+
+    def update(self, counts: Counts, unknown: Iterable[str] = ()):
+        now = time.time()
+        for h, (s, l) in counts.items():
+            self.entries[h] = [now, s, l]
+        for h in unknown:
+            # remembered so it isn't scraped again until the TTL runs out
+            self.entries[h] = [now, None, None]
+        # drop expired rows so the file doesn't grow forever
+        self.entries = {h: e for h, e in self.entries.items() if now - e[0] < self.ttl}
+        if self.path is not None:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = self.path.with_suffix(".tmp")
+                tmp.write_text(json.dumps(self.entries), encoding="utf-8")
+                tmp.replace(self.path)
+            except OSError as e:
+                logger.warning("Failed to write scrape cache: %s", e)
+
+
+async def scrape_trackers(targets: Dict[str, Iterable[str]], timeout: float = 3.0) -> Dict[str, Counts]:
+    """Scrape {infohash: trackers} with one batched request set per tracker, all concurrently.
+
+    Returns each tracker's answers, {tracker: {infohash: (seeders, leechers)}}.
+    """
+    by_tracker: Dict[str, List[str]] = {}
+    for h, trackers in targets.items():
+        for t in trackers:
+            by_tracker.setdefault(t, []).append(h)
+    results = await asyncio.gather(*(_scrape_tracker(t, hs, timeout) for t, hs in by_tracker.items()))
+    return dict(zip(by_tracker, results))
+
+
+async def scrape_many(targets: Dict[str, Iterable[str]], timeout: float = 3.0) -> Counts:
+    """`scrape_trackers` merged per infohash by taking the highest seeder count."""
+    merged: Counts = {}
+    for counts in (await scrape_trackers(targets, timeout)).values():
+        for h, (s, l) in counts.items():
+            if h not in merged or s > merged[h][0]:
+                merged[h] = (s, l)
+    return merged
+
+
+async def refresh_health(items: List[dict], cfg: Optional[dict] = None, cache: Optional[ScrapeCache] = None) -> int:
+    """Replace feed seeder counts with live scrape results and re-rank dead torrents last.
+
+    A torrent's own trackers are believed even when they report no seeders. The
+    `[scrape] trackers` added to every torrent answer 0/0 for hashes they have never
+    seen, so their counts are only used when they report seeders.
+    Returns the number of items updated.
+    """
+    from .parser import health_score
+
+    sc = (cfg or {}).get("scrape", {})
+    if cache is None:
+        cache = ScrapeCache(Path.home() / ".anidl" / "cache" / "scrape.json", ttl=sc.get("ttl", 1800))
+    defaults = list(sc.get("trackers", DEFAULT_TRACKERS))
+    tcache = TorrentCache()
+    own: Dict[str, set] = {}
+    for it in items:
+        h = it.get("infohash")
+        if h and not cache.known(h):
+            own[h] = set(item_trackers(it, tcache))
+    if own:
+        answers = await scrape_trackers({h: ts | set(defaults) for h, ts in own.items()},
+                                        timeout=float(sc.get("timeout", 3.0)))
+        counts: Counts = {}
+        for tracker, result in answers.items():
+            for h, (s, l) in result.items():
+                if h not in own or (tracker not in own[h] and s <= 0):
+                    continue
+                if h not in counts or s > counts[h][0]:
+                    counts[h] = (s, l)
+        cache.update(counts, unknown=set(own) - set(counts))
+
+    updated = 0
+    for it in items:
+        counts = cache.get(it.get("infohash") or "")
+        if counts is None:
+            continue
+        it["seeders"], it["leechers"] = counts
+        it["scraped"] = True
+        if it.get("date") is not None:
+            it["health"] = health_score(it["seeders"], it["date"], it.get("uploader") or "")
+        updated += 1
+    # stable: keeps date order, but torrents confirmed dead sink to the bottom
+    items.sort(key=lambda it: bool(it.get("scraped")) and it.get("seeders", 0) == 0)
+    return updated
@@ -0,0 +1,52 @@
+"""The search pipeline shared by the CLI and the API server.
+
+feeds -> concurrent fetch -> parse (off the event loop) -> .torrent prefetch.
+"""
+from functools import partial
+from typing import Callable, List
+import asyncio
+import logging
+import time
+import urllib.parse
+
+from .parser import parse_feeds
+
+logger = logging.getLogger(__name__)
+
+
+def build_feeds(mode: str, query: str, resolution: str, cfg: dict, get_feeds: Callable) -> List[str]:
+    """Built-in feeds for the mode plus `[sources] custom_feeds` (with `{query}` substituted)."""
+    q = urllib.parse.quote_plus(query)
+    custom = [str(u).replace("{query}", q) for u in cfg.get("sources", {}).get("custom_feeds", [])]
+    return get_feeds(mode, query, resolution) + custom
+
+
+async def run_search(feeds: List[str], fetch: Callable, cfg: dict, resolve_magnets: bool = False,
+                     planner=None, key: str = "") -> List[dict]:
+    """Fetch and parse `feeds` with `fetch` (normally `sources.fetch_all_feeds`) into ranked items.
+
+    With a `feedplan.FeedPlanner`, only the feeds it plans for `key` are fetched.
+    """
+    src = cfg.get("sources", {})
+    timeout = src.get("timeout", 10)
+    concurrency = src.get("concurrency", 8)
+    t0 = time.perf_counter()
+    if planner is not None:
+        raw = await planner.fetch(feeds, fetch, key, timeout=timeout, concurrency=concurrency)
+    else:
+        raw = await fetch(feeds, timeout=timeout, concurrency=concurrency)
+    t1 = time.perf_counter()
+    logger.info("Fetched %d feeds", len(feeds), extra={"stage": "fetch", "feeds": len(feeds),
+                                                        "elapsed_ms": round((t1 - t0) * 1000)})
+    # feedparser (and magnet resolution) block; keep the loop free for concurrent work
+    items = await asyncio.get_running_loop().run_in_executor(None, partial(parse_feeds, raw, resolve_magnets=resolve_magnets))
+    logger.info("Parsed %d items", len(items), extra={"stage": "parse", "items": len(items),
+                                                       "elapsed_ms": round((time.perf_counter() - t1) * 1000)})
+    if resolve_magnets:
+        from .torrents import prefetch_torrents
+        # exact sizes from .torrent files; later adds go through addTorrent
+        try:
+            await prefetch_torrents(items, concurrency=concurrency, timeout=timeout)
+        except Exception as e:
+            logger.warning("Torrent prefetch failed: %s", e)
+    return items
@@ -0,0 +1,305 @@
+"""Local HTTP/JSON API (`anidl serve`) for frontends that would otherwise shell out.
+
+One process keeps a warm aiohttp session for feeds, the stale-while-revalidate
+result cache and a cached aria2 connection across requests. Unless a config was
+passed in, every request re-reads the (mtime-cached) config, so `anidl config`
+edits apply without a restart.
+
+    GET    /search?q=<query>&mode=anime|hentai|jav&resolution=<terms>&meta=0|1&refresh=0|1
+    GET    /queue
+    POST   /queue                {"uri": "...", "dir": "..."}
+    POST   /queue/{gid}/pause
+    POST   /queue/{gid}/resume
+    DELETE /queue/{gid}
+    GET    /history?limit=50
+    GET    /events               server-sent events with queue progress
+
+POST and DELETE need the per-install token from `~/.anidl/api-token` in an
+`X-Anidl-Token` (or `Authorization: Bearer`) header and a JSON Content-Type, and
+are refused when a browser sends them from another origin. `dir` must lie inside
+the download dir or one of the `[admission] volumes`.
+"""
+from functools import partial
+from pathlib import Path
+from typing import List, Optional
+import asyncio
+import json
+import logging
+import os
+import secrets
+import time
+import urllib.parse
+
+from aiohttp import web
+
+from . import feedplan
+from . import queue as queue_mod
+from . import sources
+from .config import ConfigError, load_config
+from .backfill import add_local
+from .cache import ResultCache, normalize_key
+from .search import build_feeds, run_search
+from .utils import load_history
+
+logger = logging.getLogger(__name__)
+
+_dumps = partial(json.dumps, default=str)
+
+
+def _json(data, status: int = 200) -> web.Response:
+    return web.json_response(data, status=status, dumps=_dumps)
+
+
+def token_path() -> Path:
+    return Path.home() / ".anidl" / "api-token"
+
+
+def api_token() -> str:
+    """The install's API token, created (readable by the owner only) on first use."""
+    path = token_path()
+    try:
+        token = path.read_text(encoding="utf-8").strip()
+        if token:
+            return token
+    except FileNotFoundError:
+        pass
+    path.parent.mkdir(parents=True, exist_ok=True)
+    token = secrets.token_hex(24)
+    tmp = path.with_name(path.name + ".tmp")
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(token)
+    os.replace(tmp, path)
+    return token
+
+
+class ServerState:
+    """Resources shared by all requests: feed session, result cache, aria2 connection."""
+
+    def __init__(self, cfg: Optional[dict] = None, poll_interval: float = 1.0, persist: bool = True,
+                 keepalive: Optional[float] = None, token: Optional[str] = None):
+        # a config handed in (tests, embedding) is used as-is; otherwise it follows the file
+        self._reload = cfg is None
+        self.cfg = cfg or load_config()
+        self.token = token or api_token()
+        self.poll_interval = poll_interval
+        self.keepalive = keepalive
+        self.session = None
+        self.persist = persist
+        self.results = ResultCache.from_config(self.cfg, persist=persist)
+        self.planner = feedplan.from_config(self.cfg, persist=persist)
+        self._api = None
+        self._api_checked = 0.0
+        self.snapshot: List[dict] = []
+        self._changed = asyncio.Condition()
+        self._poller: Optional[asyncio.Task] = None
+
+    async def start(self, app=None):
+        self.session = sources.new_session(self.cfg["sources"]["concurrency"], keepalive=self.keepalive)
+        sources.set_default_session(self.session)
+
+    async def stop(self, app=None):
+        if self._poller is not None:
+            self._poller.cancel()
+        sources.set_default_session(None)
+        if self.session is not None:
+            await self.session.close()
+
+    def reload(self):
+        """Pick up config file edits; a broken file keeps the last good config."""
+        if not self._reload:
+            return
+        try:
+            cfg = load_config()
+        except ConfigError as e:
+            logger.warning("Keeping the previous config: %s", e)
+            return
+        if cfg == self.cfg:
+            return
+        if cfg["cache"] != self.cfg["cache"]:
+            self.results = ResultCache.from_config(cfg, persist=self.persist)
+        if cfg["planner"] != self.cfg["planner"]:
+            self.planner = feedplan.from_config(cfg, persist=self.persist)
+        self.cfg = cfg
+        logger.info("Config reloaded")
+
+    def api(self):
+        """Cached aria2p API; a failed lookup is retried at most every 5 seconds."""
+        if self._api is None and time.monotonic() - self._api_checked > 5:
+            from .downloader import _aria2_api
+            self._api_checked = time.monotonic()
+            self._api = _aria2_api()
+        return self._api
+
+    async def blocking(self, fn, *args):
+        """Run a blocking call off the event loop."""
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    async def aria2(self, fn, *args):
+        """Call a `queue` function with the cached API off the loop; drop the API on failure."""
+        try:
+            return await self.blocking(lambda: fn(*args, api=self.api()))
+        except Exception:
+            self._api = None
+            raise
+
+    async def search(self, mode: str, query: str, resolution: str, meta: bool, refresh: bool = False) -> List[dict]:
+        feeds = build_feeds(mode, query, resolution, self.cfg, sources.get_feeds)
+
+        key = normalize_key(mode, query, resolution)
+
+        async def fetch():
+            # look the fetcher up at call time so it can be swapped (tests, helper process)
+            items = await run_search(feeds, sources.fetch_all_feeds, self.cfg, resolve_magnets=meta,
+                                     planner=self.planner, key=key)
+            return await self.blocking(add_local, items, query, mode, self.cfg)
+
+        items, _ = await self.results.get_or_fetch(key, fetch, refresh=refresh)
+        return items
+
+    def allowed_dir(self, path: Path) -> bool:
+        """True when `path` is inside the download dir or an `[admission] volumes` entry."""
+        roots = [self.cfg["defaults"]["download_dir"]] + list(self.cfg["admission"]["volumes"])
+        path = path.expanduser().resolve()
+        return any(path.is_relative_to(Path(r).expanduser().resolve()) for r in roots)
+
+    async def _poll(self):
+        # one poller feeds every SSE client, so N dashboards cost one RPC per tick
+        while True:
+            try:
+                snap = await self.aria2(queue_mod.list_downloads)
+            except Exception:
+                snap = []
+            async with self._changed:
+                self.snapshot = snap
+                self._changed.notify_all()
+            await asyncio.sleep(self.poll_interval)
+
+    def ensure_poller(self):
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.get_running_loop().create_task(self._poll())
+
+
+# web.AppKey exists from aiohttp 3.9; plain string keys still work on 3.8
+STATE_KEY = web.AppKey("state", ServerState) if hasattr(web, "AppKey") else "state"
+
+
+_SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+@web.middleware
+async def fresh_config(request: web.Request, handler):
+    request.app[STATE_KEY].reload()
+    return await handler(request)
+
+
+@web.middleware
+async def guard(request: web.Request, handler):
+    """Refuse state-changing requests without the token, a JSON body type, or from a foreign origin."""
+    if request.method in _SAFE_METHODS:
+        return await handler(request)
+    state: ServerState = request.app[STATE_KEY]
+    origin = request.headers.get("Origin")
+    if origin and urllib.parse.urlsplit(origin).netloc != request.host:
+        return _json({"error": "cross-origin request refused"}, status=403)
+    auth = request.headers.get("Authorization", "")
+    sent = request.headers.get("X-Anidl-Token") or (auth[7:] if auth.startswith("Bearer ") else "")
+    if not secrets.compare_digest(sent.encode(), state.token.encode()):
+        return _json({"error": "missing or wrong API token"}, status=401)
+    if request.content_type != "application/json":
+        return _json({"error": "Content-Type must be application/json"}, status=415)
+    return await handler(request)
+
+
+async def handle_search(request: web.Request) -> web.Response:
+    state: ServerState = request.app[STATE_KEY]
+    query = request.query.get("q", "").strip()
+    if not query:
+        return _json({"error": "missing q"}, status=400)
+    mode = request.query.get("mode", "anime")
+    if mode not in ("anime", "hentai", "jav"):
+        return _json({"error": f"unknown mode {mode}"}, status=400)
+    resolution = request.query.get("resolution", state.cfg["defaults"]["resolution"])
+    meta = request.query.get("meta", "0") in ("1", "true")
+    refresh = request.query.get("refresh", "0") in ("1", "true")
+    items = await state.search(mode, query, resolution, meta, refresh=refresh)
+    return _json({"query": query, "count": len(items), "items": items})
+
+
+async def handle_queue_list(request: web.Request) -> web.Response:
+    state: ServerState = request.app[STATE_KEY]
+    return _json({"downloads": await state.aria2(queue_mod.list_downloads)})
+
+
+async def handle_queue_add(request: web.Request) -> web.Response:
+    state: ServerState = request.app[STATE_KEY]
+    try:
+        body = await request.json()
+    except Exception:
+        return _json({"error": "invalid JSON body"}, status=400)
+    uri = body.get("uri")
+    if not uri:
+        return _json({"error": "missing uri"}, status=400)
+    from .downloader import add_torrent_or_magnet
+    download_dir = Path(body.get("dir") or state.cfg["defaults"]["download_dir"]).expanduser()
+    if not state.allowed_dir(download_dir):
+        return _json({"error": "dir must be inside the download dir or an [admission] volume"}, status=403)
+    try:
+        gid = await state.blocking(add_torrent_or_magnet, uri, download_dir)
+    except Exception as e:
+        return _json({"error": str(e)}, status=502)
+    return _json({"gid": gid}, status=201)
+
+
+def _queue_action(name: str):
+    async def handler(request: web.Request) -> web.Response:
+        state: ServerState = request.app[STATE_KEY]
+        ok = await state.aria2(getattr(queue_mod, name), request.match_info["gid"])
+        return _json({"ok": ok}, status=200 if ok else 502)
+    return handler
+
+
+async def handle_history(request: web.Request) -> web.Response:
+    try:
+        limit = int(request.query.get("limit", 50))
+    except ValueError:
+        return _json({"error": "limit must be an integer"}, status=400)
+    items = load_history()
+    return _json({"history": items[-limit:]})
+
+
+async def handle_events(request: web.Request) -> web.StreamResponse:
+    state: ServerState = request.app[STATE_KEY]
+    resp = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+    await resp.prepare(request)
+    state.ensure_poller()
+    try:
+        while True:
+            async with state._changed:
+                await state._changed.wait()
+                snap = state.snapshot
+            await resp.write(f"event: progress\ndata: {_dumps(snap)}\n\n".encode("utf-8"))
+    except (ConnectionResetError, asyncio.CancelledError):
+        pass
+    return resp
+
+
+def create_app(state: Optional[ServerState] = None) -> web.Application:
+    state = state or ServerState()
+    app = web.Application(middlewares=[guard, fresh_config])
+    app[STATE_KEY] = state
+    app.on_startup.append(state.start)
+    app.on_cleanup.append(state.stop)
+    app.router.add_get("/search", handle_search)
+    app.router.add_get("/queue", handle_queue_list)
+    app.router.add_post("/queue", handle_queue_add)
+    app.router.add_post("/queue/{gid}/pause", _queue_action("pause"))
+    app.router.add_post("/queue/{gid}/resume", _queue_action("resume"))
+    app.router.add_delete("/queue/{gid}", _queue_action("remove"))
+    app.router.add_get("/history", handle_history)
+    app.router.add_get("/events", handle_events)
+    return app
+
+
+def serve(host: str = "127.0.0.1", port: int = 8765):
+    web.run_app(create_app(), host=host, port=port, print=None)
@@ -1,7 +1,10 @@
 import ssl
 import asyncio
+import contextlib
+import contextvars
+import time
 import urllib.parse
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 import aiohttp
 
@@ -24,9 +27,39 @@ def get_feeds(mode: str, query: str, resolution: str = "") -> List[str]:
     return feeds
 
 
+class _TokenBucket:
+    """Allow `rate` requests per second with bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: int = 4):
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self.tokens = float(self.burst)
+        self.stamp = time.monotonic()
+
+    async def acquire(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        # going negative books a slot in the future; sleep until it comes due
+        self.tokens -= 1
+        if self.tokens < 0:
+            await asyncio.sleep(-self.tokens / self.rate)
+
+
+_limiter: Optional[_TokenBucket] = None
+
+
+def set_rate_limit(requests_per_second: float, burst: int = 4):
+    """Throttle all feed/torrent requests from this process; 0 disables the limit."""
+    global _limiter
+    _limiter = _TokenBucket(requests_per_second, burst) if requests_per_second and requests_per_second > 0 else None
+
+
 async def _fetch(session: aiohttp.ClientSession, url: str, timeout: int = 10, retries: int = 2) -> Dict[str, Any]:
     last_exc = None
     for attempt in range(retries + 1):
+        if _limiter is not None:
+            await _limiter.acquire()
         try:
             async with session.get(url, timeout=timeout) as resp:
                 text = await resp.text()
@@ -38,27 +71,89 @@ async def _fetch(session: aiohttp.ClientSession, url: str, timeout: int = 10, re
     return {"url": url, "status": None, "raw": "", "error": str(last_exc)}
 
 
-async def fetch_all_feeds(urls: List[str], timeout: int = 10, concurrency: int = 8) -> List[dict]:
-    """Fetch all RSS feed URLs concurrently and return list of dicts with url, status, raw, error.
+# Session opened by `shared_session()`; fetch helpers reuse it instead of opening their own.
+_shared: contextvars.ContextVar[Optional[aiohttp.ClientSession]] = contextvars.ContextVar("anidl_session", default=None)
 
-    Uses aiohttp with a reasonable default SSL/TLS connector. If SSL verification needs to be
-    disabled for a particular environment, the caller can create a session and call _fetch directly.
-    """
+
+def _new_session(concurrency: int = 8, keepalive: Optional[float] = None) -> aiohttp.ClientSession:
     # Create SSL context that verifies certificates by default
     ssl_ctx = ssl.create_default_context()
+    # long-lived processes keep idle TLS connections and DNS answers for `keepalive` seconds
+    extra = {"keepalive_timeout": keepalive, "ttl_dns_cache": int(keepalive)} if keepalive else {}
+    connector = aiohttp.TCPConnector(ssl=ssl_ctx, limit_per_host=concurrency, **extra)
+    timeout_obj = aiohttp.ClientTimeout(total=None)
+    return aiohttp.ClientSession(connector=connector, timeout=timeout_obj)
 
-    connector = aiohttp.TCPConnector(ssl=ssl_ctx, limit_per_host=concurrency)
 
-    timeout_obj = aiohttp.ClientTimeout(total=None)
+# Process-wide session for long-running modes (e.g. `anidl serve`), used when no context session is open.
+_default_session: Optional[aiohttp.ClientSession] = None
+
+
+def set_default_session(session: Optional[aiohttp.ClientSession]):
+    global _default_session
+    _default_session = session
+
+
+def new_session(concurrency: int = 8, keepalive: Optional[float] = None) -> aiohttp.ClientSession:
+    return _new_session(concurrency, keepalive)
+
 
-    async with aiohttp.ClientSession(connector=connector, timeout=timeout_obj) as session:
+@contextlib.asynccontextmanager
+async def shared_session(concurrency: int = 8):
+    """Open one session that feed and torrent fetches in this context will share."""
+    session = _shared.get()
+    if session is None and _default_session is not None and not _default_session.closed:
+        session = _default_session
+    if session is not None:
+        yield session
+        return
+    session = _new_session(concurrency)
+    token = _shared.set(session)
+    try:
+        async with session:
+            yield session
+    finally:
+        _shared.reset(token)
+
+
+async def _gather(urls: List[str], fetch, concurrency: int) -> List[dict]:
+    async with shared_session(concurrency) as session:
         sem = asyncio.Semaphore(concurrency)
 
         async def guarded_fetch(u: str):
             async with sem:
-                return await _fetch(session, u, timeout=timeout)
+                return await fetch(session, u)
 
         tasks = [guarded_fetch(u) for u in urls]
-        results = await asyncio.gather(*tasks)
-        return results
+        return await asyncio.gather(*tasks)
+
+
+async def fetch_all_feeds(urls: List[str], timeout: int = 10, concurrency: int = 8) -> List[dict]:
+    """Fetch all RSS feed URLs concurrently and return list of dicts with url, status, raw, error.
+
+    Uses aiohttp with a reasonable default SSL/TLS connector, or the session opened by an
+    enclosing `shared_session()`. If SSL verification needs to be disabled for a particular
+    environment, the caller can create a session and call _fetch directly.
+    """
+    return await _gather(urls, lambda session, u: _fetch(session, u, timeout=timeout), concurrency)
+
+
+async def _fetch_bytes(session: aiohttp.ClientSession, url: str, timeout: int = 10, retries: int = 2) -> Dict[str, Any]:
+    last_exc = None
+    for attempt in range(retries + 1):
+        if _limiter is not None:
+            await _limiter.acquire()
+        try:
+            async with session.get(url, timeout=timeout) as resp:
+                if resp.status != 200:
+                    return {"url": url, "status": resp.status, "body": b""}
+                return {"url": url, "status": resp.status, "body": await resp.read()}
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            last_exc = e
+            await asyncio.sleep(0.5 * (attempt + 1))
+    return {"url": url, "status": None, "body": b"", "error": str(last_exc)}
+
 
+async def fetch_all_bytes(urls: List[str], timeout: int = 10, concurrency: int = 8) -> List[dict]:
+    """Like fetch_all_feeds but returns raw response bytes under 'body' (for .torrent files)."""
+    return await _gather(urls, lambda session, u: _fetch_bytes(session, u, timeout=timeout), concurrency)
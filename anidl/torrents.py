@@ -0,0 +1,259 @@
+"""Local .torrent cache and minimal bencode support.
+
+Torrents are stored content-addressed under `~/.anidl/torrents/<infohash>.torrent`.
+Having the metainfo locally gives exact sizes and file lists without asking aria2,
+and lets magnets whose torrent we already have skip DHT metadata discovery.
+"""
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import base64
+import hashlib
+import logging
+import re
+import urllib.parse
+
+from .utils import format_size
+
+logger = logging.getLogger(__name__)
+
+
+class BencodeError(ValueError):
+    pass
+
+
+# real torrents nest a few levels; anything deeper is hostile input
+MAX_DEPTH = 64
+
+
+def _decode(data: bytes, i: int, depth: int = 0) -> Tuple[Any, int]:
+    if depth > MAX_DEPTH:
+        raise BencodeError(f"nesting deeper than {MAX_DEPTH} at offset {i}")
+    try:
+        c = data[i:i + 1]
+        if c == b"i":
+            end = data.index(b"e", i)
+            return int(data[i + 1:end]), end + 1
+        if c == b"l":
+            i += 1
+            out = []
+            while data[i:i + 1] != b"e":
+                v, i = _decode(data, i, depth + 1)
+                out.append(v)
+            return out, i + 1
+        if c == b"d":
+            i += 1
+            out = {}
+            while data[i:i + 1] != b"e":
+                at = i
+                k, i = _decode(data, i, depth + 1)
+                if not isinstance(k, bytes):
+                    raise BencodeError(f"dictionary key at offset {at} is not a byte string")
+                v, i = _decode(data, i, depth + 1)
+                out[k] = v
+            return out, i + 1
+        if c.isdigit():
+            colon = data.index(b":", i)
+            n = int(data[i:colon])
+            start = colon + 1
+            if start + n > len(data):
+                raise BencodeError("string runs past end of data")
+            return data[start:start + n], start + n
+    except (ValueError, IndexError) as e:
+        if isinstance(e, BencodeError):
+            raise
+        raise BencodeError(f"malformed bencode at offset {i}") from e
+    raise BencodeError(f"unexpected byte {c!r} at offset {i}")
+
+
+def bdecode(data: bytes) -> Any:
+    value, end = _decode(data, 0)
+    if end != len(data):
+        raise BencodeError("trailing data after bencoded value")
+    return value
+
+
+def bencode(value: Any) -> bytes:
+    if isinstance(value, bool):
+        value = int(value)
+    if isinstance(value, int):
+        return b"i%de" % value
+    if isinstance(value, str):
+        value = value.encode("utf-8")
+    if isinstance(value, bytes):
+        return b"%d:%s" % (len(value), value)
+    if isinstance(value, (list, tuple)):
+        return b"l" + b"".join(bencode(v) for v in value) + b"e"
+    if isinstance(value, dict):
+        items = sorted((k.encode("utf-8") if isinstance(k, str) else k, v) for k, v in value.items())
+        return b"d" + b"".join(bencode(k) + bencode(v) for k, v in items) + b"e"
+    raise TypeError(f"cannot bencode {type(value).__name__}")
+
+
+def _info_span(data: bytes) -> Tuple[int, int]:
+    """Return the byte span of the top-level `info` value, hashed verbatim for the infohash."""
+    if data[:1] != b"d":
+        raise BencodeError("torrent is not a dictionary")
+    i = 1
+    while data[i:i + 1] != b"e":
+        key, i = _decode(data, i, 1)
+        start = i
+        _, i = _decode(data, i, 1)
+        if key == b"info":
+            return start, i
+    raise BencodeError("torrent has no info dictionary")
+
+
+def _text(b: bytes) -> str:
+    return b.decode("utf-8", errors="replace")
+
+
+def _length(d: dict) -> int:
+    n = d.get(b"length", 0)
+    if not isinstance(n, int) or n < 0:
+        raise BencodeError(f"bad file length {n!r}")
+    return n
+
+
+def _name(value: Any) -> str:
+    if not isinstance(value, bytes):
+        raise BencodeError(f"expected a byte string, got {type(value).__name__}")
+    return _text(value)
+
+
+def torrent_info(data: bytes) -> Dict:
+    """Parse .torrent bytes into {infohash, name, size, files: [{path, length}]}.
+
+    Raises BencodeError for anything that isn't a well-formed torrent.
+    """
+    start, end = _info_span(data)
+    info = bdecode(data[start:end])
+    if not isinstance(info, dict):
+        raise BencodeError("info is not a dictionary")
+    infohash = hashlib.sha1(data[start:end]).hexdigest()
+    name = _name(info.get(b"name.utf-8", info.get(b"name", b"")))
+    files: List[Dict] = []
+    if b"files" in info:
+        if not isinstance(info[b"files"], list):
+            raise BencodeError("files is not a list")
+        for f in info[b"files"]:
+            if not isinstance(f, dict):
+                raise BencodeError("file entry is not a dictionary")
+            parts = f.get(b"path.utf-8", f.get(b"path", []))
+            if not isinstance(parts, list):
+                raise BencodeError("file path is not a list")
+            files.append({"path": "/".join(_name(p) for p in parts), "length": _length(f)})
+    else:
+        files.append({"path": name, "length": _length(info)})
+    return {"infohash": infohash, "name": name, "size": sum(f["length"] for f in files), "files": files}
+
+
+def magnet_infohash(uri: str) -> Optional[str]:
+    """Extract the lowercase hex infohash from a magnet URI (hex or base32 btih)."""
+    if not uri or not uri.startswith("magnet:"):
+        return None
+    qs = urllib.parse.parse_qs(urllib.parse.urlsplit(uri).query)
+    for xt in qs.get("xt", []):
+        m = re.fullmatch(r"urn:btih:([0-9A-Za-z]+)", xt)
+        if not m:
+            continue
+        h = m.group(1)
+        if len(h) == 40 and re.fullmatch(r"[0-9A-Fa-f]{40}", h):
+            return h.lower()
+        if len(h) == 32:
+            try:
+                return base64.b32decode(h.upper()).hex()
+            except Exception:
+                return None
+    return None
+
+
+class TorrentCache:
+    """Content-addressed store of .torrent files keyed by infohash."""
+
+    def __init__(self, root: Optional[Path] = None):
+        self.root = Path(root) if root else Path.home() / ".anidl" / "torrents"
+
+    def path(self, infohash: str) -> Path:
+        return self.root / f"{infohash.lower()}.torrent"
+
+    def get(self, infohash: Optional[str]) -> Optional[bytes]:
+        if not infohash:
+            return None
+        p = self.path(infohash)
+        try:
+            return p.read_bytes()
+        except OSError:
+            return None
+
+    def info(self, infohash: Optional[str]) -> Optional[Dict]:
+        data = self.get(infohash)
+        if data is None:
+            return None
+        try:
+            return torrent_info(data)
+        except BencodeError:
+            logger.warning("Discarding corrupt cached torrent %s", infohash)
+            self.path(infohash).unlink(missing_ok=True)
+            return None
+
+    def put(self, data: bytes) -> Dict:
+        """Validate and store torrent bytes; returns the parsed info."""
+        meta = torrent_info(data)
+        self.root.mkdir(parents=True, exist_ok=True)
+        p = self.path(meta["infohash"])
+        if not p.exists():
+            tmp = p.with_suffix(".tmp")
+            tmp.write_bytes(data)
+            tmp.replace(p)
+        return meta
+
+
+def annotate(item: Dict, meta: Dict, cache: TorrentCache):
+    """Fill an item with exact metadata from a parsed torrent."""
+    item["infohash"] = meta["infohash"]
+    item["size_bytes"] = meta["size"]
+    item["size"] = format_size(meta["size"])
+    item["files"] = meta["files"]
+    item["torrent_path"] = str(cache.path(meta["infohash"]))
+    if not item.get("title"):
+        item["title"] = meta["name"]
+
+
+async def prefetch_torrents(items: List[Dict], cache: Optional[TorrentCache] = None, concurrency: int = 8,
+                            timeout: int = 10) -> int:
+    """Fetch .torrent links concurrently into the cache and annotate items in place.
+
+    Magnets whose infohash is already cached are annotated without any network access.
+    Uses the shared session from `sources.shared_session` when one is open.
+    Returns the number of items annotated.
+    """
+    from .sources import fetch_all_bytes
+
+    cache = cache or TorrentCache()
+    done = 0
+    pending = []
+    for it in items:
+        url = it.get("torrent_url") or ""
+        ih = it.get("infohash") or magnet_infohash(url)
+        meta = cache.info(ih) if ih else None
+        if meta:
+            annotate(it, meta, cache)
+            done += 1
+        elif url.startswith("http") and url.endswith(".torrent"):
+            pending.append(it)
+    if not pending:
+        return done
+
+    results = await fetch_all_bytes([it["torrent_url"] for it in pending], timeout=timeout, concurrency=concurrency)
+    for it, res in zip(pending, results):
+        data = res.get("body")
+        if not data:
+            continue
+        try:
+            meta = cache.put(data)
+        except BencodeError as e:
+            logger.debug("Not a valid torrent at %s: %s", it["torrent_url"], e)
+            continue
+        annotate(it, meta, cache)
+        done += 1
+    return done
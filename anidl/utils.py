@@ -1,5 +1,14 @@
-from typing import List
+from contextlib import contextmanager
+from typing import Iterator, List
 from pathlib import Path
+import re
+import sys
+
+if sys.platform == "win32":
+    import msvcrt
+    fcntl = None
+else:
+    import fcntl
 
 
 def parse_selection(input_str: str, max_idx: int) -> List[int]:
@@ -30,11 +39,60 @@ def parse_selection(input_str: str, max_idx: int) -> List[int]:
     return sorted(out)
 
 
+def format_size(n: int) -> str:
+    """Human-friendly size for a byte count, e.g. '1.40 GB' or '350 MB'."""
+    n = int(n)
+    if n > 1024 * 1024 * 1024:
+        return f"{n / (1024**3):.2f} GB"
+    return f"{n / (1024**2):.0f} MB"
+
+
+def parse_size(value) -> int:
+    """Bytes for '1.4 GB', '350MiB', '2G' or a plain number; 0 when unparseable."""
+    if isinstance(value, (int, float)):
+        return int(value)
+    m = re.fullmatch(r"\s*([0-9]+(?:\.[0-9]+)?)\s*([KMGT]?)(?:i?B)?\s*", str(value or ""), re.IGNORECASE)
+    if not m:
+        return 0
+    mult = {"": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3, "t": 1024 ** 4}[m.group(2).lower()]
+    return int(float(m.group(1)) * mult)
+
+
+def parse_size_strict(value) -> int:
+    """`parse_size` that raises ValueError instead of answering 0 for junk."""
+    size = parse_size(value)
+    text = str(value if value is not None else "").strip()
+    if not text or (size == 0 and not text.startswith("0")):
+        raise ValueError(f"not a size: {value!r} (e.g. 2G, 500MB)")
+    return size
+
+
 def ensure_dir(p: Path):
     if not p.exists():
         p.mkdir(parents=True, exist_ok=True)
 
 
+@contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """Hold an exclusive lock on `<path>.lock` so read-modify-write of `path` is safe across processes."""
+    lock = Path(path).with_name(Path(path).name + ".lock")
+    lock.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock, "a+b") as fh:
+        if fcntl is not None:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+        else:
+            fh.seek(0)
+            msvcrt.locking(fh.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+            else:
+                fh.seek(0)
+                msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+
+
 def _history_path() -> Path:
     d = Path.home() / ".anidl"
     d.mkdir(parents=True, exist_ok=True)
@@ -66,16 +124,12 @@ def load_history() -> List[dict]:
 
 
 def setup_logging(verbose: bool = False):
-    import logging
-    log_dir = Path.home() / ".anidl"
-    log_dir.mkdir(parents=True, exist_ok=True)
-    log_file = log_dir / "anidl.log"
-    level = logging.DEBUG if verbose else logging.INFO
-    handler = logging.FileHandler(log_file, encoding="utf-8")
-    formatter = logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
-    handler.setFormatter(formatter)
-    root = logging.getLogger()
-    # Avoid adding multiple handlers in repeated calls
-    if not any(isinstance(h, logging.FileHandler) and getattr(h, 'baseFilename', None) == str(log_file) for h in root.handlers):
-        root.addHandler(handler)
-    root.setLevel(level)
+    """Log to `~/.anidl/anidl.log` through a background writer (see `logs.py`), per `[logging]`."""
+    from .config import load_config, ConfigError
+    from .logs import setup
+    try:
+        cfg = load_config()
+    except ConfigError:
+        # the caller reports the bad config; log with defaults meanwhile
+        cfg = {}
+    setup(verbose, cfg)
@@ -0,0 +1,88 @@
+import pytest
+from aiohttp import web
+
+from anidl.rpc import Aria2RPCError
+
+
+class FakeAria2:
+    """Just enough of aria2's JSON-RPC for the async downloader and queue."""
+
+    def __init__(self, secret="s3cret"):
+        self.secret = secret
+        self.downloads = {}
+        self.requests = 0
+
+    def _call(self, method, params):
+        if params[:1] != [f"token:{self.secret}"]:
+            raise Aria2RPCError(1, "Unauthorized")
+        params = params[1:]
+        if method == "aria2.getVersion":
+            return {"version": "1.37.0"}
+        if method in ("aria2.addUri", "aria2.addTorrent"):
+            gid = f"g{len(self.downloads) + 1}"
+            self.downloads[gid] = {"gid": gid, "status": "active", "totalLength": "100", "completedLength": "0",
+                                   "downloadSpeed": "10", "dir": params[-1]["dir"], "options": params[-1],
+                                   "files": [{"path": f"{params[-1]['dir']}/{gid}.mkv", "selected": "true"}]}
+            return gid
+        if method == "aria2.tellStatus":
+            if params[0] not in self.downloads:
+                raise Aria2RPCError(1, f"GID {params[0]} is not found")
+            d = self.downloads[params[0]]
+            if d["status"] == "active":
+                # every poll moves a download halfway; the metadata gid g1 hands over to g3
+                done = min(100, int(d["completedLength"]) + 50)
+                d["completedLength"] = str(done)
+                if done == 100:
+                    d["status"] = "complete"
+                    if d["gid"] == "g1":
+                        self.downloads["g3"] = dict(d, gid="g3", status="active", completedLength="0",
+                                                   files=[{"path": f"{d['dir']}/g3.mkv", "selected": "true"}])
+                        d["followedBy"] = ["g3"]
+            return {k: v for k, v in d.items() if k != "options"}
+        if method in ("aria2.tellActive", "aria2.tellWaiting", "aria2.tellStopped"):
+            want = {"aria2.tellActive": ("active",), "aria2.tellWaiting": ("paused", "waiting"),
+                    "aria2.tellStopped": ("complete", "removed", "error")}[method]
+            return [d for d in self.downloads.values() if d["status"] in want]
+        if method in ("aria2.pause", "aria2.remove"):
+            if params[0] not in self.downloads:
+                raise Aria2RPCError(1, "not found")
+            self.downloads[params[0]]["status"] = "paused" if method == "aria2.pause" else "removed"
+            return params[0]
+        if method == "aria2.saveSession":
+            return "OK"
+        if method == "aria2.getGlobalStat":
+            statuses = [d["status"] for d in self.downloads.values()]
+            return {"numActive": str(statuses.count("active")), "numWaiting": str(statuses.count("waiting")),
+                    "downloadSpeed": "0"}
+        if method == "aria2.getGlobalOption":
+            return {"dir": "/srv/downloads"}
+        raise Aria2RPCError(1, f"No such method: {method}")
+
+    async def handle(self, request):
+        self.requests += 1
+        body = await request.json()
+        try:
+            if body["method"] == "system.multicall":
+                out = []
+                for c in body["params"][0]:
+                    try:
+                        out.append([self._call(c["methodName"], c["params"])])
+                    except Aria2RPCError as e:
+                        out.append({"code": e.code, "message": str(e)})
+                result = out
+            else:
+                result = self._call(body["method"], body["params"])
+        except Aria2RPCError as e:
+            return web.json_response({"id": body["id"], "error": {"code": e.code, "message": str(e)}})
+        return web.json_response({"id": body["id"], "jsonrpc": "2.0", "result": result})
+
+    def app(self):
+        app = web.Application()
+        app.router.add_post("/jsonrpc", self.handle)
+        return app
+
+
+@pytest.fixture
+def fake_aria2():
+    """The FakeAria2 class; serve `fake_aria2().app()` with aiohttp's TestServer."""
+    return FakeAria2
@@ -0,0 +1,103 @@
+from collections import namedtuple
+
+from anidl import admission
+
+Usage = namedtuple("Usage", "total used free")
+G = 1024 ** 3
+
+
+def _disks(monkeypatch, free):
+    def disk_usage(path):
+        for root, n in free.items():
+            if str(path).startswith(str(root)):
+                return Usage(100 * G, 0, n)
+        raise FileNotFoundError(path)
+    monkeypatch.setattr(admission.shutil, "disk_usage", disk_usage)
+
+
+def test_reservations_accumulate_and_spill_over(monkeypatch, tmp_path):
+    a, b = tmp_path / "a", tmp_path / "b"
+    a.mkdir(), b.mkdir()
+    _disks(monkeypatch, {a: 10 * G, b: 6 * G})
+    res = admission.Reservations(tmp_path / "reservations.json")
+    adm = admission.Admission([a, b], res, headroom=1 * G)
+
+    # 9G fits in a's 10G minus 1G headroom; the next 4G no longer does
+    assert adm.admit("k1", {"size": "9 GiB"}, a) == a
+    assert adm.admit("k2", {"size": "4 GiB"}, a) == b
+    assert adm.admit("k3", {"size": "2 GiB"}, a) is None
+    # reservations survive a restart and follow the gid once it is known
+    adm.rekey("k1", "gid1")
+    again = admission.Admission([a, b], admission.Reservations(res.path), headroom=1 * G)
+    assert again.reservations.reserved(a) == 9 * G
+    assert again.release("gid1") and not again.release("gid1")
+    assert again.admit("k3", {"size": "2 GiB"}, a) == a
+
+    # only the selected files of a batch count
+    batch = {"size": "50 GiB", "files": [{"length": 1 * G}, {"length": 49 * G}]}
+    assert admission.release_size(batch, [1]) == 1 * G
+    assert admission.release_size({"title": "unknown"}) == 0
+    assert adm.admit("k4", {"title": "unknown"}, a) == a
+
+
+def test_most_free_strategy_and_deferral(monkeypatch, tmp_path):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    a, b = tmp_path / "a", tmp_path / "b"
+    monkeypatch.setattr(admission.Admission, "available",
+                        lambda self, v: {str(a): 3 * G, str(b): 8 * G}[str(v)])
+    res = admission.Reservations(tmp_path / "reservations.json")
+    adm = admission.Admission([a, b], res, strategy="most-free")
+    assert adm.place(1 * G, a) == b
+    assert admission.Admission([a, b], res).place(1 * G, a) == a
+
+    res.defer({"item": {"title": "x"}, "uri": "magnet:?xt=urn:btih:abc"})
+    assert [d["uri"] for d in admission.Reservations(res.path).take_deferred()] == ["magnet:?xt=urn:btih:abc"]
+    assert admission.Reservations(res.path).deferred == []
+
+    cfg = {"admission": {"enabled": True, "volumes": [str(b)], "headroom": "2G", "strategy": "first-fit"}}
+    adm = admission.from_config(cfg, a)
+    assert adm.volumes == [a, b] and adm.headroom == 2 * G
+    assert admission.from_config({"admission": {"enabled": False}}, a) is None
+
+
+def test_reservations_count_only_what_is_still_to_be_written(monkeypatch, tmp_path):
+    a = tmp_path / "a"
+    a.mkdir()
+    # 20G disk with a 9G download in progress: aria2 preallocated it, so 11G is free
+    _disks(monkeypatch, {a: 11 * G})
+    res = admission.Reservations(tmp_path / "reservations.json")
+    adm = admission.Admission([a], res, headroom=1 * G)
+    res.reserve("running", a, 9 * G)
+    res.reserve("forgotten", a, 5 * G)
+    res.reserve("pending:1", a, 1 * G)
+    assert adm.admit("k", {"size": "9 GiB"}, a) is None
+
+    monkeypatch.setattr(admission, "on_disk", lambda files: 9 * G if files == ["ep.mkv"] else 0)
+    states = {"running": {"status": "active", "completed": 2 * G, "files": ["ep.mkv"]}}
+    res.refresh(states.get)
+    assert sorted(res.entries) == ["pending:1", "running"]
+    assert res.reserved(a) == 1 * G
+    assert adm.admit("k", {"size": "9 GiB"}, a) == a
+
+
+def test_concurrent_admits_do_not_share_free_space(monkeypatch, tmp_path):
+    import threading
+
+    a = tmp_path / "a"
+    a.mkdir()
+    _disks(monkeypatch, {a: 9 * G})
+    path = tmp_path / "reservations.json"
+    results = []
+
+    def admit(n):
+        # separate instances, like separate processes sharing the file
+        adm = admission.Admission([a], admission.Reservations(path))
+        results.append(adm.admit(f"k{n}", {"size": "2 GiB"}, a))
+
+    threads = [threading.Thread(target=admit, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results.count(a) == 4 and results.count(None) == 4
+    assert admission.Reservations(path).reserved(a) == 8 * G
@@ -0,0 +1,131 @@
+import asyncio
+from datetime import datetime
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from anidl import backfill
+
+
+def _row(n):
+    ih = f"{n:040x}"
+    return f"""
+<tr class="category_0"><td rowspan="2"><a href="?cat=1"><span class="sprite_cat-anime"></span></a></td>
+<td class="desc-top"><a href="magnet:?xt=urn:btih:{ih}&amp;tr=http%3A%2F%2Ft.example%2Fannounce"><span class="sprite_magnet"></span></a>
+ <a rel="nofollow" type="application/x-bittorrent" href="https://t.example/{n}.torrent">[Group] Old Show - {n:02d} (1080p).mkv</a></td>
+<td class="web"><a href="details.php?id={n}">Details</a></td>
+<td class="stats" rowspan="2">S: <span style="color: red">{n}</span> L: <span>1</span> C: <span>9</span> ID: {n}</td></tr>
+<tr class="category_0"><td class="desc-bot">Authorized: <span class="auth_ok">Yes</span> Submitter: <a href="?username=grp">grp</a>
+ | Size: 1.{n}GB | Date: 2019-01-{n:02d} 12:00 UTC | Comment: ep {n}</td><td class="web"></td></tr>"""
+
+
+def _page(numbers):
+    rows = "".join(_row(n) for n in numbers)
+    return f'<html><body><table class="listing">{rows}</table></body></html>'
+
+
+def test_parse_search_page():
+    items = backfill.parse_search_page(_page([3]))
+    assert items == [{
+        "title": "[Group] Old Show - 03 (1080p).mkv",
+        "torrent_url": "https://t.example/3.torrent",
+        "magnet": f"magnet:?xt=urn:btih:{3:040x}&tr=http%3A%2F%2Ft.example%2Fannounce",
+        "seeders": 3, "leechers": 1, "uploader": "grp", "size": "1.3GB",
+        "date": datetime(2019, 1, 3, 12, 0), "infohash": f"{3:040x}",
+    }]
+    assert backfill.parse_search_page("<html><p>No results</p></html>") == []
+
+
+def test_crawl_writes_incrementally_and_stops_on_known(monkeypatch, tmp_path):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    # 7 recorded pages of 3 releases each, newest first
+    pages = {p: _page(range(22 - 3 * p, 25 - 3 * p)) for p in range(1, 8)}
+    hits = []
+
+    async def search(request):
+        p = int(request.query["page"])
+        hits.append(p)
+        assert request.query["terms"] == "old show" and request.query["type"] == "1"
+        return web.Response(text=pages.get(p, _page([])), content_type="text/html")
+
+    app = web.Application()
+    app.router.add_get("/search.php", search)
+
+    async def run():
+        server = TestServer(app)
+        await server.start_server()
+        cfg = {"backfill": {"url": str(server.make_url("/search.php")) + "?terms={query}&type={type}&page={page}",
+                            "stop_ratio": 0.8}}
+        index = backfill.LocalIndex()
+        try:
+            first = await backfill.crawl(index, "old show", cfg=cfg, concurrency=3)
+            assert first == {"pages": 7, "items": 21, "new": 21, "stopped": "end"}
+            assert sorted(hits) == list(range(1, 10))
+
+            # two new uploads push everything down a bit; the crawl stops once pages repeat
+            pages.update({p: _page(range(24 - 3 * p, 27 - 3 * p)) for p in range(1, 8)})
+            hits.clear()
+            second = await backfill.crawl(index, "old show", cfg=cfg, concurrency=2)
+            assert second["new"] == 2 and second["stopped"] == "indexed"
+            assert second["pages"] == 2 and sorted(hits) == [1, 2]
+            assert index.count() == 23
+        finally:
+            index.close()
+            await server.close()
+
+    asyncio.run(run())
+
+    # feed results and indexed releases are merged, feed copies win
+    feed = [{"title": "[Group] Old Show - 24", "infohash": f"{24:040x}", "date": datetime(2019, 1, 24, 12), "seeders": 99},
+            # fetched with --no-meta: matched on the .torrent link instead
+            {"title": "[Group] Old Show - 23", "torrent_url": "https://t.example/23.torrent", "infohash": None,
+             "date": datetime(2019, 1, 23, 12)}]
+    merged = backfill.add_local(feed, "old show 2", "anime", {})
+    assert merged[:2] == feed
+    # every query token must appear in the title: episodes 02, 12 and 20-22, newest first
+    assert [it["title"].split(" - ")[1][:2] for it in merged[2:]] == ["22", "21", "20", "12", "02"]
+    assert all(it["indexed"] and it["torrent_url"].endswith(".torrent") and it["magnet"].startswith("magnet:")
+               for it in merged[2:])
+    assert backfill.add_local(feed, "old show", "jav", {}) == feed
+
+
+def test_crawl_resumes_a_capped_backfill(monkeypatch, tmp_path):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    pages = {p: _page(range(22 - 3 * p, 25 - 3 * p)) for p in range(1, 8)}
+    hits = []
+
+    async def search(request):
+        p = int(request.query["page"])
+        hits.append(p)
+        return web.Response(text=pages.get(p, _page([])), content_type="text/html")
+
+    app = web.Application()
+    app.router.add_get("/search.php", search)
+
+    async def run():
+        server = TestServer(app)
+        await server.start_server()
+        cfg = {"backfill": {"url": str(server.make_url("/search.php")) + "?terms={query}&type={type}&page={page}",
+                            "stop_ratio": 0.8}}
+        index = backfill.LocalIndex()
+        try:
+            first = await backfill.crawl(index, "old show", cfg=cfg, max_pages=3, concurrency=1)
+            assert first == {"pages": 3, "items": 9, "new": 9, "stopped": "max-pages"}
+            assert index.crawl_state("anime", "Old Show") == (3, False)
+
+            # page 1 is all known, but the first run never got past page 3: carry on from there
+            hits.clear()
+            second = await backfill.crawl(index, "old show", cfg=cfg, max_pages=10, concurrency=1)
+            assert second["stopped"] == "end" and second["new"] == 12 and second["resumed_from"] == 3
+            assert hits == [1, 3, 4, 5, 6, 7, 8]
+            assert index.count() == 21 and index.crawl_state("anime", "old show") == (7, True)
+
+            # once a crawl reached the end, known pages mean caught up again
+            hits.clear()
+            third = await backfill.crawl(index, "old show", cfg=cfg, concurrency=1)
+            assert third["stopped"] == "indexed" and "resumed_from" not in third and hits == [1]
+        finally:
+            index.close()
+            await server.close()
+
+    asyncio.run(run())
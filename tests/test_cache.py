@@ -0,0 +1,62 @@
+import asyncio
+from datetime import datetime
+
+from anidl.cache import ResultCache, normalize_key
+
+
+def test_normalize_key_ignores_case_spacing_and_term_order():
+    assert normalize_key("anime", "One  Piece", "-720p -480p") == normalize_key("anime", "one piece", "-480p -720p")
+    assert normalize_key("anime", "x") != normalize_key("hentai", "x")
+
+
+def test_lru_eviction_and_persistence(tmp_path):
+    path = tmp_path / "results.json"
+    c = ResultCache(path, max_entries=2)
+    c.put("a", [{"title": "A", "date": datetime(2025, 1, 2, 3, 4)}])
+    c.put("b", [{"title": "B"}])
+    assert c.get("a")  # touch a, so b is least recently used
+    c.put("c", [{"title": "C"}])
+    assert c.get("b") is None
+
+    reloaded = ResultCache(path, max_entries=2)
+    items, age = reloaded.get("a")
+    assert items[0]["date"] == datetime(2025, 1, 2, 3, 4)
+    assert reloaded.get("c")[0][0]["title"] == "C"
+
+
+def test_save_keeps_entries_written_by_other_processes(tmp_path):
+    path = tmp_path / "results.json"
+    cli, server = ResultCache(path), ResultCache(path)
+    cli.put("a", [{"title": "A"}])
+    server.put("b", [{"title": "B"}])
+    cli.put("c", [{"title": "C"}])
+    # a newer copy of a shared key beats the one held in memory
+    server.put("a", [{"title": "A2"}])
+    cli.put("d", [{"title": "D"}])
+
+    reloaded = ResultCache(path)
+    assert [reloaded.get(k)[0][0]["title"] for k in "abcd"] == ["A2", "B", "C", "D"]
+    assert [p.name for p in tmp_path.iterdir()] == ["results.json"]
+
+
+def test_stale_hit_is_served_and_refreshed_in_background():
+    c = ResultCache(None, ttl=100, refresh_after=0)
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0)
+        return [{"title": f"v{len(calls)}"}]
+
+    async def run():
+        first, cached1 = await c.get_or_fetch("k", fetch)
+        second, cached2 = await c.get_or_fetch("k", fetch)
+        await c.drain()
+        third, _ = await c.get_or_fetch("k", fetch)
+        await c.drain()
+        return first, cached1, second, cached2, third
+
+    first, cached1, second, cached2, third = asyncio.run(run())
+    assert not cached1 and cached2
+    assert second == first  # served instantly from cache
+    assert third == [{"title": "v2"}]  # background refresh landed
@@ -49,3 +49,31 @@ def test_cli_search_dry_run(monkeypatch):
 
     # ensure uploader appears
     assert "subsplease" in normalized
+
+
+def test_cli_search_filters_locally(monkeypatch, tmp_path):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    runner = CliRunner()
+    calls = []
+
+    async def fake_fetch(urls, timeout=10, concurrency=8):
+        calls.append(urls)
+        return [{"url": "http://test", "raw": SIMPLE_RSS}]
+
+    monkeypatch.setattr(cli, "fetch_all_feeds", fake_fetch)
+
+    result = runner.invoke(cli.cli, ["search", "test", "--dry-run", "--refresh", "--filter", "-episode"])
+    assert result.exit_code == 0
+    assert "No results match the filters." in result.output
+
+    result = runner.invoke(cli.cli, ["search", "test", "--dry-run", "--refresh", "--max-size", "100M"])
+    assert "No results match the filters." in result.output
+    result = runner.invoke(cli.cli, ["search", "test", "--dry-run", "--refresh", "--lang", "eng", "--category", "sub"])
+    assert "Dry run - skipping downloads." in result.output
+
+    # junk sizes are rejected instead of quietly turning the filter off
+    for opt in ("--max-size", "--min-size"):
+        result = runner.invoke(cli.cli, ["search", "test", "--dry-run", opt, "big"])
+        assert result.exit_code == 2 and opt in result.output
+    result = runner.invoke(cli.cli, ["search", "test", "--dry-run", "--filter", "size:<junk"])
+    assert result.exit_code == 2 and "--filter" in result.output
@@ -0,0 +1,81 @@
+import os
+
+import pytest
+from click.testing import CliRunner
+
+from anidl import cli, config
+
+
+@pytest.fixture
+def home(monkeypatch, tmp_path):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("USERPROFILE", str(tmp_path))
+    config._cache.clear()
+    return tmp_path
+
+
+def test_defaults_merged_and_file_created(home):
+    cfg = config.load_config()
+    assert (home / ".anidl" / "config.toml").exists()
+    assert cfg["defaults"]["notify"] is True
+    assert cfg["sources"]["concurrency"] == 8
+
+
+def test_parsed_config_is_cached_until_mtime_changes(home, monkeypatch):
+    p = home / ".anidl" / "config.toml"
+    p.parent.mkdir()
+    p.write_text('[defaults]\ndownload_dir = "/a"\n')
+    calls = []
+    real = config._parse
+    monkeypatch.setattr(config, "_parse", lambda path: calls.append(path) or real(path))
+
+    assert config.load_config()["defaults"]["download_dir"] == "/a"
+    assert config.load_config()["defaults"]["download_dir"] == "/a"
+    assert len(calls) == 1
+
+    p.write_text('[defaults]\ndownload_dir = "/bb"\n')
+    os.utime(p, ns=(p.stat().st_atime_ns, p.stat().st_mtime_ns + 1_000_000))
+    assert config.load_config()["defaults"]["download_dir"] == "/bb"
+    assert len(calls) == 2
+
+
+def test_env_overrides(home, monkeypatch):
+    monkeypatch.setenv("ANIDL_SOURCES__CONCURRENCY", "3")
+    monkeypatch.setenv("ANIDL_SCHEDULER__ENABLED", "yes")
+    cfg = config.load_config()
+    assert cfg["sources"]["concurrency"] == 3
+    assert cfg["scheduler"]["enabled"] is True
+
+
+def test_invalid_config_is_reported(home):
+    p = home / ".anidl" / "config.toml"
+    p.parent.mkdir()
+    p.write_text("[sources]\nconcurrency = \"lots\"\n")
+    with pytest.raises(config.ConfigError, match="sources.concurrency"):
+        config.load_config()
+
+    p.write_text("[defaults\n")
+    res = CliRunner().invoke(cli.cli, ["config"])
+    assert res.exit_code != 0
+    assert "Invalid configuration" in res.output
+
+
+@pytest.mark.parametrize("section, key, value, message", [
+    ("sources", "concurrency", 0, "sources.concurrency: must be >= 1"),
+    ("sources", "timeout", -5, "sources.timeout: must be >= 1"),
+    ("daemon", "port", 70000, "daemon.port: must be between 1 and 65535"),
+    ("progress", "fps", 0, "progress.fps: must be >= 0.1"),
+    ("planner", "min_overlap", 1.5, "planner.min_overlap: must be between 0 and 1"),
+    ("logging", "max_bytes", -1, "logging.max_bytes: must be >= 0"),
+    ("admission", "strategy", "best-fit", "admission.strategy: must be one of first-fit, most-free"),
+])
+def test_out_of_range_values_are_rejected(home, section, key, value, message):
+    with pytest.raises(config.ConfigError, match=message):
+        config.validate({section: {key: value}})
+    config.validate({section: {key: config.SCHEMA[section][key][1]}})
+
+
+def test_out_of_range_env_override_names_the_variable(home, monkeypatch):
+    monkeypatch.setenv("ANIDL_POSTPROCESS__WORKERS", "0")
+    with pytest.raises(config.ConfigError, match="ANIDL_POSTPROCESS__WORKERS: must be >= 1"):
+        config.load_config()
@@ -0,0 +1,57 @@
+import json
+import socket
+import sys
+
+from anidl import daemon
+
+
+STUB = """#!{python}
+import socket, sys, time, json
+port = int([a for a in sys.argv if a.startswith("--rpc-listen-port=")][0].split("=", 1)[1])
+open({argv_file!r}, "w").write(json.dumps(sys.argv[1:]))
+s = socket.socket()
+s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+s.bind(("127.0.0.1", port))
+s.listen()
+time.sleep(30)
+"""
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_start_reattach_and_stop(monkeypatch, tmp_path):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("USERPROFILE", str(tmp_path))
+    argv_file = tmp_path / "argv.json"
+    stub = tmp_path / "aria2c"
+    stub.write_text(STUB.format(python=sys.executable, argv_file=str(argv_file)))
+    stub.chmod(0o755)
+    port = _free_port()
+
+    cfg = {"daemon": {"port": port, "aria2c": str(stub)}}
+    state = daemon.ensure_running(cfg)
+    try:
+        assert state and state["port"] == port and state["secret"]
+        args = json.loads(argv_file.read_text())
+        assert "--enable-rpc" in args
+        # the secret stays out of argv; aria2c reads it from an owner-only conf file
+        assert not any(state["secret"] in a for a in args)
+        conf = daemon.conf_path()
+        assert f"--conf-path={conf}" in args and conf.read_text() == f"rpc-secret={state['secret']}\n"
+        for p in (conf, tmp_path / ".anidl" / "aria2d.json"):
+            assert p.stat().st_mode & 0o777 == 0o600
+        session = daemon.session_path()
+        assert f"--save-session={session}" in args and f"--input-file={session}" in args
+        assert session.exists()
+
+        # a second call reattaches instead of spawning another aria2c
+        assert daemon.ensure_running(cfg)["pid"] == state["pid"]
+        assert daemon.client_kwargs()["secret"] == state["secret"]
+    finally:
+        assert daemon.stop()
+    assert daemon.load_state() is None
+    assert not daemon.is_running(state)
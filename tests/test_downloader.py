@@ -31,3 +31,58 @@ def test_resolve_magnet_no_aria2(monkeypatch):
     import anidl.downloader as dl
     monkeypatch.setattr(dl, "aria2p", None)
     assert dl.resolve_magnet("magnet:?xt=urn:btih:FAKE") is None
+
+
+def test_select_files_for_episode_range(monkeypatch, tmp_path):
+    import anidl.downloader as dl
+    from anidl.parser import match_episode_files
+    from anidl.utils import parse_selection
+
+    files = [{"path": f"Show S01/[Grp] Show - {n:02d} (1080p).mkv", "length": 1} for n in range(1, 13)]
+    files.insert(0, {"path": "Show S01/NCOP.mkv", "length": 1})
+    select = match_episode_files(files, parse_selection("5-8", 9999))
+    assert select == [6, 7, 8, 9]
+
+    added = {}
+
+    class FakeClient:
+        def add_torrent(self, b64, uris, opts):
+            added.update(opts)
+            return "GID1"
+
+    class FakeApi:
+        client = FakeClient()
+
+    torrent = tmp_path / "batch.torrent"
+    torrent.write_bytes(b"d4:infod4:name1:xee")
+    monkeypatch.setattr(dl, "_aria2_api", lambda: FakeApi())
+    assert dl.add_torrent_or_magnet(str(torrent), tmp_path, select_files=select) == "GID1"
+    assert added["select-file"] == "6,7,8,9"
+    assert added["bt-prioritize-piece"] == "head,tail"
+
+
+def test_download_with_progress_follows_metadata_download(monkeypatch, tmp_path):
+    import anidl.downloader as dl
+    from types import SimpleNamespace
+
+    def download(gid, status, followers=None):
+        return SimpleNamespace(gid=gid, name=f"dl-{gid}", status=status, followed_by_ids=followers, files=[],
+                               dir=str(tmp_path), total_length=10, completed_length=10, download_speed=0,
+                               info_hash=None)
+
+    downloads = {"meta": download("meta", "complete", ["real"]), "real": download("real", "complete"),
+                 "plain": download("plain", "error")}
+    # the batch was added with --select-file=2
+    downloads["real"].files = [SimpleNamespace(index=1, selected=False, path=tmp_path / "01.mkv"),
+                               SimpleNamespace(index=2, selected=True, path=tmp_path / "02.mkv")]
+
+    class FakeAPI:
+        def get_download(self, gid):
+            return downloads[gid]
+
+    monkeypatch.setattr(dl, "_aria2_api", lambda: FakeAPI())
+    events = []
+    dl.download_with_progress(["meta", "plain"], tmp_path, on_complete=events.append, fps=50)
+    # the metadata download finishing is not a completion; its follower reports under the original gid
+    assert sorted((e["gid"], e["name"]) for e in events) == [("meta", "dl-real"), ("plain", "dl-plain")]
+    assert [(e["files"], e["selected"]) for e in events if e["gid"] == "meta"] == [([str(tmp_path / "02.mkv")], [2])]
@@ -0,0 +1,64 @@
+import asyncio
+
+from anidl import feedplan
+from anidl.sources import get_feeds
+
+
+def _rss(links):
+    items = "".join(f"<item><title>{l}</title><link>magnet:?xt=urn:btih:{l}</link></item>" for l in links)
+    return f'<?xml version="1.0"?><rss version="2.0"><channel><title>t</title>{items}</channel></rss>'
+
+
+class FakeTracker:
+    """Serves the three anime feeds; the broad one lists `broad` items."""
+
+    def __init__(self):
+        self.calls = []
+        self.broad = []
+        self.narrow = {"subsplease": ["s1", "s2"], "erai-raws": ["e1"]}
+
+    async def fetch(self, urls, timeout=10, concurrency=8):
+        self.calls.append(urls)
+        out = []
+        for u in urls:
+            src = feedplan.split_feed(u)[1]
+            out.append({"url": u, "status": 200, "raw": _rss(self.narrow[src] if src else self.broad)})
+        return out
+
+
+def test_planner_learns_overlap_and_skips_covered_feeds(tmp_path):
+    feeds = get_feeds("anime", "show")
+    broad_url = feeds[-1]
+    assert feedplan.split_feed(feeds[0]) == (feedplan.split_feed(broad_url)[0], "subsplease")
+    planner = feedplan.FeedPlanner(feedplan.FeedStats(tmp_path / "feedplan.json"), min_samples=2, recheck_every=0)
+    tracker = FakeTracker()
+
+    def search(key="show"):
+        tracker.calls.clear()
+        raw = asyncio.run(planner.fetch(feeds, tracker.fetch, key))
+        return [r["url"] for r in raw]
+
+    # cold start: everything in one round; a full page teaches the page size
+    tracker.broad = [f"x{i}" for i in range(10)]
+    assert search() == feeds and len(tracker.calls) == 1
+    # the broad feed holds every uploader item; twice is enough to trust it
+    tracker.broad = ["s1", "s2", "e1", "x1"]
+    search()
+    search()
+    assert search() == [broad_url] and tracker.calls == [[broad_url]]
+
+    # a full broad page may hide uploader items: fetch them in a second round
+    tracker.broad = [f"y{i}" for i in range(10)]
+    assert search() == feeds and tracker.calls == [[broad_url], feeds[:2]]
+
+    # a query where the broad feed missed uploader items keeps fetching them
+    tracker.broad = ["x1"]
+    planner.stats.observe_overlap("other", "subsplease", 2, 0)
+    search("other")
+    assert sorted(tracker.calls[0]) == sorted([feeds[0], broad_url])
+
+    stats = feedplan.FeedStats(tmp_path / "feedplan.json")
+    assert stats.pages == {"www.tokyotosho.info": 10}
+    assert stats.metrics["searches"] == 6 and stats.metrics["planned"] == 18
+    assert stats.metrics["skipped"] == 3 and stats.metrics["fetched"] == 15
+    assert stats.sources["subsplease"]["samples"] >= 2
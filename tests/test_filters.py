@@ -0,0 +1,51 @@
+import pytest
+
+from anidl.filters import TitleIndex, combine, parse_query
+
+ITEMS = [
+    {"title": "[SubsPlease] Show - 05 (1080p) [ABCD].mkv", "size": "1.4 GB", "uploader": "SubsPlease"},
+    {"title": "[Erai-raws] Show - 05 [720p][Multiple Subtitle] MULTI", "size": "700 MB", "uploader": "Erai-raws"},
+    {"title": "[Group] Show - 01-12 (1080p HEVC) [Batch]", "size": "9 GB", "uploader": "group"},
+    {"title": "[Ohys-Raws] Show - 05 RAW (1280x720)", "size_bytes": 500 * 1024 ** 2, "uploader": "ohys"},
+    {"title": "[Fansub] Show - 05 VOSTFR 1080p", "size": "", "uploader": "fansub"},
+]
+
+
+def titles(items):
+    return [ITEMS.index(i) for i in items]
+
+
+def test_filter_criteria():
+    idx = TitleIndex(ITEMS)
+    assert titles(idx.filter(include=["1080p"], exclude=["hevc"])) == [0, 4]
+    assert titles(idx.filter(regex=r"-\s*0?1-12")) == [2]
+    # unknown sizes pass; 1.4 GB and 9 GB are out
+    assert titles(idx.filter(max_size=1024 ** 3)) == [1, 3, 4]
+    assert titles(idx.filter(uploaders=["subsplease", "OHYS"])) == [0, 3]
+    assert titles(idx.filter(exclude_uploaders=["group"], category="sub")) == [0, 1, 4]
+    assert titles(idx.filter(category="raw")) == [3]
+    assert titles(idx.filter(category="batch")) == [2]
+    # untagged releases count as English; multi-sub releases match any language
+    assert titles(idx.filter(langs=["fr"])) == [1, 4]
+    assert titles(idx.filter(langs=["English"])) == [0, 1, 2, 3]
+    with pytest.raises(ValueError):
+        idx.filter(category="movies")
+
+
+def test_parse_query_rejects_bad_sizes():
+    for text in ("size:", "size:<", "size:>", "size:<junk", "size:big"):
+        with pytest.raises(ValueError):
+            parse_query(text)
+    assert parse_query("size:>0")["min_size"] == 0
+
+
+def test_parse_query_round_trip():
+    spec = parse_query('1080p -hevc size:<2G size:>100M by:SubsPlease -by:group lang:eng cat:sub re:"Show - 0[0-9] "')
+    assert spec["include"] == ["1080p"] and spec["exclude"] == ["hevc"]
+    assert spec["max_size"] == 2 * 1024 ** 3 and spec["min_size"] == 100 * 1024 ** 2
+    assert spec["uploaders"] == ["SubsPlease"] and spec["exclude_uploaders"] == ["group"]
+    assert titles(TitleIndex(ITEMS).filter(**spec)) == [0]
+
+    narrowed = combine(parse_query("show"), parse_query("-vostfr cat:sub"))
+    assert narrowed["include"] == ["show"] and narrowed["exclude"] == ["vostfr"]
+    assert titles(TitleIndex(ITEMS).filter(**narrowed)) == [0, 1, 2]
@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+from anidl import helper, server, sources
+from anidl.config import defaults
+
+RSS = """<?xml version="1.0" encoding="UTF-8" ?>
+<rss version="2.0"><channel><title>t</title>
+<item><title>Test Anime - Episode 01</title><description>Size: 200 MB - Seeders: 20</description>
+<author>subsplease</author><link>magnet:?xt=urn:btih:FAKE</link>
+<pubDate>Wed, 17 Sep 2025 12:00:00 +0000</pubDate></item>
+</channel></rss>"""
+
+pytestmark = pytest.mark.skipif(not helper.supported(), reason="needs Unix domain sockets")
+
+
+def test_helper_serves_over_socket_then_idles_out(monkeypatch, tmp_path):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    calls = []
+
+    async def fake_fetch(urls, timeout=10, concurrency=8):
+        calls.append(urls)
+        return [{"url": u, "raw": RSS} for u in urls[:1]]
+
+    monkeypatch.setattr(sources, "fetch_all_feeds", fake_fetch)
+    monkeypatch.setattr("anidl.queue.list_downloads", lambda api=None: [{"gid": "g1", "status": "active"}])
+    monkeypatch.setattr(server.ServerState, "api", lambda self: None)
+    sock = tmp_path / "helper.sock"
+    cfg = defaults()
+
+    async def run():
+        # nothing listening: callers fall back to in-process work
+        assert await helper.search(cfg, "anime", "test", "", path=sock) is None
+
+        state = server.ServerState(cfg=cfg, persist=False)
+        task = asyncio.create_task(helper.run(cfg, path=sock, idle_timeout=0.5, state=state, warm=False))
+        for _ in range(50):
+            if helper.is_running(sock):
+                break
+            await asyncio.sleep(0.02)
+        first = await helper.search(cfg, "anime", "test", "", meta=False, path=sock)
+        second = await helper.search(cfg, "anime", "test", "", meta=False, path=sock)
+        listing = await helper.request("GET", "/queue", path=sock)
+        # sessions and caches live in the helper: one fetch for both searches
+        assert first == second and first[0]["uploader"] == "subsplease"
+        assert len(calls) == 1
+        assert state.keepalive == 0.5
+        assert listing["downloads"][0]["gid"] == "g1"
+
+        await asyncio.wait_for(task, timeout=5)
+        assert not sock.exists()
+
+    asyncio.run(run())
+
+
+def test_env_overrides_bypass_the_helper(monkeypatch):
+    from anidl import cli
+
+    cfg = defaults()
+    assert cli._use_helper(cfg)
+    # the helper would answer with its own config, not this command's overrides
+    monkeypatch.setenv("ANIDL_SOURCES__TIMEOUT", "5")
+    assert not cli._use_helper(cfg)
@@ -0,0 +1,96 @@
+import json
+
+from anidl import journal as journal_mod
+from anidl.journal import Journal
+
+
+def test_updates_are_coalesced_into_one_atomic_write(tmp_path):
+    path = tmp_path / "state.json"
+    j = Journal(path, debounce=60)
+    j.record_add("g1", {"title": "Show - 01", "infohash": "ab"}, "magnet:?x", tmp_path)
+    for n in range(100):
+        j.update_progress("g1", n, 100, "active")
+    assert not path.exists()  # still inside the debounce window
+    j.close()
+    assert j.writes == 1
+    data = json.loads(path.read_text())
+    assert data["entries"]["g1"]["progress"] == [99, 100]
+    assert not (tmp_path / "state.tmp").exists()
+
+    reloaded = Journal(path)
+    assert [e["gid"] for e in reloaded.pending()] == ["g1"]
+
+
+class FakeDownload:
+    def __init__(self, gid, status="active"):
+        self.gid = gid
+        self.status = status
+        self.completed_length = 5
+        self.total_length = 10
+
+
+class FakeClient:
+    def __init__(self):
+        self.added = []
+
+    def add_torrent(self, b64, uris, opts):
+        self.added.append(opts)
+        return opts["gid"]
+
+
+class FakeApi:
+    def __init__(self, known, paused=()):
+        self.known = known
+        self.paused = set(paused)
+        self.client = FakeClient()
+
+    def get_download(self, gid):
+        if gid not in self.known:
+            raise KeyError(gid)
+        return FakeDownload(gid, "paused" if gid in self.paused else "active")
+
+
+def test_reattach_replays_without_re_resolving(monkeypatch, tmp_path):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    cached = tmp_path / ".anidl" / "torrents"
+    cached.mkdir(parents=True)
+    (cached / "cafe.torrent").write_bytes(b"d4:infod4:name1:xee")
+
+    j = Journal(tmp_path / "state.json")
+    j.record_add("live", {"title": "A"}, "magnet:a", tmp_path)
+    j.record_add("lost", {"title": "B", "infohash": "cafe"}, "magnet:b", tmp_path, {"select-file": "2"})
+    j.record_add("gone", {"title": "C"}, "magnet:c", tmp_path)
+    j.record_add("held", {"title": "D"}, "magnet:d", tmp_path)
+    j.record_complete("done", {"gid": "done", "status": "complete", "files": ["/x.mkv"]}, post_pending=True)
+
+    # a paused download would never finish, so it isn't waited on (but stays pending)
+    api = FakeApi(known={"live", "held"}, paused={"held"})
+    live = {e["gid"] for e in journal_mod.reattach(j, api)}
+    assert live == {"live", "lost", "done"}
+    assert j.entries["held"]["status"] == "paused" and "held" in {e["gid"] for e in j.pending()}
+    assert api.client.added == [{"select-file": "2", "gid": "lost", "dir": str(tmp_path)}]
+    assert j.entries["live"]["progress"] == [5, 10]
+    assert j.entries["gone"]["status"] == "removed"
+    j.close()
+
+
+def test_concurrent_journals_merge_instead_of_overwriting(tmp_path):
+    path = tmp_path / "state.json"
+    search, queue = Journal(path, debounce=60), Journal(path, debounce=60)
+    search.record_add("g1", {"title": "A"}, "magnet:a", tmp_path)
+    search.record_add("g2", {"title": "B"}, "magnet:b", tmp_path)
+    search.flush()
+    queue.record_add("g3", {"title": "C"}, "magnet:c", tmp_path)
+    queue.flush()
+    # `queue remove` forgets g1 from a journal loaded before g2's progress moved on
+    remover = Journal(path, debounce=60)
+    search.update_progress("g2", 5, 10, "active")
+    search.flush()
+    remover.forget("g1")
+    remover.close()
+    search.close()
+    queue.close()
+
+    entries = Journal(path).entries
+    assert sorted(entries) == ["g2", "g3"]
+    assert entries["g2"]["progress"] == [5, 10]
@@ -0,0 +1,64 @@
+import gzip
+import json
+import logging
+import logging.handlers
+
+from anidl import logs
+
+
+def test_queued_json_rotation_and_sampling(tmp_path):
+    logs.shutdown()
+    path = tmp_path / "anidl.log"
+    cfg = {"logging": {"json": True, "max_bytes": 4000, "backups": 5, "sample_interval": 60}}
+    root = logging.getLogger()
+    level = root.level
+    try:
+        listener = logs.setup(verbose=True, cfg=cfg, path=path)
+        assert logs.setup(verbose=True, cfg=cfg, path=path) is listener
+        # the root logger only enqueues; the file handler lives on the listener thread
+        assert any(isinstance(h, logging.handlers.QueueHandler) for h in root.handlers)
+        assert isinstance(listener.handlers[0], logging.handlers.RotatingFileHandler)
+
+        log = logging.getLogger("anidl.test")
+        for i in range(50):
+            log.debug("progress", extra={"stage": "download", "gid": "g1", "completed": i, "sample": "progress:g1"})
+        log.info("added", extra={"stage": "add", "gid": "g1"})
+        for i in range(40):
+            log.info("line %d %s", i, "x" * 40)
+    finally:
+        logs.shutdown()
+        root.setLevel(level)
+
+    rolled = sorted(tmp_path.glob("anidl.log.*.gz"))
+    assert rolled and rolled[0].name == "anidl.log.1.gz"
+    assert not list(tmp_path.glob("anidl.log.?"))
+    lines = []
+    for p in rolled[::-1]:
+        lines += gzip.decompress(p.read_bytes()).decode().splitlines()
+    lines += path.read_text().splitlines()
+    records = [json.loads(l) for l in lines]
+
+    # 50 progress events within the sampling interval collapse into one
+    progress = [r for r in records if r["msg"] == "progress"]
+    assert len(progress) == 1 and progress[0]["gid"] == "g1" and progress[0]["stage"] == "download"
+    assert "sample" not in progress[0]
+    assert [r for r in records if r["msg"] == "added"][0]["stage"] == "add"
+    assert [r["msg"] for r in records[-40:]] == [f"line {i} " + "x" * 40 for i in range(40)]
+
+
+def test_sampling_filter_counts_drops():
+    f = logs.SamplingFilter(interval=60)
+
+    def rec(level=logging.DEBUG, **extra):
+        r = logging.LogRecord("x", level, "", 0, "m", (), None)
+        r.__dict__.update(extra)
+        return r
+
+    assert f.filter(rec(sample="p"))
+    assert not f.filter(rec(sample="p"))
+    assert f.filter(rec(sample="q"))
+    assert f.filter(rec(level=logging.WARNING, sample="p"))
+    assert f.filter(rec())
+    f._last["p"] = float("-inf")
+    again = rec(sample="p")
+    assert f.filter(again) and again.sampled_out == 1
@@ -0,0 +1,71 @@
+import hashlib
+import sys
+
+import pytest
+
+from anidl import postprocess, torrents
+
+
+def _single_file_torrent(name, data, piece_len=16):
+    pieces = b"".join(hashlib.sha1(data[i:i + piece_len]).digest() for i in range(0, len(data), piece_len))
+    info = {"name": name, "length": len(data), "piece length": piece_len, "pieces": pieces}
+    return torrents.bencode({"info": info})
+
+
+def test_verify_torrent(tmp_path):
+    data = b"episode-bytes-" * 10
+    (tmp_path / "ep.mkv").write_bytes(data)
+    t = _single_file_torrent("ep.mkv", data)
+    assert postprocess.verify_torrent(t, tmp_path)
+    (tmp_path / "ep.mkv").write_bytes(data[:-1] + b"X")
+    assert not postprocess.verify_torrent(t, tmp_path)
+
+
+def test_verify_torrent_checks_only_episodes_that_were_selected(tmp_path):
+    # a batch downloaded with --episodes 1,3: the middle episode is not on disk
+    eps = [b"a" * 40, b"b" * 25, b"c" * 37]
+    data = b"".join(eps)
+    pieces = b"".join(hashlib.sha1(data[i:i + 16]).digest() for i in range(0, len(data), 16))
+    files = [{"length": len(e), "path": [f"Show - {n:02d}.mkv"]} for n, e in enumerate(eps, 1)]
+    t = torrents.bencode({"info": {"name": "Show", "piece length": 16, "pieces": pieces, "files": files}})
+    (tmp_path / "Show").mkdir()
+    for n in (1, 3):
+        (tmp_path / "Show" / f"Show - {n:02d}.mkv").write_bytes(eps[n - 1])
+
+    assert postprocess.verify_torrent(t, tmp_path, selected=[1, 3])
+    (tmp_path / "Show" / "Show - 03.mkv").write_bytes(b"c" * 36 + b"X")
+    assert not postprocess.verify_torrent(t, tmp_path, selected=[1, 3])
+    with pytest.raises(FileNotFoundError):
+        postprocess.verify_torrent(t, tmp_path)
+
+
+def test_copy_fast_copies_contents(tmp_path):
+    src = tmp_path / "a.bin"
+    src.write_bytes(b"x" * 100000 + b"end")
+    dst = tmp_path / "b.bin"
+    postprocess._copy_fast(src, dst)
+    assert dst.read_bytes() == src.read_bytes()
+
+
+def test_pipeline_moves_renames_and_runs_hook(tmp_path):
+    downloads = tmp_path / "dl"
+    downloads.mkdir()
+    f = downloads / "[SubsPlease] Some Show - 05 (1080p) [ABCD].mkv"
+    f.write_bytes(b"video")
+    marker = tmp_path / "hook.txt"
+    cfg = {
+        "steps": ["move", "rename", "hook"],
+        "library_dir": str(tmp_path / "library"),
+        "rename_template": "{series} - {episode:02d}{ext}",
+        "hook": f"{sys.executable} -c \"import sys; open(sys.argv[2], 'w').write(sys.argv[1])\" {{path}} {marker}",
+    }
+    done = []
+    pipeline = postprocess.Pipeline(cfg, on_done=done.append)
+    ctx = pipeline.submit({"gid": "g1", "name": f.name, "dir": str(downloads), "files": [str(f)]}).result()
+    pipeline.shutdown()
+
+    expected = tmp_path / "library" / "Some Show" / "Some Show - 05.mkv"
+    assert "error" not in ctx and ctx["done"] == ["move", "rename", "hook"]
+    assert expected.read_bytes() == b"video" and not f.exists()
+    assert marker.read_text() == str(expected)
+    assert done and done[0]["gid"] == "g1"
@@ -0,0 +1,52 @@
+import io
+import time
+
+from rich.console import Console
+
+from anidl import progress
+
+M = 1024 * 1024
+
+
+def test_snapshot_aggregates_and_folds_finished():
+    snap = progress.Snapshot()
+    for i in range(600):
+        snap.update(f"g{i}", f"Show - {i:03d}", 100 * M, 50 * M, speed=M)
+    snap.update("g0", "Show - 000", 100 * M, 100 * M, status="complete")
+    snap.update("g1", "Show - 001", 100 * M, 10 * M, status="error")
+    # late polls of a finished gid don't resurrect it or count twice
+    snap.update("g0", "Show - 000", 100 * M, 100 * M, status="complete")
+
+    v = snap.view(max_rows=5)
+    assert v["active"] == 598 and len(v["rows"]) == 5
+    assert v["speed"] == 598 * M and v["remaining"] == 598 * 50 * M
+    assert v["eta"] == 50
+    assert (v["done"], v["failed"], v["done_bytes"]) == (1, 1, 100 * M)
+
+    # one download of unknown size makes the overall ETA unknown
+    snap.update("g2", "Show - 002", None, 0, speed=M)
+    assert snap.view()["eta"] is None
+
+
+def test_renderer_draws_a_bounded_frame_off_thread():
+    snap = progress.Snapshot()
+    out = io.StringIO()
+    console = Console(file=out, width=120, force_terminal=True)
+    with progress.Renderer(snap, fps=50, max_rows=3, console=console) as r:
+        for i in range(500):
+            snap.update(f"g{i}", f"Show - {i:03d}", 10 * M, 5 * M, speed=2 * M)
+        snap.update("g7", "Show - 007", 10 * M, 10 * M, status="complete")
+        deadline = time.monotonic() + 2
+        while r.frames == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        drawn = r.frames
+        time.sleep(0.1)
+        # nothing changed, nothing redrawn
+        assert r.frames == drawn >= 1
+
+    text = out.getvalue()
+    assert "Show - 000" in text and "Show - 499" not in text
+    assert "and 496 more active" in text
+    assert "499 active, 998.0 MB/s" in text
+    assert "Finished 1 (10 MB)" in text
+    assert progress.format_eta(3725) == "1:02:05" and progress.format_rate(512 * 1024) == "512 KB/s"
@@ -0,0 +1,102 @@
+import asyncio
+import socket
+
+from aiohttp.test_utils import TestServer
+
+from anidl import async_downloader, async_queue, router
+
+
+def _dead_url():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{s.getsockname()[1]}/jsonrpc"
+
+
+def _config(urls, **nodes):
+    eps = [{"name": name, "url": url, "secret": "s3cret"} for name, url in urls]
+    return {"nodes": dict({"endpoints": eps, "placement": "least-loaded", "min_free": 0}, **nodes)}
+
+
+def test_least_loaded_placement_and_aggregation(monkeypatch, tmp_path, fake_aria2):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    fakes = [fake_aria2() for _ in range(3)]
+
+    async def run():
+        servers = [TestServer(f.app()) for f in fakes]
+        for s in servers:
+            await s.start_server()
+        try:
+            urls = [(n, str(s.make_url("/jsonrpc"))) for n, s in zip("abc", servers)] + [("down", _dead_url())]
+            cfg = _config(urls)
+            # node "a" can see its disk and is too full for the configured minimum
+            cfg["nodes"]["endpoints"][0]["download_dir"] = str(tmp_path)
+            cfg["nodes"]["min_free"] = "1000000T"
+            r = router.from_config(cfg)
+            try:
+                gids = [await async_downloader.add_torrent_or_magnet(r, f"http://x/{i}.torrent", tmp_path)
+                        for i in range(4)]
+                assert not r.nodes["down"].up
+                # "a" is skipped for space, "down" is unreachable; b and c share the load
+                assert sorted(g.split(":")[0] for g in gids) == ["b", "b", "c", "c"]
+
+                listing = await async_queue.list_downloads(r)
+                assert sorted(d["gid"] for d in listing) == sorted(gids)
+                assert {d["node"] for d in listing} == {"b", "c"}
+
+                assert await async_queue.pause(r, gids[0]) is True
+                node, gid = router.split_gid(gids[0])
+                assert fakes["abc".index(node)].downloads[gid]["status"] == "paused"
+                # a bare gid is tried on every node
+                assert await async_queue.remove(r, router.split_gid(gids[1])[1]) is True
+                assert await async_queue.remove(r, "c:nope") is False
+
+                events = []
+                await async_downloader.download_with_progress(r, gids[2:], tmp_path, on_complete=events.append,
+                                                              interval=0)
+                assert sorted(e["gid"] for e in events) == sorted(gids[2:])
+            finally:
+                await r.close()
+        finally:
+            for s in servers:
+                await s.close()
+
+    asyncio.run(run())
+
+
+def test_concurrent_adds_spread_over_nodes(monkeypatch, tmp_path, fake_aria2):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    fakes = [fake_aria2() for _ in range(2)]
+
+    async def run():
+        servers = [TestServer(f.app()) for f in fakes]
+        for s in servers:
+            await s.start_server()
+        try:
+            r = router.from_config(_config([(n, str(s.make_url("/jsonrpc"))) for n, s in zip("ab", servers)]))
+            try:
+                # like `search`, which adds its selections with asyncio.gather
+                gids = await asyncio.gather(*(r.add_uri([f"http://x/{i}.torrent"], {"dir": str(tmp_path)}) for i in range(4)))
+                assert sorted(g.split(":")[0] for g in gids) == ["a", "a", "b", "b"]
+                # a refresh counts the landed adds in the node stats instead of on top of them
+                await r.refresh()
+                assert [(n.pending, n.load()) for n in r.nodes.values()] == [(0, 2), (0, 2)]
+            finally:
+                await r.close()
+        finally:
+            for s in servers:
+                await s.close()
+
+    asyncio.run(run())
+
+
+def test_consistent_hash_placement_is_stable():
+    nodes = [router.Node(n, router.Aria2RPC(f"http://{n}.example:6800/jsonrpc")) for n in ("a", "b", "c")]
+    r = router.Router(nodes, placement="hash")
+    keys = [f"{i:040x}" for i in range(300)]
+    first = {k: r.place(k).name for k in keys}
+    assert set(first.values()) == {"a", "b", "c"}
+
+    # losing a node only moves the keys that lived on it
+    r.nodes["b"].up = False
+    moved = [k for k in keys if r.place(k).name != first[k]]
+    assert moved and all(first[k] == "b" for k in moved)
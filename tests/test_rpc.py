@@ -0,0 +1,53 @@
+import asyncio
+
+from aiohttp.test_utils import TestServer
+
+from anidl import async_downloader, async_queue
+from anidl.rpc import Aria2RPC, Aria2RPCError
+
+
+def test_add_monitor_and_queue(monkeypatch, tmp_path, fake_aria2):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("USERPROFILE", str(tmp_path))
+    fake = fake_aria2()
+
+    async def run():
+        async with TestServer(fake.app()) as srv:
+            url = str(srv.make_url("/jsonrpc"))
+            async with Aria2RPC(url, "wrong") as bad:
+                try:
+                    await bad.get_version()
+                    raise AssertionError("token not checked")
+                except Aria2RPCError as e:
+                    assert "Unauthorized" in str(e)
+
+            async with Aria2RPC(url, fake.secret) as rpc:
+                gids = await asyncio.gather(
+                    async_downloader.add_torrent_or_magnet(rpc, "magnet:?xt=urn:btih:" + "a" * 40, tmp_path),
+                    async_downloader.add_torrent_or_magnet(rpc, "http://x/b.torrent", tmp_path, select_files=[2]),
+                )
+                assert gids == ["g1", "g2"]
+                assert fake.downloads["g2"]["options"]["select-file"] == "2"
+
+                events, progress = [], []
+
+                class J:
+                    def update_progress(self, gid, completed, total, status=None):
+                        progress.append((gid, completed, status))
+
+                before = fake.requests
+                await async_downloader.download_with_progress(rpc, gids, tmp_path, on_complete=events.append,
+                                                              journal=J(), interval=0)
+                # g1 was the magnet's metadata download; its follower g3 completes under g1's name
+                assert sorted(e["gid"] for e in events) == ["g1", "g2"]
+                assert [e["files"] for e in events if e["gid"] == "g1"] == [[f"{tmp_path}/g3.mkv"]]
+                assert ("g1", 100, "complete") in progress
+                # one multicall per poll, however many gids are watched
+                assert fake.requests - before <= 4
+
+                listing = await async_queue.list_downloads(rpc)
+                assert {d["gid"] for d in listing} == {"g1", "g2", "g3"}
+                assert await async_queue.pause(rpc, "g3") is True
+                assert await async_queue.remove(rpc, "nope") is False
+
+    asyncio.run(run())
@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+
+from anidl import scheduler
+
+
+class FakeClient:
+    def __init__(self, waiting, stat=None):
+        self.waiting = list(waiting)
+        self.stat = stat or {"downloadSpeed": "0", "numActive": "0"}
+        self.global_options = {}
+        self.calls = []
+
+    def get_global_stat(self):
+        return self.stat
+
+    def change_global_option(self, opts):
+        self.calls.append(("changeGlobalOption", dict(opts)))
+        self.global_options.update(opts)
+
+    def tell_waiting(self, offset, num, keys=None):
+        return [{"gid": g} for g in self.waiting[offset:offset + num]]
+
+    def change_position(self, gid, pos, how):
+        assert how == "POS_SET"
+        self.waiting.remove(gid)
+        self.waiting.insert(pos, gid)
+        return pos
+
+
+WINDOWS = [
+    {"start": "08:00", "end": "23:00", "max_download_limit": "1M", "max_concurrent": 2},
+    {"start": "23:00", "end": "08:00", "max_download_limit": "0", "max_concurrent": 6},
+]
+
+
+def test_active_window_wraps_midnight():
+    assert scheduler.active_window(WINDOWS, datetime(2025, 1, 1, 12, 0))["max_concurrent"] == 2
+    assert scheduler.active_window(WINDOWS, datetime(2025, 1, 1, 2, 30))["max_concurrent"] == 6
+    assert scheduler.active_window([], datetime(2025, 1, 1, 2, 30)) == {}
+
+
+def test_apply_sets_window_limits_once():
+    client = FakeClient([])
+    s = scheduler.Scheduler(client, windows=WINDOWS)
+    now = datetime(2025, 1, 1, 12, 0)
+    s.apply(now)
+    s.apply(now)
+    assert client.global_options == {"max-overall-download-limit": str(1024 * 1024), "max-concurrent-downloads": "2"}
+    assert len(client.calls) == 1
+
+
+def test_throttles_concurrency_when_downloads_starve():
+    client = FakeClient([], stat={"downloadSpeed": str(20 * 1024), "numActive": "6"})
+    s = scheduler.Scheduler(client, windows=WINDOWS, min_speed=50 * 1024)
+    night = datetime(2025, 1, 1, 2, 0)
+    s.observe()
+    s.apply(night)
+    assert client.global_options["max-concurrent-downloads"] == "5"
+
+
+def test_reorder_puts_new_episodes_first():
+    client = FakeClient(["old1", "new1", "old2", "new2"])
+    s = scheduler.Scheduler(client)
+    now = datetime.utcnow()
+    for gid in ("old1", "old2"):
+        s.set_priority(gid, scheduler.priority_for({"date": now - timedelta(days=90)}, now))
+    for gid in ("new1", "new2"):
+        s.set_priority(gid, scheduler.priority_for({"date": now - timedelta(hours=3)}, now))
+    s.reorder()
+    assert client.waiting == ["new1", "new2", "old1", "old2"]
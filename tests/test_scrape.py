@@ -0,0 +1,109 @@
+import asyncio
+import struct
+from datetime import datetime
+
+from anidl import scrape
+from anidl.torrents import TorrentCache
+
+DEAD = "aa" * 20
+ALIVE = "bb" * 20
+HEALTHY = "cc" * 20
+
+
+class FakeTracker(asyncio.DatagramProtocol):
+    """Minimal BEP 15 tracker: answers connect and scrape with fixed counts."""
+
+    def __init__(self, counts):
+        self.counts = counts
+        self.scrapes = []
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        conn, action, tid = struct.unpack(">QII", data[:16])
+        if action == scrape.ACTION_CONNECT:
+            self.transport.sendto(struct.pack(">IIQ", 0, tid, 1234), addr)
+            return
+        assert conn == 1234
+        hashes = [data[i:i + 20].hex() for i in range(16, len(data), 20)]
+        self.scrapes.append(hashes)
+        body = b"".join(struct.pack(">III", *self.counts.get(h, (0, 0, 0))) for h in hashes)
+        self.transport.sendto(struct.pack(">II", scrape.ACTION_SCRAPE, tid) + body, addr)
+
+
+def test_refresh_health_scrapes_once_and_ranks_dead_last(tmp_path, monkeypatch):
+    monkeypatch.setattr(scrape, "TorrentCache", lambda: TorrentCache(tmp_path / "torrents"))
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        tracker = FakeTracker({ALIVE: (42, 100, 7)})
+        transport, _ = await loop.create_datagram_endpoint(lambda: tracker, local_addr=("127.0.0.1", 0))
+        port = transport.get_extra_info("sockname")[1]
+        try:
+            items = [
+                {"title": "dead", "infohash": DEAD, "seeders": 5, "date": datetime.utcnow(), "uploader": "x",
+                 "torrent_url": f"magnet:?xt=urn:btih:{DEAD}&tr=udp%3A%2F%2F127.0.0.1%3A{port}%2Fannounce"},
+                {"title": "alive", "infohash": ALIVE, "seeders": 0, "date": datetime.utcnow(), "uploader": "x"},
+                {"title": "no hash", "seeders": 3},
+            ]
+            cfg = {"scrape": {"trackers": [f"udp://127.0.0.1:{port}/announce"], "timeout": 1.0}}
+            cache = scrape.ScrapeCache(tmp_path / "scrape.json", ttl=600)
+            assert await scrape.refresh_health(items, cfg, cache) == 2
+            # both hashes went to the tracker in a single batched scrape
+            assert [sorted(s) for s in tracker.scrapes] == [sorted([DEAD, ALIVE])]
+            assert [i["title"] for i in items] == ["alive", "no hash", "dead"]
+            assert items[0]["seeders"] == 42 and items[0]["leechers"] == 7
+            assert items[0]["health"] > 7
+
+            # served from the persisted TTL cache without asking the tracker again
+            again = [{"title": "alive", "infohash": ALIVE, "seeders": 0}]
+            await scrape.refresh_health(again, cfg, scrape.ScrapeCache(tmp_path / "scrape.json", ttl=600))
+            assert again[0]["seeders"] == 42
+            assert len(tracker.scrapes) == 1
+        finally:
+            transport.close()
+
+    asyncio.run(run())
+
+
+def test_default_tracker_zero_does_not_bury_a_healthy_torrent(tmp_path, monkeypatch):
+    monkeypatch.setattr(scrape, "TorrentCache", lambda: TorrentCache(tmp_path / "torrents"))
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        # the default tracker has never seen HEALTHY and answers 0/0 for it
+        tracker = FakeTracker({})
+        transport, _ = await loop.create_datagram_endpoint(lambda: tracker, local_addr=("127.0.0.1", 0))
+        port = transport.get_extra_info("sockname")[1]
+        try:
+            items = [
+                {"title": "healthy", "infohash": HEALTHY, "seeders": 50, "date": datetime.utcnow(), "uploader": "x"},
+                {"title": "newer", "seeders": 3},
+            ]
+            cfg = {"scrape": {"trackers": [f"udp://127.0.0.1:{port}/announce"], "timeout": 1.0}}
+            cache = scrape.ScrapeCache(tmp_path / "scrape.json", ttl=600)
+            assert await scrape.refresh_health(items, cfg, cache) == 0
+            assert [i["title"] for i in items] == ["healthy", "newer"]
+            assert items[0]["seeders"] == 50 and "scraped" not in items[0]
+            # the miss is cached too, so the next search doesn't ask again
+            await scrape.refresh_health(items, cfg, cache)
+            assert len(tracker.scrapes) == 1
+        finally:
+            transport.close()
+
+    asyncio.run(run())
+
+
+def test_unreachable_tracker_times_out_quietly():
+    async def run():
+        # nothing listens on the discard port; the per-tracker timeout bounds the wait
+        return await scrape.scrape_many({ALIVE: ["udp://127.0.0.1:9/announce", "ftp://x/announce"]}, timeout=0.2)
+
+    assert asyncio.run(run()) == {}
+
+
+def test_scrape_url():
+    assert scrape.scrape_url("http://t.example/announce") == "http://t.example/scrape"
+    assert scrape.scrape_url("http://t.example/x/announce.php?k=1") == "http://t.example/x/scrape.php?k=1"
+    assert scrape.scrape_url("http://t.example/a") is None
@@ -0,0 +1,121 @@
+import asyncio
+from pathlib import Path
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from anidl import server, sources
+from anidl.config import defaults
+
+
+RSS = """<?xml version="1.0" encoding="UTF-8" ?>
+<rss version="2.0"><channel><title>t</title>
+<item><title>Test Anime - Episode 01</title><description>Size: 200 MB - Seeders: 20</description>
+<author>subsplease</author><link>magnet:?xt=urn:btih:FAKE</link>
+<pubDate>Wed, 17 Sep 2025 12:00:00 +0000</pubDate></item>
+</channel></rss>"""
+
+
+def _run(coro_fn, monkeypatch, tmp_path):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("USERPROFILE", str(tmp_path))
+
+    async def run():
+        state = server.ServerState(cfg=defaults(), poll_interval=0.01, persist=False)
+        async with TestClient(TestServer(server.create_app(state))) as client:
+            return await coro_fn(client)
+
+    return asyncio.run(run())
+
+
+def test_search_is_cached_and_uses_warm_session(monkeypatch, tmp_path):
+    calls = []
+
+    async def fake_fetch(urls, timeout=10, concurrency=8):
+        async with sources.shared_session() as session:
+            calls.append(session)
+        return [{"url": u, "raw": RSS} for u in urls[:1]]
+
+    monkeypatch.setattr(sources, "fetch_all_feeds", fake_fetch)
+
+    async def scenario(client):
+        r1 = await client.get("/search", params={"q": "test"})
+        r2 = await client.get("/search", params={"q": "  TEST "})
+        bad = await client.get("/search")
+        return await r1.json(), await r2.json(), bad.status
+
+    first, second, bad = _run(scenario, monkeypatch, tmp_path)
+    assert first["count"] == 1 and first["items"][0]["uploader"] == "subsplease"
+    assert second["items"] == first["items"]
+    # second request was served from the result cache; the fetch ran on the server's warm session
+    assert len(calls) == 1
+    assert bad == 400
+
+
+def test_queue_and_events(monkeypatch, tmp_path):
+    downloads = [{"gid": "g1", "name": "ep", "status": "active", "total": 10, "completed": 5, "speed": 1}]
+    monkeypatch.setattr("anidl.queue.list_downloads", lambda api=None: downloads)
+    monkeypatch.setattr("anidl.queue.pause", lambda gid, api=None: gid == "g1")
+    monkeypatch.setattr(server.ServerState, "api", lambda self: None)
+
+    async def scenario(client):
+        listing = await (await client.get("/queue")).json()
+        auth = {"X-Anidl-Token": server.api_token()}
+        ok = await client.post("/queue/g1/pause", json={}, headers=auth)
+        missing = await client.post("/queue/nope/pause", json={}, headers=auth)
+        resp = await client.get("/events")
+        line = b""
+        while not line.startswith(b"data:"):
+            line = await resp.content.readline()
+        resp.close()
+        return listing, ok.status, missing.status, line
+
+    listing, ok, missing, line = _run(scenario, monkeypatch, tmp_path)
+    assert listing["downloads"][0]["gid"] == "g1"
+    assert ok == 200 and missing == 502
+    assert b'"gid": "g1"' in line
+
+
+def test_mutating_routes_need_token_json_and_same_origin(monkeypatch, tmp_path):
+    added = []
+    monkeypatch.setattr("anidl.downloader.add_torrent_or_magnet", lambda uri, d: added.append(d) or "g9")
+    monkeypatch.setattr(server.ServerState, "api", lambda self: None)
+
+    async def scenario(client):
+        token = server.api_token()
+        auth = {"X-Anidl-Token": token}
+        uri = {"uri": "magnet:?xt=urn:btih:FAKE"}
+        statuses = [
+            (await client.post("/queue", json=uri)).status,
+            (await client.post("/queue", json=uri, headers={"X-Anidl-Token": "nope"})).status,
+            (await client.post("/queue", data="uri=x", headers=dict(auth, **{"Content-Type": "text/plain"}))).status,
+            (await client.post("/queue", json=uri, headers=dict(auth, Origin="http://evil.example"))).status,
+            (await client.post("/queue", json=dict(uri, dir=str(tmp_path / "elsewhere")), headers=auth)).status,
+            (await client.post("/queue", json=uri, headers={"Authorization": f"Bearer {token}"})).status,
+        ]
+        return statuses
+
+    monkeypatch.chdir(tmp_path)
+    assert _run(scenario, monkeypatch, tmp_path) == [401, 401, 415, 403, 403, 201]
+    assert added == [Path("downloads")]
+    assert (tmp_path / ".anidl" / "api-token").stat().st_mode & 0o777 == 0o600
+
+
+def test_config_edits_apply_without_restart(monkeypatch, tmp_path):
+    from anidl import config
+
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("USERPROFILE", str(tmp_path))
+
+    async def run():
+        state = server.ServerState(persist=False)
+        async with TestClient(TestServer(server.create_app(state))) as client:
+            assert state.cfg["sources"]["timeout"] == 10
+            config.save_config({"sources": {"timeout": 4}, "planner": {"enabled": False}})
+            await client.get("/history")
+            assert state.cfg["sources"]["timeout"] == 4 and state.planner is None
+            # a broken edit keeps the last good config
+            config._config_path().write_text("sources = [", encoding="utf-8")
+            await client.get("/history")
+            assert state.cfg["sources"]["timeout"] == 4
+
+    asyncio.run(run())
@@ -0,0 +1,89 @@
+import asyncio
+import base64
+import hashlib
+
+import pytest
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from anidl import torrents
+
+
+INFO = {
+    "name": "Show S01",
+    "piece length": 262144,
+    "pieces": b"\x00" * 20,
+    "files": [
+        {"length": 300, "path": ["Show - 01.mkv"]},
+        {"length": 500, "path": ["extras", "Show - NCOP.mkv"]},
+    ],
+}
+TORRENT = torrents.bencode({"announce": "udp://tracker.example:1337", "info": INFO})
+INFOHASH = hashlib.sha1(torrents.bencode(INFO)).hexdigest()
+
+
+def test_torrent_info_and_magnet_infohash():
+    meta = torrents.torrent_info(TORRENT)
+    assert meta["infohash"] == INFOHASH
+    assert meta["size"] == 800
+    assert [f["path"] for f in meta["files"]] == ["Show - 01.mkv", "extras/Show - NCOP.mkv"]
+
+    b32 = base64.b32encode(bytes.fromhex(INFOHASH)).decode()
+    assert torrents.magnet_infohash(f"magnet:?xt=urn:btih:{b32}&dn=x") == INFOHASH
+    assert torrents.magnet_infohash(f"magnet:?xt=urn:btih:{INFOHASH.upper()}") == INFOHASH
+
+
+BAD = [
+    {"info": [1, 2]},
+    {"info": {"name": "x", "length": -1}},
+    {"info": {"name": "x", "length": b"big"}},
+    {"info": {"name": 7, "length": 1}},
+    {"info": {"name": "x", "files": {"length": 1}}},
+    {"info": {"name": "x", "files": [b"f"]}},
+    {"info": {"name": "x", "files": [{"length": 1, "path": b"f"}]}},
+    # a list as a dictionary key
+    b"d4:infodli1eei1eee",
+    # nested past MAX_DEPTH
+    b"d4:info" + b"l" * 5000,
+]
+BAD = [torrents.bencode(b) if isinstance(b, dict) else b for b in BAD]
+
+
+def test_torrent_info_rejects_malformed_torrents():
+    for bad in BAD:
+        with pytest.raises(torrents.BencodeError):
+            torrents.torrent_info(bad)
+    with pytest.raises(torrents.BencodeError):
+        torrents.bdecode(b"l" * 5000)
+
+
+def test_prefetch_caches_and_annotates(tmp_path):
+    cache = torrents.TorrentCache(tmp_path / "torrents")
+
+    async def handler(request):
+        return web.Response(body=TORRENT)
+
+    async def bad(request):
+        return web.Response(body=BAD[int(request.match_info["n"])])
+
+    async def run():
+        app = web.Application()
+        app.router.add_get("/show.torrent", handler)
+        app.router.add_get("/bad{n}.torrent", bad)
+        async with TestServer(app) as server:
+            # broken torrents are skipped without losing the good one
+            items = [{"title": "Show S01", "torrent_url": str(server.make_url("/show.torrent"))}]
+            items += [{"title": "bad", "torrent_url": str(server.make_url(f"/bad{n}.torrent"))} for n in range(len(BAD))]
+            n = await torrents.prefetch_torrents(items, cache=cache)
+            return n, items
+
+    n, items = asyncio.run(run())
+    assert n == 1 and not any("infohash" in it for it in items[1:])
+    assert items[0]["infohash"] == INFOHASH and items[0]["size_bytes"] == 800
+    assert cache.path(INFOHASH).read_bytes() == TORRENT
+
+    # a magnet for the same torrent is now answered from the cache without network
+    magnet = [{"torrent_url": f"magnet:?xt=urn:btih:{INFOHASH}"}]
+    assert asyncio.run(torrents.prefetch_torrents(magnet, cache=cache)) == 1
+    assert magnet[0]["files"][1]["length"] == 500